@@ -6,6 +6,7 @@ from sqlalchemy import pool
 from alembic import context
 
 from app.database.database import Base
+from app.database.sharding import interleave_sequences
 from app.config import settings
 
 # this is the Alembic Config object, which provides
@@ -22,6 +23,14 @@ if config.config_file_name is not None:
 from app.models.user import User
 from app.models.income import Income
 from app.models.expense import Expense
+from app.models.label import Label
+from app.models.balance_checkpoint import BalanceCheckpoint
+from app.models.job import Job
+from app.models.deleted_record import DeletedRecord
+from app.models.idempotency_key import IdempotencyKey
+from app.models.budget import Budget, SpendingCounter
+from app.models.fx_rate import FxRate
+from app.models.user_shard import UserShard
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -41,20 +50,40 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 def run_migrations_online() -> None:
-    """Run migrations in 'online' mode."""
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
+    """Run migrations in 'online' mode.
+
+    Migra todos los shards (DATABASE_URL y DB_SHARD_URLS) en orden, o solo uno con
+    `alembic -x shard=N upgrade head`. Después intercala las secuencias de todos.
+    """
+    urls = [settings.DATABASE_URL, *settings.DB_SHARD_URLS]
+    selected = context.get_x_argument(as_dictionary=True).get("shard")
+    shards = [int(selected)] if selected is not None else range(len(urls))
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
+    for shard in shards:
+        connectable = engine_from_config(
+            {"sqlalchemy.url": urls[shard]},
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        with connectable.connect() as connection:
+            context.configure(
+                connection=connection, target_metadata=target_metadata
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+
+    if len(urls) > 1:
+        engines = [engine_from_config({"sqlalchemy.url": url}, prefix="sqlalchemy.", poolclass=pool.NullPool) for url in urls]
+        connections = [engine.connect() for engine in engines]
+        try:
+            interleave_sequences(connections, settings.SHARD_ID_STRIDE)
+            for connection in connections:
+                connection.commit()
+        finally:
+            for connection in connections:
+                connection.close()
 
 if context.is_offline_mode():
     run_migrations_offline()
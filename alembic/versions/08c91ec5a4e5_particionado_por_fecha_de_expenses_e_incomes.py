@@ -0,0 +1,106 @@
+"""particionado por fecha de expenses e incomes
+
+Revision ID: 08c91ec5a4e5
+Revises: 49dfbf8fbbc8
+Create Date: 2026-10-19 09:12:41.204518
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '08c91ec5a4e5'
+down_revision: Union[str, None] = '49dfbf8fbbc8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Particiones anuales creadas por adelantado a partir del año en curso
+YEARS_AHEAD = 2
+
+TABLES = {
+    'expenses': """
+        id INTEGER NOT NULL DEFAULT nextval('expenses_id_seq'),
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        amount DOUBLE PRECISION NOT NULL,
+        payment_method VARCHAR NOT NULL,
+        category VARCHAR NOT NULL,
+        description VARCHAR,
+        date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        month VARCHAR NOT NULL,
+        PRIMARY KEY (id, date)
+    """,
+    'incomes': """
+        id INTEGER NOT NULL DEFAULT nextval('incomes_id_seq'),
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        source VARCHAR NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        observations VARCHAR,
+        date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        month VARCHAR NOT NULL,
+        is_active BOOLEAN,
+        PRIMARY KEY (id, date)
+    """,
+}
+
+COLUMNS = {
+    'expenses': 'id, user_id, amount, payment_method, category, description, date, month',
+    'incomes': 'id, user_id, source, amount, observations, date, month, is_active',
+}
+
+
+def _year_bounds(conn, table: str) -> tuple[int, int]:
+    current = datetime.utcnow().year
+    min_year, max_year = conn.execute(
+        sa.text(f"SELECT CAST(EXTRACT(YEAR FROM MIN(date)) AS INTEGER), CAST(EXTRACT(YEAR FROM MAX(date)) AS INTEGER) FROM {table}")
+    ).one()
+    return min(min_year or current, current), max(max_year or current, current) + YEARS_AHEAD
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    for table, columns in TABLES.items():
+        legacy = f'{table}_legacy'
+        first_year, last_year = _year_bounds(conn, table)
+
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+        op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        op.execute(f'ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey')
+        op.execute(f'ALTER INDEX ix_{table}_id RENAME TO ix_{legacy}_id')
+
+        op.execute(f'CREATE TABLE {table} ({columns}) PARTITION BY RANGE (date)')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        for year in range(first_year, last_year + 1):
+            op.execute(
+                f"CREATE TABLE {table}_y{year} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        op.create_index(op.f(f'ix_{table}_id'), table, ['id'], unique=False)
+        op.create_index(f'ix_{table}_user_id_date', table, ['user_id', 'date'], unique=False)
+
+        op.execute(f'INSERT INTO {table} ({COLUMNS[table]}) SELECT {COLUMNS[table]} FROM {legacy}')
+        op.execute(f'DROP TABLE {legacy}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, columns in TABLES.items():
+        partitioned = f'{table}_partitioned'
+        plain_columns = columns.replace('PRIMARY KEY (id, date)', 'PRIMARY KEY (id)')
+
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+        op.execute(f'ALTER TABLE {table} RENAME TO {partitioned}')
+        op.execute(f'ALTER TABLE {partitioned} RENAME CONSTRAINT {table}_pkey TO {partitioned}_pkey')
+        op.execute(f'ALTER INDEX ix_{table}_id RENAME TO ix_{partitioned}_id')
+        op.execute(f'ALTER INDEX ix_{table}_user_id_date RENAME TO ix_{partitioned}_user_id_date')
+
+        op.execute(f'CREATE TABLE {table} ({plain_columns})')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        op.create_index(op.f(f'ix_{table}_id'), table, ['id'], unique=False)
+        op.execute(f'INSERT INTO {table} ({COLUMNS[table]}) SELECT {COLUMNS[table]} FROM {partitioned}')
+        op.execute(f'DROP TABLE {partitioned}')
@@ -0,0 +1,65 @@
+"""diccionario de categorias, fuentes y metodos de pago
+
+Revision ID: 13041e148359
+Revises: 08c91ec5a4e5
+Create Date: 2026-10-19 10:03:17.558210
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '13041e148359'
+down_revision: Union[str, None] = '08c91ec5a4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (tabla, columna de texto, columna id, kind en labels)
+ENCODED_COLUMNS = [
+    ('expenses', 'category', 'category_id', 'category'),
+    ('expenses', 'payment_method', 'payment_method_id', 'payment_method'),
+    ('incomes', 'source', 'source_id', 'source'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('labels',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'kind', 'name', name='uq_labels_user_id_kind_name')
+    )
+
+    for table, text_column, id_column, kind in ENCODED_COLUMNS:
+        op.add_column(table, sa.Column(id_column, sa.Integer(), nullable=True))
+        op.execute(
+            f"INSERT INTO labels (user_id, kind, name) "
+            f"SELECT DISTINCT user_id, '{kind}', {text_column} FROM {table} "
+            f"ON CONFLICT ON CONSTRAINT uq_labels_user_id_kind_name DO NOTHING"
+        )
+        op.execute(
+            f"UPDATE {table} t SET {id_column} = l.id FROM labels l "
+            f"WHERE l.user_id = t.user_id AND l.kind = '{kind}' AND l.name = t.{text_column}"
+        )
+        op.alter_column(table, id_column, existing_type=sa.Integer(), nullable=False)
+        op.create_foreign_key(f'fk_{table}_{id_column}_labels', table, 'labels', [id_column], ['id'])
+
+    op.create_index('ix_expenses_user_id_category_id', 'expenses', ['user_id', 'category_id'], unique=False)
+    op.create_index('ix_incomes_user_id_source_id', 'incomes', ['user_id', 'source_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_incomes_user_id_source_id', table_name='incomes')
+    op.drop_index('ix_expenses_user_id_category_id', table_name='expenses')
+    for table, _, id_column, _ in reversed(ENCODED_COLUMNS):
+        op.drop_constraint(f'fk_{table}_{id_column}_labels', table, type_='foreignkey')
+        op.drop_column(table, id_column)
+    op.drop_table('labels')
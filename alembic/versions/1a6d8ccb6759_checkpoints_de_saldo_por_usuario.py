@@ -0,0 +1,55 @@
+"""checkpoints de saldo por usuario
+
+Revision ID: 1a6d8ccb6759
+Revises: 13041e148359
+Create Date: 2026-10-19 11:26:04.913377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1a6d8ccb6759'
+down_revision: Union[str, None] = '13041e148359'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('balance_checkpoints',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('income_total', sa.Float(), nullable=False),
+    sa.Column('expense_total', sa.Float(), nullable=False),
+    sa.Column('cumulative_income', sa.Float(), nullable=False),
+    sa.Column('cumulative_expense', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'month')
+    )
+    # Carga inicial, equivalente a `python -m app.finance.checkpoints rebuild`
+    op.execute("""
+        INSERT INTO balance_checkpoints (user_id, month, income_total, expense_total, cumulative_income, cumulative_expense)
+        SELECT user_id, month, income_total, expense_total,
+               SUM(income_total) OVER w, SUM(expense_total) OVER w
+        FROM (
+            SELECT user_id, month, SUM(income_total) AS income_total, SUM(expense_total) AS expense_total
+            FROM (
+                SELECT user_id, CAST(date_trunc('month', date) AS DATE) AS month, SUM(amount) AS income_total, 0 AS expense_total
+                FROM incomes GROUP BY 1, 2
+                UNION ALL
+                SELECT user_id, CAST(date_trunc('month', date) AS DATE) AS month, 0, SUM(amount)
+                FROM expenses GROUP BY 1, 2
+            ) AS totals
+            GROUP BY user_id, month
+        ) AS monthly
+        WINDOW w AS (PARTITION BY user_id ORDER BY month)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('balance_checkpoints')
@@ -0,0 +1,41 @@
+"""indices de busqueda de usuarios
+
+Revision ID: 3c8e5f1a9b27
+Revises: 7b4f0a6c2d81
+Create Date: 2026-10-19 12:58:44.310276
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8e5f1a9b27'
+down_revision: Union[str, None] = '7b4f0a6c2d81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_created_at', 'users', ['created_at'], unique=False)
+    op.create_index('ix_users_last_login', 'users', ['last_login'], unique=False)
+    # Búsqueda por prefijo: lower(col) LIKE 'texto%'
+    op.execute("CREATE INDEX ix_users_username_lower_prefix ON users (lower(username) text_pattern_ops)")
+    op.execute("CREATE INDEX ix_users_email_lower_prefix ON users (lower(email) text_pattern_ops)")
+    # Búsqueda por subcadena: col ILIKE '%texto%'
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX ix_users_username_trgm ON users USING gin (username gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_users_email_trgm ON users USING gin (email gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_email_trgm', table_name='users')
+    op.drop_index('ix_users_username_trgm', table_name='users')
+    op.drop_index('ix_users_email_lower_prefix', table_name='users')
+    op.drop_index('ix_users_username_lower_prefix', table_name='users')
+    op.drop_index('ix_users_last_login', table_name='users')
+    op.drop_index('ix_users_created_at', table_name='users')
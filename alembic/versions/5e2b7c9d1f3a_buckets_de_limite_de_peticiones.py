@@ -0,0 +1,35 @@
+"""buckets de limite de peticiones
+
+Revision ID: 5e2b7c9d1f3a
+Revises: 1a6d8ccb6759
+Create Date: 2026-10-19 12:10:41.228904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b7c9d1f3a'
+down_revision: Union[str, None] = '1a6d8ccb6759'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Estado efímero compartido por RATE_LIMIT_BACKEND=postgres: UNLOGGED evita escribir WAL
+    op.execute("""
+        CREATE UNLOGGED TABLE rate_limit_buckets (
+            key VARCHAR(255) PRIMARY KEY,
+            tokens DOUBLE PRECISION NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rate_limit_buckets')
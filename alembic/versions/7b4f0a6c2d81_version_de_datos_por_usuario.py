@@ -0,0 +1,30 @@
+"""version de datos por usuario
+
+Revision ID: 7b4f0a6c2d81
+Revises: 5e2b7c9d1f3a
+Create Date: 2026-10-19 12:32:17.604512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b4f0a6c2d81'
+down_revision: Union[str, None] = '5e2b7c9d1f3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('data_version', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('data_changed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'data_changed_at')
+    op.drop_column('users', 'data_version')
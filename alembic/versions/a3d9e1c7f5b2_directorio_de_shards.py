@@ -0,0 +1,44 @@
+"""directorio de shards
+
+Revision ID: a3d9e1c7f5b2
+Revises: f5c1a8e3b7d2
+Create Date: 2026-10-19 17:48:32.215907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d9e1c7f5b2'
+down_revision: Union[str, None] = 'f5c1a8e3b7d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_shards',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+    # Los usuarios existentes viven en DATABASE_URL, el shard 0
+    op.execute("""
+        INSERT INTO user_shards (user_id, email, username, shard, created_at)
+        SELECT id, email, username, 0, COALESCE(created_at, now()) FROM users
+    """)
+    op.execute("SELECT setval('user_shards_user_id_seq', COALESCE(MAX(user_id), 0) + 1, false) FROM user_shards")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_shards')
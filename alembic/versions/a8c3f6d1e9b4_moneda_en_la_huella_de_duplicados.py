@@ -0,0 +1,44 @@
+"""moneda en la huella de duplicados
+
+Revision ID: a8c3f6d1e9b4
+Revises: e7d2b5a9c4f1
+Create Date: 2026-10-19 21:40:12.583104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c3f6d1e9b4'
+down_revision: Union[str, None] = 'e7d2b5a9c4f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copia de app.utils.fingerprint.FINGERPRINT_SQL en el momento de esta migración;
+# {currency} es la columna currency, o nada para la huella anterior sin moneda
+FINGERPRINT_SQL = """
+    encode(sha256(convert_to(concat_ws('|',
+        '{kind}', user_id, to_char(date, 'YYYY-MM-DD'), CAST(round(CAST(amount AS DOUBLE PRECISION) * 100) AS BIGINT),
+        {currency}lower(btrim(regexp_replace(COALESCE({text}, ''), '\\s+', ' ', 'g')))
+    ), 'UTF8')), 'hex')
+"""
+KINDS = (('expense', 'description'), ('income', 'source'))
+
+
+def _backfill(currency: str) -> None:
+    for kind, text_column in KINDS:
+        fingerprint = FINGERPRINT_SQL.format(kind=kind, text=text_column, currency=currency)
+        op.execute(f"UPDATE transactions SET fingerprint = {fingerprint} WHERE kind = '{kind}'")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _backfill('currency, ')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _backfill('')
@@ -0,0 +1,45 @@
+"""sincronizacion incremental
+
+Revision ID: b6f13d7e52a4
+Revises: 9d2a6e4b8c10
+Create Date: 2026-10-19 14:05:52.918340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6f13d7e52a4'
+down_revision: Union[str, None] = '9d2a6e4b8c10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('expenses', 'incomes'):
+        # now() es estable: Postgres no reescribe la tabla al añadir la columna
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False))
+        op.create_index(f'ix_{table}_user_id_updated_at', table, ['user_id', 'updated_at'], unique=False)
+    op.create_table('deleted_records',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('record_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deleted_records_user_id_deleted_at', 'deleted_records', ['user_id', 'deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_deleted_records_user_id_deleted_at', table_name='deleted_records')
+    op.drop_table('deleted_records')
+    for table in ('expenses', 'incomes'):
+        op.drop_index(f'ix_{table}_user_id_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,170 @@
+"""libro único de movimientos
+
+Revision ID: b8e4f2a6c1d9
+Revises: a3d9e1c7f5b2
+Create Date: 2026-10-19 18:36:14.820371
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4f2a6c1d9'
+down_revision: Union[str, None] = 'a3d9e1c7f5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Particiones anuales creadas por adelantado a partir del año en curso
+YEARS_AHEAD = 2
+
+COMMON_COLUMNS = 'id, user_id, amount, currency, date, month, fingerprint, updated_at'
+KIND_COLUMNS = {
+    'incomes': ('income', 'source, source_id, observations, is_active'),
+    'expenses': ('expense', 'payment_method, category, category_id, payment_method_id, description'),
+}
+
+TRANSACTIONS = """
+    id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+    kind VARCHAR(10) NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    amount DOUBLE PRECISION NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'USD',
+    date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    month VARCHAR NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT timezone('utc', now()),
+    source VARCHAR,
+    source_id INTEGER REFERENCES labels (id),
+    observations VARCHAR,
+    is_active BOOLEAN,
+    payment_method VARCHAR,
+    category VARCHAR,
+    category_id INTEGER REFERENCES labels (id),
+    payment_method_id INTEGER REFERENCES labels (id),
+    description VARCHAR,
+    PRIMARY KEY (id, kind, date),
+    CONSTRAINT ck_transactions_kind CHECK (kind IN ('income', 'expense')),
+    CONSTRAINT ck_transactions_income CHECK (kind <> 'income' OR (source IS NOT NULL AND source_id IS NOT NULL)),
+    CONSTRAINT ck_transactions_expense CHECK (
+        kind <> 'expense' OR (category IS NOT NULL AND category_id IS NOT NULL
+                              AND payment_method IS NOT NULL AND payment_method_id IS NOT NULL)
+    )
+"""
+
+# Tablas anteriores, para el downgrade
+LEGACY_TABLES = {
+    'expenses': """
+        id INTEGER NOT NULL DEFAULT nextval('expenses_id_seq'),
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        amount DOUBLE PRECISION NOT NULL,
+        payment_method VARCHAR NOT NULL,
+        category VARCHAR NOT NULL,
+        description VARCHAR,
+        date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        month VARCHAR NOT NULL,
+        category_id INTEGER NOT NULL CONSTRAINT fk_expenses_category_id_labels REFERENCES labels (id),
+        payment_method_id INTEGER NOT NULL CONSTRAINT fk_expenses_payment_method_id_labels REFERENCES labels (id),
+        updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT timezone('utc', now()),
+        fingerprint VARCHAR(64) NOT NULL,
+        currency VARCHAR(3) NOT NULL DEFAULT 'USD',
+        PRIMARY KEY (id, date)
+    """,
+    'incomes': """
+        id INTEGER NOT NULL DEFAULT nextval('incomes_id_seq'),
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        source VARCHAR NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        observations VARCHAR,
+        date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        month VARCHAR NOT NULL,
+        is_active BOOLEAN,
+        source_id INTEGER NOT NULL CONSTRAINT fk_incomes_source_id_labels REFERENCES labels (id),
+        updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT timezone('utc', now()),
+        fingerprint VARCHAR(64) NOT NULL,
+        currency VARCHAR(3) NOT NULL DEFAULT 'USD',
+        PRIMARY KEY (id, date)
+    """,
+}
+LEGACY_INDEXES = {
+    'expenses': ['category_id'],
+    'incomes': ['source_id'],
+}
+
+
+def _year_bounds(conn) -> tuple[int, int]:
+    current = datetime.utcnow().year
+    min_year, max_year = conn.execute(sa.text("""
+        SELECT CAST(EXTRACT(YEAR FROM MIN(date)) AS INTEGER), CAST(EXTRACT(YEAR FROM MAX(date)) AS INTEGER)
+        FROM (SELECT date FROM expenses UNION ALL SELECT date FROM incomes) AS movements
+    """)).one()
+    return min(min_year or current, current), max(max_year or current, current) + YEARS_AHEAD
+
+
+def _create_views() -> None:
+    # Vistas simples: las consultas SQL sobre expenses/incomes siguen funcionando y
+    # Postgres las expande sobre transactions con el filtro de kind
+    for table, (kind, columns) in KIND_COLUMNS.items():
+        op.execute(f"CREATE VIEW {table} AS SELECT {COMMON_COLUMNS}, {columns} FROM transactions WHERE kind = '{kind}'")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    first_year, last_year = _year_bounds(conn)
+
+    op.execute('CREATE SEQUENCE transactions_id_seq')
+    op.execute(f'CREATE TABLE transactions ({TRANSACTIONS}) PARTITION BY RANGE (date)')
+    op.execute('ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id')
+    for year in range(first_year, last_year + 1):
+        op.execute(
+            f"CREATE TABLE transactions_y{year} PARTITION OF transactions "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        )
+    op.execute('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT')
+
+    # Los ids se conservan por tipo (los clientes los guardan); los nuevos siguen al mayor
+    for table, (kind, columns) in KIND_COLUMNS.items():
+        op.execute(
+            f"INSERT INTO transactions (kind, {COMMON_COLUMNS}, {columns}) "
+            f"SELECT '{kind}', {COMMON_COLUMNS}, {columns} FROM {table}"
+        )
+    op.execute("SELECT setval('transactions_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM transactions")
+
+    op.create_index(op.f('ix_transactions_id'), 'transactions', ['id'], unique=False)
+    # Saldo, neto mensual y pivot de ingresos y gastos en un solo recorrido de este índice
+    op.create_index('ix_transactions_user_id_date', 'transactions', ['user_id', 'date'], unique=False, postgresql_include=['kind', 'amount'])
+    op.create_index('ix_transactions_user_id_kind_updated_at', 'transactions', ['user_id', 'kind', 'updated_at'], unique=False)
+    op.create_index('ix_transactions_user_id_fingerprint', 'transactions', ['user_id', 'fingerprint'], unique=False)
+    op.create_index('ix_transactions_user_id_currency', 'transactions', ['user_id', 'currency'], unique=False)
+    op.create_index('ix_transactions_user_id_category_id', 'transactions', ['user_id', 'category_id'], unique=False)
+    op.create_index('ix_transactions_user_id_source_id', 'transactions', ['user_id', 'source_id'], unique=False)
+
+    for table in KIND_COLUMNS:
+        op.execute(f'DROP TABLE {table}')
+    _create_views()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in KIND_COLUMNS:
+        op.execute(f'DROP VIEW {table}')
+    for table, columns in LEGACY_TABLES.items():
+        kind, kind_columns = KIND_COLUMNS[table]
+        op.execute(f'CREATE SEQUENCE {table}_id_seq')
+        op.execute(f'CREATE TABLE {table} ({columns}) PARTITION BY RANGE (date)')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        # Sin particiones anuales: todas las filas quedan en la partición DEFAULT
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        op.execute(
+            f"INSERT INTO {table} ({COMMON_COLUMNS}, {kind_columns}) "
+            f"SELECT {COMMON_COLUMNS}, {kind_columns} FROM transactions WHERE kind = '{kind}'"
+        )
+        op.execute(f"SELECT setval('{table}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {table}")
+        op.create_index(op.f(f'ix_{table}_id'), table, ['id'], unique=False)
+        for indexed in (['date'], ['updated_at'], ['fingerprint'], ['currency'], LEGACY_INDEXES[table]):
+            op.create_index(f'ix_{table}_user_id_{indexed[0]}', table, ['user_id', *indexed], unique=False)
+    op.execute('DROP TABLE transactions')
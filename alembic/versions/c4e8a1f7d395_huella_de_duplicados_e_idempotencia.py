@@ -0,0 +1,53 @@
+"""huella de duplicados e idempotencia
+
+Revision ID: c4e8a1f7d395
+Revises: b6f13d7e52a4
+Create Date: 2026-10-19 14:38:27.140962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f7d395'
+down_revision: Union[str, None] = 'b6f13d7e52a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Copia de app.utils.fingerprint.FINGERPRINT_SQL en el momento de esta migración
+FINGERPRINT_SQL = """
+    encode(sha256(convert_to(concat_ws('|',
+        '{kind}', user_id, to_char(date, 'YYYY-MM-DD'), CAST(round(CAST(amount AS DOUBLE PRECISION) * 100) AS BIGINT),
+        lower(btrim(regexp_replace(COALESCE({text}, ''), '\\s+', ' ', 'g')))
+    ), 'UTF8')), 'hex')
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, kind, text_column in (('expenses', 'expense', 'description'), ('incomes', 'income', 'source')):
+        op.add_column(table, sa.Column('fingerprint', sa.String(length=64), nullable=True))
+        op.execute(f"UPDATE {table} SET fingerprint = {FINGERPRINT_SQL.format(kind=kind, text=text_column)}")
+        op.alter_column(table, 'fingerprint', nullable=False)
+        op.create_index(f'ix_{table}_user_id_fingerprint', table, ['user_id', 'fingerprint'], unique=False)
+    op.create_table('idempotency_keys',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('request_hash', sa.String(length=64), nullable=False),
+    sa.Column('response', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('idempotency_keys')
+    for table in ('expenses', 'incomes'):
+        op.drop_index(f'ix_{table}_user_id_fingerprint', table_name=table)
+        op.drop_column(table, 'fingerprint')
@@ -0,0 +1,30 @@
+"""sin importe con signo
+
+Revision ID: c9e1d5a3f7b2
+Revises: f2a7c9e4b1d8
+Create Date: 2026-10-20 00:21:36.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e1d5a3f7b2'
+down_revision: Union[str, None] = 'f2a7c9e4b1d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ninguna consulta la leía; b8e4f2a6c1d9 ya no la crea, solo queda en bases migradas antes
+    op.execute("ALTER TABLE transactions DROP COLUMN IF EXISTS signed_amount")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # b8e4f2a6c1d9 ya no crea la columna: no hay nada que restaurar
+    pass
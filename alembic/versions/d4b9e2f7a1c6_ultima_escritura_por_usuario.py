@@ -0,0 +1,28 @@
+"""ultima escritura por usuario
+
+Revision ID: d4b9e2f7a1c6
+Revises: a8c3f6d1e9b4
+Create Date: 2026-10-19 23:05:41.218374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4b9e2f7a1c6'
+down_revision: Union[str, None] = 'a8c3f6d1e9b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('written_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'written_at')
@@ -0,0 +1,57 @@
+"""presupuestos y contadores de gasto
+
+Revision ID: d7a3c5e9f1b8
+Revises: c4e8a1f7d395
+Create Date: 2026-10-19 15:02:13.476090
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3c5e9f1b8'
+down_revision: Union[str, None] = 'c4e8a1f7d395'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('budgets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('alert_percent', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['labels.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'category_id', name='uq_budgets_user_id_category_id')
+    )
+    op.create_table('spending_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('spent', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['labels.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'month', 'category_id')
+    )
+    # Carga inicial, equivalente a `python -m app.finance.budgets rebuild`
+    op.execute("""
+        INSERT INTO spending_counters (user_id, month, category_id, spent)
+        SELECT user_id, CAST(date_trunc('month', date) AS DATE), category_id, SUM(amount)
+        FROM expenses
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spending_counters')
+    op.drop_table('budgets')
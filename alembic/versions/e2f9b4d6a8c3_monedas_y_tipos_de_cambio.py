@@ -0,0 +1,45 @@
+"""monedas y tipos de cambio
+
+Revision ID: e2f9b4d6a8c3
+Revises: d7a3c5e9f1b8
+Create Date: 2026-10-19 15:48:37.215604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f9b4d6a8c3'
+down_revision: Union[str, None] = 'd7a3c5e9f1b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Los datos existentes quedan en la misma moneda que la base de su usuario: sin conversión
+    op.add_column('users', sa.Column('base_currency', sa.String(length=3), server_default='USD', nullable=False))
+    for table in ('expenses', 'incomes'):
+        # Default constante: Postgres no reescribe la tabla al añadir la columna
+        op.add_column(table, sa.Column('currency', sa.String(length=3), server_default='USD', nullable=False))
+        op.create_index(f'ix_{table}_user_id_currency', table, ['user_id', 'currency'], unique=False)
+    op.create_table('fx_rates',
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('rate', sa.Float(), nullable=False),
+    sa.Column('filled', sa.Boolean(), nullable=False),
+    sa.Column('imported_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('currency', 'date')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('fx_rates')
+    for table in ('expenses', 'incomes'):
+        op.drop_index(f'ix_{table}_user_id_currency', table_name=table)
+        op.drop_column(table, 'currency')
+    op.drop_column('users', 'base_currency')
@@ -0,0 +1,36 @@
+"""version del listado de usuarios
+
+Revision ID: e7d2b5a9c4f1
+Revises: b8e4f2a6c1d9
+Create Date: 2026-10-19 21:05:37.418226
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7d2b5a9c4f1'
+down_revision: Union[str, None] = 'b8e4f2a6c1d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Una sola fila por shard: la ETag de /admin/users la lee en vez de agregar toda la tabla users
+    op.execute("""
+        CREATE TABLE users_version (
+            id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            version BIGINT NOT NULL DEFAULT 0,
+            changed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT timezone('utc', now())
+        )
+    """)
+    op.execute("INSERT INTO users_version (id) VALUES (1)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('users_version')
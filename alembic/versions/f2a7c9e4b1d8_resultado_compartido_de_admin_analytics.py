@@ -0,0 +1,36 @@
+"""resultado compartido de admin analytics
+
+Revision ID: f2a7c9e4b1d8
+Revises: d4b9e2f7a1c6
+Create Date: 2026-10-19 23:48:09.615027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a7c9e4b1d8'
+down_revision: Union[str, None] = 'd4b9e2f7a1c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Una sola fila: el último resultado de /admin/analytics, que calcula el trabajo admin.analytics
+    op.execute("""
+        CREATE TABLE platform_analytics (
+            id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            value JSON,
+            computed_at TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    op.execute("INSERT INTO platform_analytics (id) VALUES (1)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('platform_analytics')
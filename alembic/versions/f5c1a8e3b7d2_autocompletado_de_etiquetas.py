@@ -0,0 +1,48 @@
+"""autocompletado de etiquetas
+
+Revision ID: f5c1a8e3b7d2
+Revises: e2f9b4d6a8c3
+Create Date: 2026-10-19 16:21:05.603418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c1a8e3b7d2'
+down_revision: Union[str, None] = 'e2f9b4d6a8c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('labels', sa.Column('use_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('labels', sa.Column('last_used_at', sa.DateTime(), nullable=True))
+    # Prefijo sin distinguir mayúsculas: lower(name) LIKE 'abc%'
+    op.execute(
+        "CREATE INDEX ix_labels_user_id_kind_name_prefix "
+        "ON labels (user_id, kind, lower(name) text_pattern_ops)"
+    )
+    # Carga inicial, equivalente a `python -m app.finance.autocomplete rebuild`
+    op.execute("""
+        UPDATE labels l SET use_count = u.uses, last_used_at = u.last_used
+        FROM (
+            SELECT category_id AS id, COUNT(*) AS uses, MAX(date) AS last_used FROM expenses GROUP BY 1
+            UNION ALL
+            SELECT payment_method_id, COUNT(*), MAX(date) FROM expenses GROUP BY 1
+            UNION ALL
+            SELECT source_id, COUNT(*), MAX(date) FROM incomes GROUP BY 1
+        ) AS u
+        WHERE l.id = u.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_labels_user_id_kind_name_prefix")
+    op.drop_column('labels', 'last_used_at')
+    op.drop_column('labels', 'use_count')
@@ -0,0 +1,165 @@
+"""
+Métricas globales de la plataforma para GET /admin/analytics.
+
+El volumen de movimientos por mes se agrega en paralelo: el espacio de ids de
+usuario se parte en rangos con el mismo número de usuarios (ntile) y cada rango
+se suma en su propia sesión/conexión desde un pool de hilos; después se fusionan
+los parciales. Con varios shards, las métricas de usuarios y los rangos se
+calculan en cada shard y los rangos de todos se reparten en el mismo pool.
+
+Una petición nunca calcula. El trabajo periódico `admin.analytics` (cada
+ADMIN_ANALYTICS_TTL segundos) guarda el resultado en la tabla de una fila
+`platform_analytics` del shard 0, común a todos los workers. Si el resultado
+está vencido, o se pide `refresh`, la petición sirve el anterior y encola un
+recálculo. La clave de deduplicación es la del resultado que sustituye, así que
+las peticiones de todos los workers que ven el mismo resultado encolan uno solo.
+"""
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import text
+from app.config import settings
+from app.database.database import ReadSessionLocal, engine, shard_map
+from app.jobs.queue import enqueue
+
+REFRESH_JOB = "admin.analytics"
+# Rangos de ids por hilo del pool (más rangos que hilos reparte mejor la carga)
+RANGES_PER_WORKER = 4
+# Límites (en días) de los grupos de antigüedad del último login
+LOGIN_RECENCY_BUCKETS = [("last24h", 1), ("last7d", 7), ("last30d", 30), ("last90d", 90)]
+
+_USER_RANGES_SQL = """
+    SELECT MIN(id), MAX(id)
+    FROM (SELECT id, NTILE(:ranges) OVER (ORDER BY id) AS bucket FROM users) AS tiles
+    GROUP BY bucket
+    ORDER BY 1
+"""
+_VOLUME_SQL = """
+    SELECT to_char(date_trunc('month', date), 'YYYY-MM') AS month, kind,
+           COUNT(*) AS transactions, COALESCE(SUM(amount), 0) AS total
+    FROM transactions
+    WHERE user_id BETWEEN :low AND :high
+    GROUP BY 1, 2
+"""
+
+
+def _user_metrics(db) -> tuple[dict, list]:
+    """Contadores de usuarios y altas por mes de un shard."""
+    recency = ", ".join(
+        f"COUNT(*) FILTER (WHERE last_login >= now() - interval '{days} days') AS {name}"
+        for name, days in LOGIN_RECENCY_BUCKETS
+    )
+    oldest = LOGIN_RECENCY_BUCKETS[-1][1]
+    row = db.execute(text(f"""
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE is_active) AS active,
+               COUNT(*) FILTER (WHERE is_admin) AS admins,
+               {recency},
+               COUNT(*) FILTER (WHERE last_login < now() - interval '{oldest} days') AS older,
+               COUNT(*) FILTER (WHERE last_login IS NULL) AS never
+        FROM users
+    """)).mappings().one()
+    signups = db.execute(text("""
+        SELECT to_char(date_trunc('month', created_at), 'YYYY-MM') AS month, COUNT(*)
+        FROM users
+        GROUP BY 1
+        ORDER BY 1
+    """)).all()
+    return dict(row), signups
+
+
+def _shard_users(shard: int, ranges: int) -> tuple[dict, list, list]:
+    db = ReadSessionLocal(shard=shard)
+    try:
+        counts, signups = _user_metrics(db)
+        user_ranges = db.execute(text(_USER_RANGES_SQL), {"ranges": ranges}).all()
+        return counts, signups, [(shard, low, high) for low, high in user_ranges]
+    finally:
+        db.close()
+
+
+def _range_volume(user_range: tuple[int, int, int]) -> list:
+    """Volumen por mes de un rango de usuarios de un shard, en una sesión propia."""
+    shard, low, high = user_range
+    db = ReadSessionLocal(shard=shard)
+    try:
+        return db.execute(text(_VOLUME_SQL), {"low": low, "high": high}).all()
+    finally:
+        db.close()
+
+
+def compute(workers: int | None = None) -> dict:
+    workers = workers or settings.ADMIN_ANALYTICS_WORKERS
+    started = time.perf_counter()
+    counts, signups, user_ranges = defaultdict(int), defaultdict(int), []
+    for shard_counts, shard_signups, shard_ranges in shard_map.scatter(
+        lambda shard: _shard_users(shard, workers * RANGES_PER_WORKER)
+    ):
+        for name, value in shard_counts.items():
+            counts[name] += value
+        for month, count in shard_signups:
+            signups[month] += count
+        user_ranges += shard_ranges
+    result = {
+        "users": {"total": counts["total"], "active": counts["active"], "admins": counts["admins"]},
+        "loginRecency": {
+            **{name: counts[name] for name, _ in LOGIN_RECENCY_BUCKETS},
+            "older": counts["older"],
+            "never": counts["never"],
+        },
+        "signupsByMonth": [{"month": month, "count": count} for month, count in sorted(signups.items())],
+    }
+
+    volume = defaultdict(lambda: {"income": 0.0, "expense": 0.0, "incomeCount": 0, "expenseCount": 0})
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="admin-analytics") as pool:
+        for rows in pool.map(_range_volume, user_ranges):
+            for month, kind, transactions, total in rows:
+                volume[month][kind] += float(total)
+                volume[month][f"{kind}Count"] += transactions
+
+    result["transactionVolume"] = [
+        {"month": month, **{k: round(v, 2) if isinstance(v, float) else v for k, v in totals.items()}}
+        for month, totals in sorted(volume.items())
+    ]
+    result["generatedAt"] = datetime.utcnow().isoformat()
+    result["computeSeconds"] = round(time.perf_counter() - started, 3)
+    result["userRanges"] = len(user_ranges)
+    result["shards"] = shard_map.count
+    return result
+
+
+def store(connection, value: dict) -> None:
+    connection.execute(
+        text("UPDATE platform_analytics SET value = CAST(:value AS JSON), computed_at = :now"),
+        {"value": json.dumps(value), "now": datetime.utcnow()},
+    )
+
+
+def refresh_snapshot() -> None:
+    """Calcula y guarda el resultado (cuerpo del trabajo `admin.analytics`)."""
+    value = compute()
+    with engine.begin() as conn:
+        store(conn, value)
+
+
+def load(db) -> tuple[dict, datetime] | None:
+    """Último resultado guardado y cuándo se calculó; None si todavía no hay ninguno."""
+    value, computed_at = db.execute(text("SELECT value, computed_at FROM platform_analytics")).one()
+    if value is None:
+        return None
+    return (json.loads(value) if isinstance(value, str) else value), computed_at
+
+
+def get(db, force: bool = False) -> dict | None:
+    """Resultado guardado (None si aún no hay); vencido o con `force` encola un recálculo."""
+    snapshot = load(db)
+    computed_at = snapshot[1] if snapshot else None
+    stale = computed_at is None or force or (datetime.utcnow() - computed_at).total_seconds() > settings.ADMIN_ANALYTICS_TTL
+    if stale:
+        replaces = computed_at.isoformat() if computed_at else "none"
+        enqueue(REFRESH_JOB, dedupe_key=f"{REFRESH_JOB}:{replaces}")
+    if snapshot is None:
+        return None
+    return {**snapshot[0], "stale": stale}
@@ -1,10 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import func, or_, select
 from app.models.user import User
 from app.schemas.user import UserCreateRequest, UserResponse
-from app.utils.dependencies import get_db, get_current_user
-from typing import List, Optional
+from app.utils.dependencies import get_current_user
+from app.auth.last_login_buffer import last_login_buffer
+from app.database.database import replica_pool, ReadSessionLocal, UserSessionLocal, shard_map
+from app.database.sharding import UserExistsError
+from app.finance.analytics_cache import analytics_cache
+from app.finance.autocomplete import label_index
+from app.finance.events import change_bus
+from app.utils.rate_limit import admission_stats
+from app.utils.conditional import not_modified
+from app.utils import profiling
+from app.admin import analytics
+from app.admin import users_version
+from app.jobs.runner import job_runner
+from contextlib import ExitStack
+from datetime import datetime
+from itertools import islice
+from typing import List, Literal, Optional
 import bcrypt
+import csv
+import heapq
+import io
 
 admin_router = APIRouter(tags=["Admin"])
 
@@ -16,59 +36,212 @@ def get_current_admin_user(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
+def get_target_db(user_id: int, admin_user: User = Depends(get_current_admin_user)):
+    """Sesión en el shard del usuario `user_id` de la ruta."""
+    db = UserSessionLocal(user_id)
+    db.info["user_id"] = admin_user.id
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Columnas del export CSV, en orden
+EXPORT_COLUMNS = ["id", "username", "email", "is_admin", "is_active", "created_at", "last_login"]
+# Filas leídas del cursor del servidor por cada lote del export
+EXPORT_BATCH_SIZE = 1000
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def user_filters(
+    is_active: Optional[bool] = None,
+    is_admin: Optional[bool] = None,
+    created_from: Optional[datetime] = Query(None, description="Alta desde (inclusive)"),
+    created_to: Optional[datetime] = Query(None, description="Alta hasta (exclusive)"),
+    last_login_from: Optional[datetime] = Query(None, description="Último login desde (inclusive)"),
+    last_login_to: Optional[datetime] = Query(None, description="Último login hasta (exclusive)"),
+    search: Optional[str] = Query(None, min_length=1, max_length=100, description="Texto a buscar en username o email"),
+    search_mode: Literal["prefix", "contains"] = Query("prefix", description="prefix (índice text_pattern_ops) o contains (índice trigram)"),
+):
+    """Filtros comunes del listado y el export de usuarios, como criterios SQLAlchemy."""
+    criteria = []
+    if is_active is not None:
+        criteria.append(User.is_active == is_active)
+    if is_admin is not None:
+        criteria.append(User.is_admin == is_admin)
+    if created_from:
+        criteria.append(User.created_at >= created_from)
+    if created_to:
+        criteria.append(User.created_at < created_to)
+    if last_login_from:
+        criteria.append(User.last_login >= last_login_from)
+    if last_login_to:
+        criteria.append(User.last_login < last_login_to)
+    if search:
+        term = _escape_like(search.lower())
+        if search_mode == "prefix":
+            criteria.append(or_(
+                func.lower(User.username).like(f"{term}%", escape="\\"),
+                func.lower(User.email).like(f"{term}%", escape="\\"),
+            ))
+        else:
+            criteria.append(or_(
+                User.username.ilike(f"%{term}%", escape="\\"),
+                User.email.ilike(f"%{term}%", escape="\\"),
+            ))
+    return criteria
+
 @admin_router.get("/admin/users", response_model=List[UserResponse])
 def get_all_users(
-    is_active: Optional[bool] = None,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000, description="Usuarios por página"),
+    after_id: Optional[int] = Query(None, description="Cursor: id del último usuario de la página anterior"),
+    criteria: list = Depends(user_filters),
     admin_user: User = Depends(get_current_admin_user)
 ):
     """
+    Listado paginado por keyset (orden por id). La cabecera X-Next-Cursor trae el
+    valor de `after_id` para la página siguiente; no se envía en la última.
+
     Ejemplo de consumo desde el frontend:
 
     Todos: /admin/users
     Solo activos: /admin/users?is_active=true
     Solo inactivos: /admin/users?is_active=false
+    Búsqueda: /admin/users?search=ana&search_mode=contains
+    Página siguiente: /admin/users?after_id=<X-Next-Cursor>
+
+    Con varios shards cada uno devuelve su página por id y se fusionan.
     """
-    query = db.query(User)
-    if is_active is not None:
-        query = query.filter(User.is_active == is_active)
-    return query.all()
+    admin_id, written_at = admin_user.id, admin_user.written_at
+
+    def version(shard: int):
+        db = ReadSessionLocal(admin_id, shard=shard, written_at=written_at)
+        try:
+            return users_version.current(db)
+        finally:
+            db.close()
+
+    def page(shard: int):
+        db = ReadSessionLocal(admin_id, shard=shard, written_at=written_at)
+        try:
+            query = db.query(User).filter(*criteria)
+            if after_id is not None:
+                query = query.filter(User.id > after_id)
+            return query.order_by(User.id).limit(limit + 1).all()
+        finally:
+            db.close()
+
+    versions = shard_map.scatter(version)
+    etag = "users:" + ".".join(str(number) for number, _ in versions)
+    cached = not_modified(request, response, etag, max(changed_at for _, changed_at in versions))
+    if cached:
+        return cached
+    users = list(islice(heapq.merge(*shard_map.scatter(page), key=lambda u: u.id), limit + 1))
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = str(users[-1].id)
+    return users
+
+@admin_router.get("/admin/users/export")
+def export_users(
+    criteria: list = Depends(user_filters),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """
+    Export CSV de los usuarios filtrados, generado en streaming con un cursor del
+    servidor por shard; los cursores se fusionan por id.
+    """
+    admin_id, written_at = admin_user.id, admin_user.written_at
+    statement = (
+        select(*(getattr(User, column) for column in EXPORT_COLUMNS))
+        .where(*criteria)
+        .order_by(User.id)
+        .execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    def rows():
+        with ExitStack() as stack:
+            streams = []
+            for shard in range(shard_map.count):
+                db = stack.enter_context(ReadSessionLocal(admin_id, shard=shard, written_at=written_at))
+                streams.append(db.execute(statement))
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            merged = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=lambda row: row[0])
+            while batch := list(islice(merged, EXPORT_BATCH_SIZE)):
+                writer.writerows(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="users.csv"'},
+    )
 
 @admin_router.post("/admin/users", response_model=UserResponse)
 def create_user(
     user: UserCreateRequest,
-    db: Session = Depends(get_db),
     admin_user: User = Depends(get_current_admin_user)
 ):
+    try:
+        user_id, _ = shard_map.allocate(user.email, user.username)
+    except UserExistsError:
+        raise HTTPException(status_code=400, detail="Username or email already exists")
     hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
     user_data = user.dict()
     user_data.pop("password")
-    db_user = User(**user_data, password=hashed_password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    with UserSessionLocal(user_id) as db:
+        db.info["user_id"] = admin_user.id
+        db_user = User(**user_data, id=user_id, password=hashed_password)
+        db.add(db_user)
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            shard_map.release(user_id)
+            raise
+        db.refresh(db_user)
     return db_user
 
 @admin_router.put("/admin/users/{user_id}", response_model=UserResponse)
 def update_user(
     user_id: int,
     user: UserCreateRequest,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_target_db),
     admin_user: User = Depends(get_current_admin_user)
 ):
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    previous = (db_user.email, db_user.username)
+    try:
+        shard_map.rename(user_id, user.email, user.username)
+    except UserExistsError:
+        raise HTTPException(status_code=400, detail="Username or email already exists")
     for key, value in user.dict().items():
         setattr(db_user, key, value)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        shard_map.rename(user_id, *previous)
+        raise
     db.refresh(db_user)
     return db_user
 
 @admin_router.delete("/admin/users/{user_id}")
 def inactivate_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_target_db),
     admin_user: User = Depends(get_current_admin_user)
 ):
     db_user = db.query(User).filter(User.id == user_id).first()
@@ -81,7 +254,7 @@ def inactivate_user(
 @admin_router.put("/admin/users/{user_id}/activate")
 def activate_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_target_db),
     admin_user: User = Depends(get_current_admin_user)
 ):
     db_user = db.query(User).filter(User.id == user_id).first()
@@ -89,4 +262,64 @@ def activate_user(
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     db_user.is_active = True
     db.commit()
-    return {"detail": "Usuario reactivado correctamente"}
\ No newline at end of file
+    return {"detail": "Usuario reactivado correctamente"}
+
+@admin_router.get("/admin/analytics")
+def get_platform_analytics(
+    refresh: bool = Query(False, description="Encola un recálculo"),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """
+    Métricas de toda la plataforma: usuarios activos, altas por mes, antigüedad del
+    último login y volumen de movimientos por mes. Se sirven siempre del último
+    resultado guardado por el trabajo `admin.analytics`; `stale` indica que venció
+    (o se pidió `refresh`) y hay un recálculo encolado. Mientras no hay ninguno
+    responde 202 `{"stale": true}`.
+    """
+    db = ReadSessionLocal(admin_user.id, shard=0, written_at=admin_user.written_at)
+    try:
+        value = analytics.get(db, force=refresh)
+    finally:
+        db.close()
+    if value is None:
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"stale": True})
+    return value
+
+@admin_router.get("/admin/metrics")
+def get_metrics(admin_user: User = Depends(get_current_admin_user)):
+    """Métricas internas del proceso (buffers en memoria)."""
+    return {
+        "lastLoginBuffer": last_login_buffer.stats(),
+        "replicas": replica_pool.stats(),
+        "analyticsCache": analytics_cache.stats(),
+        "labelIndex": label_index.stats(),
+        "shards": shard_map.stats(),
+        "changeBus": change_bus.stats(),
+        "admission": admission_stats(),
+        "jobs": job_runner.stats()
+    }
+
+
+@admin_router.get("/admin/profiles")
+def get_profiles(
+    limit: int = Query(50, ge=1, le=500),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Perfiles guardados en este servidor (cabecera X-Profile), del más reciente al más antiguo."""
+    return profiling.list_profiles(limit)
+
+@admin_router.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, admin_user: User = Depends(get_current_admin_user)):
+    """Traza del perfil: duración, estado y cada sentencia SQL con su duración."""
+    trace = profiling.load_trace(profile_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return trace
+
+@admin_router.get("/admin/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+def get_profile_folded(profile_id: str, admin_user: User = Depends(get_current_admin_user)):
+    """Pilas muestreadas en formato folded, para flamegraph.pl o speedscope."""
+    folded = profiling.load_folded(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return folded
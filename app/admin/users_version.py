@@ -0,0 +1,45 @@
+"""
+Versión del listado de usuarios de cada shard (tabla de una fila `users_version`).
+
+Las altas, cambios y bajas de usuarios por el ORM anotan el cambio y al final del
+flush se incrementa la versión en la misma transacción; el volcado de last_login
+la incrementa en su propio UPDATE. La ETag de GET /admin/users lee solo esa fila
+de cada shard en vez de agregar la tabla users entera.
+"""
+from datetime import datetime
+from sqlalchemy import event, text
+from sqlalchemy.orm import object_session
+from app.database.database import SessionLocal
+from app.models.user import User
+
+
+def bump(connection) -> None:
+    connection.execute(
+        text("UPDATE users_version SET version = version + 1, changed_at = :now"),
+        {"now": datetime.utcnow()},
+    )
+
+
+def current(db) -> tuple[int, datetime]:
+    return tuple(db.execute(text("SELECT version, changed_at FROM users_version")).one())
+
+
+def _record(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["users_changed"] = True
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(User, _event, _record)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _bump(session, flush_context):
+    if session.info.pop("users_changed", False):
+        bump(session.connection())
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard(session):
+    session.info.pop("users_changed", None)
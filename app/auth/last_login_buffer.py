@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import text
+from app.admin import users_version
+from app.config import settings
+from app.database.database import shard_map
+
+logger = logging.getLogger(__name__)
+
+# Máximo de filas por sentencia UPDATE ... FROM (VALUES ...)
+FLUSH_CHUNK_SIZE = 1000
+
+
+class LastLoginBuffer:
+    """
+    Buffer write-behind para users.last_login.
+
+    El login solo registra el timestamp en memoria; un hilo en segundo plano
+    agrupa los valores por usuario (se conserva el más reciente) y los escribe
+    en un único UPDATE por lote y shard cada `flush_interval` segundos y al apagar.
+    """
+
+    def __init__(self, shards, flush_interval: float, max_size: int):
+        self.shards = shards
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._pending: dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._metrics = {
+            "recorded": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "failedFlushes": 0,
+            "rowsFlushed": 0,
+            "lastFlushRows": 0,
+            "lastFlushMs": 0.0,
+            "maxFlushMs": 0.0,
+            "lastFlushAt": None,
+        }
+
+    def record(self, user_id: int, when: datetime) -> None:
+        with self._lock:
+            full = user_id not in self._pending and len(self._pending) >= self.max_size
+        if full:
+            # El buffer está lleno: se vacía en línea antes de aceptar más usuarios
+            self.flush()
+
+        with self._lock:
+            self._metrics["recorded"] += 1
+            current = self._pending.get(user_id)
+            if current is not None:
+                self._metrics["coalesced"] += 1
+                if when > current:
+                    self._pending[user_id] = when
+            elif len(self._pending) >= self.max_size:
+                # El flush falló (p. ej. base de datos caída); last_login no es crítico
+                self._metrics["dropped"] += 1
+            else:
+                self._pending[user_id] = when
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                by_shard = defaultdict(list)
+                for user_id, when in batch.items():
+                    by_shard[self.shards.shard_for(user_id)].append((user_id, when))
+                # Reintentar un lote ya escrito en otro shard es inocuo (solo avanza last_login)
+                for shard, items in by_shard.items():
+                    with self.shards.engines[shard].begin() as conn:
+                        for i in range(0, len(items), FLUSH_CHUNK_SIZE):
+                            self._write(conn, items[i:i + FLUSH_CHUNK_SIZE])
+            except Exception:
+                logger.exception("No se pudo escribir el lote de last_login (%s usuarios)", len(batch))
+                with self._lock:
+                    for user_id, when in batch.items():
+                        current = self._pending.get(user_id)
+                        if current is None or when > current:
+                            self._pending[user_id] = when
+                    self._metrics["failedFlushes"] += 1
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._metrics["flushes"] += 1
+                self._metrics["rowsFlushed"] += len(batch)
+                self._metrics["lastFlushRows"] = len(batch)
+                self._metrics["lastFlushMs"] = round(elapsed_ms, 3)
+                self._metrics["maxFlushMs"] = max(self._metrics["maxFlushMs"], round(elapsed_ms, 3))
+                self._metrics["lastFlushAt"] = datetime.utcnow()
+            return len(batch)
+
+    @staticmethod
+    def _write(conn, items) -> None:
+        values = ", ".join(
+            f"(CAST(:id{i} AS INTEGER), CAST(:ts{i} AS TIMESTAMP))" for i in range(len(items))
+        )
+        params = {}
+        for i, (user_id, when) in enumerate(items):
+            params[f"id{i}"] = user_id
+            params[f"ts{i}"] = when
+        conn.execute(
+            text(
+                "UPDATE users SET last_login = v.last_login "
+                f"FROM (VALUES {values}) AS v(id, last_login) "
+                "WHERE users.id = v.id "
+                "AND (users.last_login IS NULL OR users.last_login < v.last_login)"
+            ),
+            params,
+        )
+        users_version.bump(conn)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="last-login-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._metrics, "pending": len(self._pending), "maxSize": self.max_size}
+
+
+last_login_buffer = LastLoginBuffer(
+    shard_map,
+    flush_interval=settings.LAST_LOGIN_FLUSH_INTERVAL,
+    max_size=settings.LAST_LOGIN_BUFFER_SIZE,
+)
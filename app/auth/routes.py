@@ -4,8 +4,11 @@ from sqlalchemy.orm import Session
 from app.schemas.auth import RegisterRequest, LoginRequest, TokenResponse
 from app.auth.jwt_handler import create_access_token
 from app.models.user import User
-from app.database.database import SessionLocal
+from app.models.user_shard import UserShard  # noqa: F401  (tabla en los metadatos)
+from app.database.database import SessionLocal, shard_map
+from app.database.sharding import UserExistsError
 from app.utils.dependencies import get_db
+from app.auth.last_login_buffer import last_login_buffer
 from datetime import datetime
 
 
@@ -13,12 +16,14 @@ auth_router = APIRouter(tags=["Auth"])
 
 @auth_router.post("/login", response_model=TokenResponse)
 def login(request: LoginRequest, db: Session = Depends(get_db)):
+    located = shard_map.locate(request.email) if shard_map.count > 1 else None
+    if located is not None:
+        db.info["shard"] = located[1]
     user = db.query(User).filter(User.email == request.email, User.is_active == True).first()
     if not user or not bcrypt.checkpw(request.password.encode('utf-8'), user.password.encode('utf-8')):
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    user.last_login = datetime.utcnow()
-    db.commit()
-    access_token = create_access_token({"sub": user.email, "is_admin": user.is_admin})
+    last_login_buffer.record(user.id, datetime.utcnow())
+    access_token = create_access_token({"sub": user.email, "uid": user.id, "is_admin": user.is_admin})
     return TokenResponse(
         access_token=access_token,
         token_type="bearer",
@@ -28,11 +33,15 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
 
 @auth_router.post("/register", response_model=TokenResponse)
 def register(request: RegisterRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter((User.username == request.username) | (User.email == request.email)).first()
-    if user:
-        raise HTTPException(status_code=400, detail="Username or email already exists")    
+    # El directorio de shards garantiza email y username únicos entre todos los shards
+    try:
+        user_id, shard = shard_map.allocate(request.email, request.username)
+    except UserExistsError:
+        raise HTTPException(status_code=400, detail="Username or email already exists")
+    db.info["shard"] = shard
     hashed_password = bcrypt.hashpw(request.password.encode('utf-8'), bcrypt.gensalt())    
     new_user = User(
+        id=user_id,
         username=request.username,
         email=request.email,
         last_login=datetime.utcnow(),
@@ -41,9 +50,14 @@ def register(request: RegisterRequest, db: Session = Depends(get_db)):
         is_active=True
     )
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        shard_map.release(user_id)
+        raise
     db.refresh(new_user)    
-    access_token = create_access_token({"sub": new_user.email})
+    access_token = create_access_token({"sub": new_user.email, "uid": new_user.id})
     return TokenResponse(
         access_token=access_token,
         token_type="bearer",
@@ -18,9 +18,115 @@ class Settings:
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "password")
     DATABASE_URL: str = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+    # Réplicas de lectura (URLs separadas por comas) para los endpoints GET
+    DB_REPLICA_URLS: list[str] = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+    REPLICA_HEALTH_CHECK_INTERVAL: float = float(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", 10))
+    READ_YOUR_WRITES_SECONDS: float = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+    # Dónde se recuerda la última escritura: "local" (por worker) o "postgres" (users.written_at)
+    READ_YOUR_WRITES_BACKEND: str = os.getenv("READ_YOUR_WRITES_BACKEND", "local")
+
+    # Shards adicionales de datos de usuario (URLs separadas por comas); el shard 0 es
+    # DATABASE_URL. Paso común de las secuencias intercaladas (máximo de shards) y
+    # entradas de la caché usuario -> shard
+    DB_SHARD_URLS: list[str] = [url.strip() for url in os.getenv("DB_SHARD_URLS", "").split(",") if url.strip()]
+    SHARD_ID_STRIDE: int = int(os.getenv("SHARD_ID_STRIDE", 64))
+    SHARD_DIRECTORY_CACHE_SIZE: int = int(os.getenv("SHARD_DIRECTORY_CACHE_SIZE", 100000))
+
+    # Particionado anual de transactions
+    PARTITION_YEARS_AHEAD: int = int(os.getenv("PARTITION_YEARS_AHEAD", 2))
+    ARCHIVE_TABLESPACE: str | None = os.getenv("ARCHIVE_TABLESPACE") or None
+
+    # Entradas máximas de la caché id <-> nombre de categorías/fuentes/métodos de pago
+    LABEL_CACHE_SIZE: int = int(os.getenv("LABEL_CACHE_SIZE", 100000))
+
+    # Caché columnar de analytics por worker (0 la desactiva) y vida máxima de cada entrada
+    ANALYTICS_CACHE_MB: int = int(os.getenv("ANALYTICS_CACHE_MB", 128))
+    ANALYTICS_CACHE_TTL: float = float(os.getenv("ANALYTICS_CACHE_TTL", 60))
+
+    # Notificación de cambios para el stream SSE: "local" (un proceso) o "postgres" (LISTEN/NOTIFY)
+    EVENTS_BACKEND: str = os.getenv("EVENTS_BACKEND", "local")
+    SSE_HEARTBEAT_SECONDS: float = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+    SSE_DEBOUNCE_SECONDS: float = float(os.getenv("SSE_DEBOUNCE_SECONDS", 0.25))
+
+    # Control de admisión: token buckets (tokens/s y ráfaga) por IP y por usuario, backend
+    # "memory" (por worker) o "postgres" (compartido), y límite global de concurrencia
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() in ("true", "1", "yes")
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_IP_RATE: float = float(os.getenv("RATE_LIMIT_IP_RATE", 20))
+    RATE_LIMIT_IP_BURST: float = float(os.getenv("RATE_LIMIT_IP_BURST", 100))
+    RATE_LIMIT_USER_RATE: float = float(os.getenv("RATE_LIMIT_USER_RATE", 10))
+    RATE_LIMIT_USER_BURST: float = float(os.getenv("RATE_LIMIT_USER_BURST", 50))
+    MAX_CONCURRENT_REQUESTS: int = int(os.getenv("MAX_CONCURRENT_REQUESTS", 32))
+    QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("QUEUE_TIMEOUT_SECONDS", 2))
+    STATEMENT_TIMEOUT_MS: int = int(os.getenv("STATEMENT_TIMEOUT_MS", 2000))
+
+    # Compresión de respuestas: tamaño mínimo en bytes y niveles de gzip (1-9) y brotli (0-11)
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+    GZIP_LEVEL: int = int(os.getenv("GZIP_LEVEL", 6))
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", 4))
+
+    # /admin/analytics: vida del resultado guardado y periodo del trabajo que lo recalcula (s),
+    # e hilos/conexiones del cálculo en paralelo
+    ADMIN_ANALYTICS_TTL: float = float(os.getenv("ADMIN_ANALYTICS_TTL", 300))
+    ADMIN_ANALYTICS_WORKERS: int = int(os.getenv("ADMIN_ANALYTICS_WORKERS", 4))
+
+    # Cola de trabajos: "inprocess" (hilos en la API) o "external" (python -m app.jobs.runner)
+    JOBS_MODE: str = os.getenv("JOBS_MODE", "inprocess")
+    JOBS_WORKER_THREADS: int = int(os.getenv("JOBS_WORKER_THREADS", 2))
+    JOBS_POLL_INTERVAL: float = float(os.getenv("JOBS_POLL_INTERVAL", 1))
+    JOBS_RETENTION_DAYS: int = int(os.getenv("JOBS_RETENTION_DAYS", 7))
+    # Mantener los checkpoints de saldo desde la cola en lugar de en la transacción de escritura.
+    # Opcional y desactivado por defecto: con él /finance/balance puede ir por detrás de la última
+    # escritura (presupuestos, uso de etiquetas y data_version siguen siempre en la transacción)
+    CHECKPOINTS_ASYNC: bool = os.getenv("CHECKPOINTS_ASYNC", "False").lower() in ("true", "1", "yes")
+
+    # /finance/sync: margen del token para escrituras que confirman tarde y vida de las lápidas
+    SYNC_OVERLAP_SECONDS: float = float(os.getenv("SYNC_OVERLAP_SECONDS", 5))
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", 90))
+
+    # Horas que se guarda la respuesta de cada Idempotency-Key
+    IDEMPOTENCY_KEY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+
+    # Moneda base de los usuarios nuevos (ISO 4217) y segundos entre comprobaciones de
+    # la caché de tipos de cambio en memoria
+    DEFAULT_CURRENCY: str = os.getenv("DEFAULT_CURRENCY", "USD").upper()
+    FX_CACHE_TTL: float = float(os.getenv("FX_CACHE_TTL", 300))
+    # Moneda en la que se expresan los tipos de los CSV (tipo 1 implícito al importar)
+    FX_REFERENCE_CURRENCY: str = os.getenv("FX_REFERENCE_CURRENCY", DEFAULT_CURRENCY).upper()
+
+    # Autocompletado de etiquetas: memoria del índice por worker (0 lo desactiva), vida de
+    # cada entrada y días en los que el peso de un uso se reduce a la mitad
+    AUTOCOMPLETE_CACHE_MB: int = int(os.getenv("AUTOCOMPLETE_CACHE_MB", 16))
+    AUTOCOMPLETE_CACHE_TTL: float = float(os.getenv("AUTOCOMPLETE_CACHE_TTL", 300))
+    AUTOCOMPLETE_HALF_LIFE_DAYS: float = float(os.getenv("AUTOCOMPLETE_HALF_LIFE_DAYS", 90))
+
+    # Perfilado bajo demanda (cabecera X-Profile de admins): directorio de perfiles,
+    # cuántos se guardan, segundos entre muestras de pila y duración máxima del muestreo
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "/tmp/finance-profiles")
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", 200))
+    PROFILE_SAMPLE_INTERVAL: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+
+    # Servidor de producción (gunicorn.conf.py): dirección, workers (0 = uno por núcleo
+    # disponible), reciclado tras N peticiones más un jitter aleatorio, segundos para
+    # drenar las peticiones en curso y para dar por colgado un worker
+    SERVER_BIND: str = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", 0))
+    SERVER_MAX_REQUESTS: int = int(os.getenv("SERVER_MAX_REQUESTS", 10000))
+    SERVER_MAX_REQUESTS_JITTER: int = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", 1000))
+    SERVER_GRACEFUL_TIMEOUT: float = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+    SERVER_TIMEOUT: float = float(os.getenv("SERVER_TIMEOUT", 60))
+    # Migraciones y particiones en el startup de cada proceso; el lanzador de producción
+    # las aplica una vez en el maestro y lo desactiva para los workers
+    MIGRATE_ON_STARTUP: bool = os.getenv("MIGRATE_ON_STARTUP", "True").lower() in ("true", "1", "yes")
+
     # Configuración de seguridad
     SECRET_KEY: str = os.getenv("SECRET_KEY", "default_secret_key")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
+    # Buffer write-behind de last_login
+    LAST_LOGIN_FLUSH_INTERVAL: float = float(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", 5))
+    LAST_LOGIN_BUFFER_SIZE: int = int(os.getenv("LAST_LOGIN_BUFFER_SIZE", 10000))
+
 settings = Settings()
\ No newline at end of file
@@ -1,13 +1,79 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, text
 from databases import Database
 from app.config import settings
+from app.database.routing import ReplicaPool, PrimaryPins
+from app.database.sharding import ShardMap
 
 DATABASE_URL = settings.DATABASE_URL
 
 engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+shard_map = ShardMap(engine, settings.DB_SHARD_URLS, settings.SHARD_DIRECTORY_CACHE_SIZE)
+
+
+class ShardSession(Session):
+    """Sesión que usa el engine de `info["shard"]` si se fijó (get_current_user, UserSessionLocal)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kw):
+        shard = self.info.get("shard")
+        if bind is None and shard is not None:
+            return shard_map.engines[shard]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kw)
+
+
+SessionLocal = sessionmaker(class_=ShardSession, autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-database = Database(DATABASE_URL)
\ No newline at end of file
+database = Database(DATABASE_URL)
+
+replica_pool = ReplicaPool(settings.DB_REPLICA_URLS, settings.REPLICA_HEALTH_CHECK_INTERVAL)
+primary_pins = PrimaryPins(settings.READ_YOUR_WRITES_SECONDS)
+
+def UserSessionLocal(user_id: int):
+    """Sesión en el primario del shard del usuario."""
+    return SessionLocal(info={"shard": shard_map.shard_for(user_id)})
+
+def _pinned(user_id: int, written_at: datetime | None) -> bool:
+    """Si las lecturas del usuario deben ir al primario (ventana read-your-writes)."""
+    if settings.READ_YOUR_WRITES_BACKEND == "postgres":
+        return written_at is not None and written_at > datetime.utcnow() - timedelta(seconds=settings.READ_YOUR_WRITES_SECONDS)
+    return primary_pins.is_pinned(user_id)
+
+def ReadSessionLocal(user_id: int | None = None, shard: int | None = None, written_at: datetime | None = None):
+    """Sesión para handlers de solo lectura: réplica sana en round-robin o, si no hay
+    réplicas o el usuario acaba de escribir, el primario. Las réplicas son del shard 0;
+    los demás shards se leen de su primario. `written_at` es `users.written_at` leído
+    del primario (backend postgres de read-your-writes)."""
+    if shard is None:
+        shard = shard_map.shard_for(user_id) if user_id is not None else 0
+    if shard:
+        return SessionLocal(info={"shard": shard})
+    bind = None
+    if user_id is None or not _pinned(user_id, written_at):
+        bind = replica_pool.choose()
+    return SessionLocal(bind=bind or engine)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_write(session, flush_context):
+    user_id = session.info.get("user_id")
+    if (
+        settings.READ_YOUR_WRITES_BACKEND == "postgres" and replica_pool.engines
+        and user_id is not None and not session.info.get("wrote")
+    ):
+        # Una vez por transacción y en ella: al confirmarse lo ve cualquier worker
+        session.connection().execute(
+            text("UPDATE users SET written_at = :now WHERE id = :id"), {"now": datetime.utcnow(), "id": user_id}
+        )
+    session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def _pin_after_write(session):
+    user_id = session.info.get("user_id")
+    if session.info.pop("wrote", False) and user_id is not None and settings.READ_YOUR_WRITES_BACKEND == "local":
+        primary_pins.pin(user_id)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _clear_write(session):
+    session.info.pop("wrote", None)
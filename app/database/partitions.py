@@ -0,0 +1,147 @@
+"""
+Mantenimiento de las particiones anuales de `transactions` (ingresos y gastos).
+
+Uso desde la línea de comandos:
+
+    python -m app.database.partitions ensure [--years-ahead 2]
+    python -m app.database.partitions list
+    python -m app.database.partitions move transactions 2019 --tablespace archivo
+    python -m app.database.partitions detach transactions 2019 [--tablespace archivo]
+"""
+import argparse
+import logging
+from datetime import datetime
+from sqlalchemy import text
+from app.config import settings
+from app.database.database import shard_map
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("transactions",)
+
+
+def partition_name(table: str, year: int) -> str:
+    return f"{table}_y{year}"
+
+
+def _check_table(table: str) -> None:
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"{table} no es una tabla particionada")
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table)"),
+        {"table": table},
+    ).scalar()
+
+
+def list_partitions(conn, table: str) -> list[dict]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), COALESCE(ts.spcname, 'pg_default'), "
+            "pg_total_relation_size(c.oid) "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "LEFT JOIN pg_tablespace ts ON ts.oid = c.reltablespace "
+            "WHERE p.relname = :table ORDER BY c.relname"
+        ),
+        {"table": table},
+    ).all()
+    return [{"name": n, "bounds": b, "tablespace": ts, "bytes": size} for n, b, ts, size in rows]
+
+
+def _partition_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def create_partition(conn, table: str, year: int) -> bool:
+    """
+    Crea la partición del año indicado. Las filas de ese año que hubieran caído en
+    la partición DEFAULT se mueven a la nueva antes de adjuntarla.
+    """
+    _check_table(table)
+    name = partition_name(table, year)
+    if _partition_exists(conn, name):
+        return False
+    start, end = f"{year}-01-01", f"{year + 1}-01-01"
+    # ATTACH exige los mismos CHECK que la tabla padre
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    if _partition_exists(conn, f"{table}_default"):
+        conn.execute(text(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE date >= '{start}' AND date < '{end}' RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ))
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"))
+    return True
+
+
+def ensure_future_partitions(conn, years_ahead: int = settings.PARTITION_YEARS_AHEAD) -> list[str]:
+    """Garantiza que existan las particiones del año en curso y de los `years_ahead` siguientes."""
+    current = datetime.utcnow().year
+    created = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(conn, table):
+            continue
+        for year in range(current, current + years_ahead + 1):
+            if create_partition(conn, table, year):
+                created.append(partition_name(table, year))
+    if created:
+        logger.info("Particiones creadas: %s", ", ".join(created))
+    return created
+
+
+def move_partition(conn, table: str, year: int, tablespace: str) -> None:
+    """Mueve una partición antigua a otro tablespace (almacenamiento más barato) sin desadjuntarla."""
+    _check_table(table)
+    conn.execute(text(f'ALTER TABLE {partition_name(table, year)} SET TABLESPACE "{tablespace}"'))
+
+
+def detach_partition(conn, table: str, year: int, tablespace: str | None = None) -> str:
+    """
+    Desadjunta una partición: sus filas dejan de aparecer en las consultas pero
+    se conservan en una tabla independiente `<tabla>_y<año>_archive`.
+    """
+    _check_table(table)
+    name = partition_name(table, year)
+    archive = f"{name}_archive"
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    conn.execute(text(f"ALTER TABLE {name} RENAME TO {archive}"))
+    if tablespace:
+        conn.execute(text(f'ALTER TABLE {archive} SET TABLESPACE "{tablespace}"'))
+    return archive
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Mantenimiento de particiones de expenses/incomes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ensure = sub.add_parser("ensure", help="Crea las particiones futuras")
+    ensure.add_argument("--years-ahead", type=int, default=settings.PARTITION_YEARS_AHEAD)
+    sub.add_parser("list", help="Lista las particiones y su tamaño")
+    for command in ("move", "detach"):
+        cmd = sub.add_parser(command)
+        cmd.add_argument("table", choices=PARTITIONED_TABLES)
+        cmd.add_argument("year", type=int)
+        cmd.add_argument("--tablespace", default=settings.ARCHIVE_TABLESPACE, required=command == "move" and not settings.ARCHIVE_TABLESPACE)
+    args = parser.parse_args(argv)
+
+    for shard, engine in enumerate(shard_map.engines):
+        if shard_map.count > 1:
+            print(f"# shard {shard}")
+        with engine.begin() as conn:
+            if args.command == "ensure":
+                created = ensure_future_partitions(conn, args.years_ahead)
+                print("Creadas:", ", ".join(created) or "ninguna")
+            elif args.command == "list":
+                for table in PARTITIONED_TABLES:
+                    for partition in list_partitions(conn, table):
+                        print(f"{partition['name']:<24} {partition['tablespace']:<14} {partition['bytes']:>12}  {partition['bounds']}")
+            elif args.command == "move":
+                move_partition(conn, args.table, args.year, args.tablespace)
+            elif args.command == "detach":
+                print("Archivada en", detach_partition(conn, args.table, args.year, args.tablespace))
+
+
+if __name__ == "__main__":
+    main()
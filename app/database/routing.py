@@ -0,0 +1,102 @@
+import itertools
+import logging
+import threading
+import time
+from sqlalchemy import create_engine, text
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaPool:
+    """
+    Réplicas de lectura elegidas en round-robin.
+
+    Un hilo de fondo comprueba cada réplica con un `SELECT 1` cada
+    `health_check_interval` segundos; `choose` solo lee el último estado, así una
+    réplica colgada nunca bloquea una petición. Las que fallan se saltan hasta
+    que una comprobación posterior las vuelve a dar por sanas.
+    """
+
+    def __init__(self, urls: list[str], health_check_interval: float):
+        self.health_check_interval = health_check_interval
+        self.engines = [create_engine(url, pool_pre_ping=True) for url in urls]
+        self._state = [{"healthy": True, "checkedAt": 0.0, "failures": 0, "picks": 0} for _ in self.engines]
+        self._counter = itertools.count()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def choose(self):
+        """Devuelve el engine de la siguiente réplica sana, o None si no hay ninguna."""
+        for _ in range(len(self.engines)):
+            index = next(self._counter) % len(self.engines)
+            if self._state[index]["healthy"]:
+                self._state[index]["picks"] += 1
+                return self.engines[index]
+        return None
+
+    def check(self) -> None:
+        """Comprueba todas las réplicas una vez (lo llama el hilo de fondo)."""
+        for engine, state in zip(self.engines, self._state):
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                state["healthy"] = True
+            except Exception:
+                logger.warning("Réplica %s no disponible", engine.url.render_as_string(hide_password=True))
+                state["healthy"] = False
+                state["failures"] += 1
+            state["checkedAt"] = time.monotonic()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.health_check_interval):
+            self.check()
+
+    def start(self) -> None:
+        if not self.engines or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.health_check_interval + 5)
+            self._thread = None
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "url": engine.url.render_as_string(hide_password=True),
+                "healthy": state["healthy"],
+                "failures": state["failures"],
+                "picks": state["picks"],
+            }
+            for engine, state in zip(self.engines, self._state)
+        ]
+
+
+class PrimaryPins:
+    """
+    Ventana read-your-writes: tras un commit con escrituras, las lecturas del
+    usuario se envían al primario durante `window` segundos. Es local al worker
+    (READ_YOUR_WRITES_BACKEND=local); con varios workers se usa `users.written_at`.
+    """
+
+    MAX_ENTRIES = 100000
+
+    def __init__(self, window: float):
+        self.window = window
+        self._until: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def pin(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._until) >= self.MAX_ENTRIES:
+                self._until = {uid: until for uid, until in self._until.items() if until > now}
+            self._until[user_id] = now + self.window
+
+    def is_pinned(self, user_id: int) -> bool:
+        until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
@@ -0,0 +1,201 @@
+"""
+Reparto de los datos de usuario entre varias bases Postgres (shards).
+
+El shard 0 es la base de DATABASE_URL y guarda además el directorio
+`user_shards` (id, email, username, shard) y las tablas globales (jobs, buckets
+de rate limit). Los usuarios nuevos reciben el id del directorio y se colocan
+en `id % N`; como la ubicación queda escrita, añadir shards no mueve a nadie.
+Todo lo que cuelga de un usuario (users, expenses, incomes, labels, checkpoints,
+presupuestos...) vive en su shard.
+
+Las secuencias de todos los shards se intercalan (mismo paso SHARD_ID_STRIDE y
+distinto resto), así los ids son únicos entre shards y las cachés por id
+(etiquetas, analytics) no necesitan saber de shards.
+
+    python -m app.database.sharding status
+"""
+import argparse
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# Secuencia del directorio: reparte los usuarios con `id % N` y no se intercala
+DIRECTORY_SEQUENCE = "user_shards_user_id_seq"
+
+
+class UserExistsError(Exception):
+    """El email o el username ya están en el directorio."""
+
+
+class ShardMap:
+    """Engines de los shards y directorio usuario -> shard con caché LRU en proceso."""
+
+    def __init__(self, primary, urls: list[str], cache_size: int):
+        self.engines = [primary] + [create_engine(url, pool_pre_ping=True) for url in urls]
+        self.cache_size = cache_size
+        self._shards: OrderedDict[int, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0}
+
+    @property
+    def count(self) -> int:
+        return len(self.engines)
+
+    @property
+    def directory(self):
+        return self.engines[0]
+
+    def _remember(self, user_id: int, shard: int) -> None:
+        with self._lock:
+            self._shards[user_id] = shard
+            self._shards.move_to_end(user_id)
+            while len(self._shards) > self.cache_size:
+                self._shards.popitem(last=False)
+
+    def shard_for(self, user_id: int) -> int:
+        """Shard del usuario; 0 con un solo shard o si no está en el directorio."""
+        if self.count == 1:
+            return 0
+        shard = self._shards.get(user_id)
+        if shard is not None:
+            self._metrics["hits"] += 1
+            return shard
+        self._metrics["misses"] += 1
+        with self.directory.connect() as conn:
+            shard = conn.execute(
+                text("SELECT shard FROM user_shards WHERE user_id = :user_id"), {"user_id": user_id}
+            ).scalar()
+        if shard is None:
+            return 0
+        self._remember(user_id, shard)
+        return shard
+
+    def locate(self, email: str) -> tuple[int, int] | None:
+        """(user_id, shard) por email, para el login y los tokens sin `uid`."""
+        with self.directory.connect() as conn:
+            row = conn.execute(
+                text("SELECT user_id, shard FROM user_shards WHERE email = :email"), {"email": email}
+            ).first()
+        if row is None:
+            return None
+        self._remember(*row)
+        return tuple(row)
+
+    def allocate(self, email: str, username: str) -> tuple[int, int]:
+        """
+        Reserva id y shard para un usuario nuevo en una transacción propia del
+        directorio. Si el alta en el shard falla hay que llamar a `release`.
+        """
+        try:
+            with self.directory.begin() as conn:
+                user_id = conn.execute(text("""
+                    INSERT INTO user_shards (email, username, shard, created_at)
+                    VALUES (:email, :username, 0, now())
+                    RETURNING user_id
+                """), {"email": email, "username": username}).scalar_one()
+                shard = user_id % self.count
+                conn.execute(
+                    text("UPDATE user_shards SET shard = :shard WHERE user_id = :user_id"),
+                    {"shard": shard, "user_id": user_id},
+                )
+        except IntegrityError:
+            raise UserExistsError(email)
+        self._remember(user_id, shard)
+        return user_id, shard
+
+    def release(self, user_id: int) -> None:
+        with self.directory.begin() as conn:
+            conn.execute(text("DELETE FROM user_shards WHERE user_id = :user_id"), {"user_id": user_id})
+        with self._lock:
+            self._shards.pop(user_id, None)
+
+    def rename(self, user_id: int, email: str, username: str) -> None:
+        """Actualiza email/username en el directorio (únicos entre todos los shards)."""
+        try:
+            with self.directory.begin() as conn:
+                conn.execute(
+                    text("UPDATE user_shards SET email = :email, username = :username WHERE user_id = :user_id"),
+                    {"email": email, "username": username, "user_id": user_id},
+                )
+        except IntegrityError:
+            raise UserExistsError(email)
+
+    def engines_for(self, user_id: int | None = None) -> list:
+        """Engine del shard del usuario, o todos si no se indica."""
+        return [self.engines[self.shard_for(user_id)]] if user_id is not None else list(self.engines)
+
+    def scatter(self, func, shards=None) -> list:
+        """Ejecuta `func(shard)` en paralelo, un hilo por shard; resultados en orden de shard."""
+        shards = list(range(self.count)) if shards is None else list(shards)
+        if len(shards) == 1:
+            return [func(shards[0])]
+        with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="shard") as pool:
+            return list(pool.map(func, shards))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._metrics,
+                "shards": [engine.url.render_as_string(hide_password=True) for engine in self.engines],
+                "cached": len(self._shards),
+            }
+
+
+def interleave_sequences(connections: list, stride: int) -> list[str]:
+    """
+    Pone cada secuencia del shard i a paso `stride` y resto i, empezando por encima
+    del máximo de todos los shards. Las que ya tienen ese paso no se tocan, de modo
+    que solo se ajustan los shards nuevos. Devuelve las secuencias modificadas.
+    """
+    sequences = [
+        {
+            (name, step): last
+            for name, step, last in conn.execute(text(
+                "SELECT sequencename, increment_by, last_value FROM pg_sequences WHERE schemaname = current_schema()"
+            ))
+        }
+        for conn in connections
+    ]
+    ceiling: dict[str, int] = {}
+    for shard_sequences in sequences:
+        for (name, _), last in shard_sequences.items():
+            ceiling[name] = max(ceiling.get(name, 0), last or 0)
+    changed = []
+    for shard, (conn, shard_sequences) in enumerate(zip(connections, sequences)):
+        for name, step in shard_sequences:
+            if step == stride or name == DIRECTORY_SEQUENCE:
+                continue
+            start = (ceiling[name] // stride + 1) * stride + shard
+            conn.execute(text(f'ALTER SEQUENCE "{name}" INCREMENT BY {stride} RESTART WITH {start}'))
+            changed.append(f"{shard}:{name}")
+    return changed
+
+
+def main(argv=None) -> None:
+    from app.database.database import shard_map
+
+    parser = argparse.ArgumentParser(description="Shards de datos de usuario")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Usuarios por shard según el directorio y según cada shard")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        with shard_map.directory.connect() as conn:
+            placed = dict(conn.execute(text("SELECT shard, COUNT(*) FROM user_shards GROUP BY shard")).all())
+
+        def count_users(shard: int) -> int:
+            with shard_map.engines[shard].connect() as conn:
+                return conn.execute(text("SELECT COUNT(*) FROM users")).scalar()
+
+        for shard, stored in enumerate(shard_map.scatter(count_users)):
+            url = shard_map.engines[shard].url.render_as_string(hide_password=True)
+            print(f"{shard}\t{url}\tdirectorio={placed.get(shard, 0)}\tusers={stored}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Caché columnar por usuario para /finance/analytics.
+
+Cada usuario en caché tiene sus movimientos (ingresos y gastos) en arreglos
+NumPy tipados: fecha como segundos epoch int64, importe en céntimos int64 (en su
+moneda original), categoría/fuente como id de `labels` int32 y moneda como código
+int16 de app/finance/fx.py. Se carga al primer acceso, los
+handlers de escritura la actualizan en el sitio y un LRU la mantiene por debajo
+de ANALYTICS_CACHE_MB. La caché es local a cada worker: las escrituras hechas en
+otro worker se ven al vencer ANALYTICS_CACHE_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy import text
+from app.config import settings
+from app.models.income import Income
+from app.finance.fx import currency_code
+
+KIND_INCOME = 0
+KIND_EXPENSE = 1
+
+_FIELDS = {
+    "ids": np.int64,
+    "kinds": np.int8,
+    "dates": np.int64,
+    "amounts": np.int64,
+    "codes": np.int32,
+    "active": np.bool_,
+    "currencies": np.int16,
+}
+# Bytes estimados por entrada del índice (kind, id) -> posición
+_INDEX_ENTRY_BYTES = 120
+_MIN_CAPACITY = 64
+
+
+def to_epoch(value) -> int:
+    return int(np.datetime64(value, "s").astype(np.int64))
+
+
+def to_cents(amount) -> int:
+    return int(round(float(amount) * 100))
+
+
+class UserColumns:
+    """Movimientos de un usuario en arreglos paralelos con capacidad amortizada."""
+
+    def __init__(self, capacity: int = _MIN_CAPACITY):
+        capacity = max(capacity, _MIN_CAPACITY)
+        self._data = {name: np.empty(capacity, dtype) for name, dtype in _FIELDS.items()}
+        self.size = 0
+        self.positions: dict[tuple[int, int], int] = {}
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows) -> "UserColumns":
+        """Construye las columnas a partir de filas (kind, id, date, amount, code, active, currency)."""
+        columns = cls(len(rows) * 5 // 4)
+        if rows:
+            kinds, ids, dates, amounts, codes, active, currencies = zip(*rows)
+            n = len(rows)
+            columns._data["kinds"][:n] = kinds
+            columns._data["ids"][:n] = ids
+            columns._data["dates"][:n] = np.array(dates, dtype="datetime64[s]").astype(np.int64)
+            columns._data["amounts"][:n] = np.rint(np.array(amounts, dtype=np.float64) * 100).astype(np.int64)
+            columns._data["codes"][:n] = codes
+            columns._data["active"][:n] = [bool(a) for a in active]
+            columns._data["currencies"][:n] = [currency_code(c) for c in currencies]
+            columns.size = n
+            columns.positions = {(k, i): pos for pos, (k, i) in enumerate(zip(kinds, ids))}
+        return columns
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self._data.values()) + len(self.positions) * _INDEX_ENTRY_BYTES
+
+    def snapshot(self) -> dict[str, np.ndarray]:
+        """Copia de las columnas válidas, para calcular sin mantener el lock."""
+        with self.lock:
+            return {name: array[:self.size].copy() for name, array in self._data.items()}
+
+    def _grow(self) -> None:
+        capacity = len(self._data["ids"]) * 2
+        for name, array in self._data.items():
+            grown = np.empty(capacity, array.dtype)
+            grown[:self.size] = array[:self.size]
+            self._data[name] = grown
+
+    def upsert(self, kind: int, row_id: int, date, amount, code: int, active: bool, currency: str) -> None:
+        with self.lock:
+            pos = self.positions.get((kind, row_id))
+            if pos is None:
+                if self.size == len(self._data["ids"]):
+                    self._grow()
+                pos = self.size
+                self.size += 1
+                self.positions[(kind, row_id)] = pos
+            self._data["kinds"][pos] = kind
+            self._data["ids"][pos] = row_id
+            self._data["dates"][pos] = to_epoch(date)
+            self._data["amounts"][pos] = to_cents(amount)
+            self._data["codes"][pos] = code
+            self._data["active"][pos] = bool(active)
+            self._data["currencies"][pos] = currency_code(currency)
+
+    def remove(self, kind: int, row_id: int) -> None:
+        with self.lock:
+            pos = self.positions.pop((kind, row_id), None)
+            if pos is None:
+                return
+            last = self.size - 1
+            if pos != last:
+                for array in self._data.values():
+                    array[pos] = array[last]
+                moved = (int(self._data["kinds"][pos]), int(self._data["ids"][pos]))
+                self.positions[moved] = pos
+            self.size -= 1
+
+
+def _row_values(obj):
+    if isinstance(obj, Income):
+        return KIND_INCOME, obj.id, obj.date, obj.amount, obj.source_id, obj.is_active, obj.currency
+    return KIND_EXPENSE, obj.id, obj.date, obj.amount, obj.category_id, True, obj.currency
+
+
+def load_columns(db, user_id: int) -> UserColumns:
+    """Lee todos los movimientos del usuario en columnas, sin pasar por la caché."""
+    rows = db.execute(text("""
+        SELECT CASE WHEN kind = 'income' THEN 0 ELSE 1 END, id, date, amount,
+               COALESCE(source_id, category_id), CASE WHEN kind = 'income' THEN is_active ELSE TRUE END, currency
+        FROM transactions WHERE user_id = :user_id
+    """), {"user_id": user_id}).all()
+    return UserColumns.from_rows(rows)
+
+
+class AnalyticsCache:
+    """LRU de UserColumns limitado por memoria total."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[int, UserColumns] = OrderedDict()
+        self._sizes: dict[int, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0, "loads": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, user_id: int) -> UserColumns | None:
+        with self._lock:
+            columns = self._entries.get(user_id)
+            if columns is not None and time.monotonic() - columns.loaded_at > self.ttl:
+                self._discard(user_id)
+                columns = None
+            if columns is not None:
+                self._entries.move_to_end(user_id)
+            return columns
+
+    def get_or_load(self, db, user_id: int) -> UserColumns:
+        columns = self.get(user_id)
+        if columns is not None:
+            self._metrics["hits"] += 1
+            return columns
+        self._metrics["misses"] += 1
+        columns = load_columns(db, user_id)
+        with self._lock:
+            self._discard(user_id)
+            self._entries[user_id] = columns
+            self._metrics["loads"] += 1
+            self._account(user_id)
+        return columns
+
+    def _discard(self, user_id: int) -> None:
+        if self._entries.pop(user_id, None) is not None:
+            self._total_bytes -= self._sizes.pop(user_id, 0)
+
+    def _account(self, user_id: int) -> None:
+        """Recalcula el tamaño de `user_id` y desaloja por LRU si se supera el límite."""
+        columns = self._entries.get(user_id)
+        if columns is not None:
+            size = columns.nbytes
+            self._total_bytes += size - self._sizes.get(user_id, 0)
+            self._sizes[user_id] = size
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted, _ = self._entries.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(evicted, 0)
+            self._metrics["evictions"] += 1
+
+    def upsert(self, obj) -> None:
+        """Refleja un alta o modificación ya confirmada, si el usuario está en caché."""
+        columns = self.get(obj.user_id)
+        if columns is None:
+            return
+        columns.upsert(*_row_values(obj))
+        with self._lock:
+            self._account(obj.user_id)
+
+    def remove(self, model, user_id: int, row_id: int) -> None:
+        """Quita un movimiento ya borrado (`model` es Income o Expense), si el usuario está en caché."""
+        columns = self.get(user_id)
+        if columns is None:
+            return
+        columns.remove(KIND_INCOME if model is Income else KIND_EXPENSE, row_id)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._discard(user_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._metrics,
+                "users": len(self._entries),
+                "bytes": self._total_bytes,
+                "maxBytes": self.max_bytes,
+            }
+
+
+analytics_cache = AnalyticsCache(
+    max_bytes=settings.ANALYTICS_CACHE_MB * 1024 * 1024,
+    ttl=settings.ANALYTICS_CACHE_TTL,
+)
@@ -1,185 +1,310 @@
+import asyncio
 import calendar
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import datetime
-from sqlalchemy import func
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, text
 from app.models.expense import Expense
 from app.models.income import Income
+from app.models.transaction import Transaction
 from app.models.user import User
-from app.utils.dependencies import get_db, get_current_user
+from app.utils.dependencies import get_db, get_read_db, get_current_user
 from calendar import month_name
+from app.utils.dates import year_range, month_range
+from app.utils.label_cache import label_cache
+from app.finance.trends import build_trends
+from app.finance.analytics_cache import analytics_cache, load_columns, to_epoch, KIND_INCOME
+from app.finance import fx
+from app.finance.fx import fx_rates
+from app.finance.events import change_bus
+from app.finance.checkpoints import lifetime_totals
+from app.finance.data_version import user_data_version, user_last_modified
+from app.utils.conditional import not_modified
+from app.models.balance_checkpoint import BalanceCheckpoint
+from app.database.database import UserSessionLocal
+from app.config import settings
 
 analytics_router = APIRouter()
 
-@analytics_router.get("/analytics")
-def get_analytics(
-    year: int = Query(None, description="Año para filtrar"),
-    start_date: datetime = Query(None, description="Fecha de inicio (opcional)"),
-    end_date: datetime = Query(None, description="Fecha de fin (opcional)"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    
-    income_query = db.query(Income).filter(
-        Income.user_id == current_user.id,
-        Income.is_active == True
-    )
-    expense_query = db.query(Expense).filter(
-        Expense.user_id == current_user.id
+# Granularidades de la serie temporal: (nombre, paso de generate_series, rango máximo en días)
+TIMESERIES_GRANULARITIES = [
+    ("day", "1 day", 92),
+    ("week", "1 week", 731),
+    ("month", "1 month", None),
+]
+# Puntos máximos permitidos cuando se fuerza la granularidad
+TIMESERIES_MAX_POINTS = 400
+# Etiqueta del grupo que agrupa las categorías fuera del top-N
+OTHER_CATEGORY = "other"
+# Rangos de importe (inclusive) de expensesDistribution
+DISTRIBUTION_RANGES = [(0, 100), (101, 500), (501, 1000)]
+
+# Pareto por categoría: ranking y acumulado con funciones ventana; las categorías
+# por debajo de :top se agrupan en una sola fila (category_id NULL)
+_PARETO_SQL = """
+    WITH totals AS (
+        SELECT category_id, SUM(amount) AS total
+        FROM expenses
+        WHERE user_id = :user_id
+        GROUP BY category_id
+    ), ranked AS (
+        SELECT category_id, total, ROW_NUMBER() OVER (ORDER BY total DESC, category_id) AS position
+        FROM totals
+    ), buckets AS (
+        SELECT CASE WHEN position <= :top THEN category_id END AS category_id,
+               SUM(total) AS total, MIN(position) AS position
+        FROM ranked
+        GROUP BY 1
     )
-    
+    SELECT category_id, total,
+           100.0 * SUM(total) OVER (ORDER BY position) / NULLIF(SUM(total) OVER (), 0) AS cumulative_percent
+    FROM buckets
+    ORDER BY position
+"""
+
+def _label_totals(db, rows):
+    """Convierte filas (label_id, total) agrupadas por id en [{category, total}] con el nombre."""
+    names = label_cache.names(db, [label_id for label_id, _ in rows])
+    return [{"category": names.get(label_id), "total": float(t)} for label_id, t in rows]
+
+def _category_name(names, label_id):
+    return OTHER_CATEGORY if label_id is None else names.get(label_id)
+
+def _sum_by(keys, cents):
+    """Agrupa importes en céntimos por clave: (claves únicas, totales en unidades)."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=cents, minlength=len(unique)) / 100
+
+def _analytics_from_columns(db, data, year, start_date, end_date, pareto_top, base_currency):
+    """
+    Mismo resultado que get_analytics, calculado con escaneos vectorizados sobre
+    las columnas en memoria del usuario (sin consultar movimientos a la base).
+    Los importes se convierten antes a `base_currency` con el tipo de cada día.
+    """
+    dates, codes = data["dates"], data["codes"]
+    cents = np.rint(
+        fx_rates.convert(db, data["amounts"], data["currencies"], dates // 86400, base_currency)
+    ).astype(np.int64)
+    is_income = data["kinds"] == KIND_INCOME
+    is_expense = ~is_income
+    months = dates.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+    in_range = np.ones(len(dates), dtype=bool)
     if year:
-        income_query = income_query.filter(func.extract('year', Income.date) == year)
-        expense_query = expense_query.filter(func.extract('year', Expense.date) == year)
+        year_start, year_end = year_range(year)
+        in_range &= (dates >= to_epoch(year_start)) & (dates < to_epoch(year_end))
     if start_date:
-        income_query = income_query.filter(Income.date >= start_date)
-        expense_query = expense_query.filter(Expense.date >= start_date)
+        in_range &= dates >= to_epoch(start_date)
     if end_date:
-        income_query = income_query.filter(Income.date <= end_date)
-        expense_query = expense_query.filter(Expense.date <= end_date)
+        in_range &= dates <= to_epoch(end_date)
 
-    total_income = income_query.with_entities(func.coalesce(func.sum(Income.amount), 0)).scalar()
-    total_expense = expense_query.with_entities(func.coalesce(func.sum(Expense.amount), 0)).scalar()
+    total_income = float(cents[is_income & data["active"] & in_range].sum()) / 100
+    total_expense = float(cents[is_expense & in_range].sum()) / 100
     monthly_balance = total_income - total_expense
     savings = monthly_balance
     savings_percent = round((savings / total_income * 100), 2) if total_income else 0
 
+    expense_codes, expense_totals = _sum_by(codes[is_expense], cents[is_expense])
+    income_codes, income_totals = _sum_by(codes[is_income], cents[is_income])
+
+    # Pivot (mes, categoría): se combinan ambas claves en un entero
+    month_codes = months[is_expense] * (1 << 32) + codes[is_expense].astype(np.int64)
+    pivot_keys, pivot_totals = _sum_by(month_codes, cents[is_expense])
+    pivot_months, pivot_codes = pivot_keys >> 32, pivot_keys & 0xFFFFFFFF
+
+    names = label_cache.names(db, set(expense_codes.tolist()) | set(income_codes.tolist()))
     expenses_by_category = [
-        {"category": c, "total": float(t)}
-        for c, t in db.query(Expense.category, func.sum(Expense.amount))
-            .filter(Expense.user_id == current_user.id)
-            .group_by(Expense.category)
-            .all()
+        {"category": names.get(c), "total": float(t)} for c, t in zip(expense_codes.tolist(), expense_totals.tolist())
     ]
-
     income_by_category = [
-        {"category": c, "total": float(t)}
-        for c, t in db.query(Income.source, func.sum(Income.amount))
-            .filter(Income.user_id == current_user.id)
-            .group_by(Income.source)
-            .all()
+        {"category": names.get(c), "total": float(t)} for c, t in zip(income_codes.tolist(), income_totals.tolist())
     ]
 
-    expenses_by_month = [
+    order = np.lexsort((expense_codes, -expense_totals))
+    ranked_codes, ranked_totals = expense_codes[order], expense_totals[order]
+    if len(ranked_totals) > pareto_top:
+        ranked_codes = np.append(ranked_codes[:pareto_top].astype(object), None)
+        ranked_totals = np.append(ranked_totals[:pareto_top], ranked_totals[pareto_top:].sum())
+    grand_total = ranked_totals.sum()
+    cumulative = np.cumsum(ranked_totals) / grand_total * 100 if grand_total else np.zeros(len(ranked_totals))
+    expenses_pareto = [
         {
-            "month": f"{int(y):04d}-{int(m):02d}",
-            "monthName": f"{calendar.month_name[int(m)]} {int(y)}",
-            "total": float(t)
+            "category": _category_name(names, c),
+            "total": float(t),
+            "cumulativePercent": round(float(p), 1)
         }
-        for y, m, t in db.query(
-            func.extract('year', Expense.date),
-            func.extract('month', Expense.date),
-            func.sum(Expense.amount)
-        )
-        .filter(Expense.user_id == current_user.id)
-        .group_by(func.extract('year', Expense.date), func.extract('month', Expense.date))
-        .order_by(func.extract('year', Expense.date), func.extract('month', Expense.date))
-        .all()
+        for c, t, p in zip(ranked_codes.tolist(), ranked_totals.tolist(), cumulative.tolist())
     ]
 
-    income_by_month = [
+    expense_amounts = cents[is_expense]
+    expenses_distribution = [
         {
-            "month": f"{int(y):04d}-{int(m):02d}",
-            "monthName": f"{calendar.month_name[int(m)]} {int(y)}",
-            "total": float(t)
+            "amountRange": f"{low}-{high}",
+            "count": int(np.count_nonzero((expense_amounts >= low * 100) & (expense_amounts <= high * 100)))
         }
-        for y, m, t in db.query(
-            func.extract('year', Income.date),
-            func.extract('month', Income.date),
-            func.sum(Income.amount)
-        )
-        .filter(Income.user_id == current_user.id)
-        .group_by(func.extract('year', Income.date), func.extract('month', Income.date))
-        .order_by(func.extract('year', Income.date), func.extract('month', Income.date))
-        .all()
+        for low, high in DISTRIBUTION_RANGES
     ]
 
-    income_month_dict = {item["month"]: item["total"] for item in income_by_month}
-    expense_month_dict = {item["month"]: item["total"] for item in expenses_by_month}
-    all_months = sorted(set(list(income_month_dict.keys()) + list(expense_month_dict.keys())))
-    monthly_balances = [
-        income_month_dict.get(month, 0) - expense_month_dict.get(month, 0)
-        for month in all_months
-    ]
+    pivot_table = sorted(
+        (
+            {
+                "month": str(np.datetime64(int(m), "M")),
+                "category": names.get(int(c)),
+                "total": float(t)
+            }
+            for m, c, t in zip(pivot_months.tolist(), pivot_codes.tolist(), pivot_totals.tolist())
+        ),
+        key=lambda item: (item["month"], item["category"] or "")
+    )
+
+    selected_year = year if year else datetime.now().year
+    first_month = (selected_year - 1970) * 12
+    in_year = (months >= first_month) & (months < first_month + 12)
+    year_expense = np.bincount(months[is_expense & in_year] - first_month, weights=cents[is_expense & in_year], minlength=12) / 100
+    year_income = np.bincount(months[is_income & in_year] - first_month, weights=cents[is_income & in_year], minlength=12) / 100
+
+    expenses_by_month = []
+    income_by_month = []
+    for m in range(1, 13):
+        key, name = f"{selected_year:04d}-{m:02d}", f"{calendar.month_name[m]} {selected_year}"
+        expenses_by_month.append({"month": key, "monthName": name, "total": float(year_expense[m - 1])})
+        income_by_month.append({"month": key, "monthName": name, "total": float(year_income[m - 1])})
+
+    return {
+        "kpis": {
+            "monthlyBalance": monthly_balance,
+            "totalIncome": total_income,
+            "totalExpense": total_expense,
+            "savings": savings,
+            "savingsPercent": savings_percent
+        },
+        "monthlyBalances": (year_income - year_expense).tolist(),
+        "expensesByCategory": expenses_by_category,
+        "incomeByCategory": income_by_category,
+        "expensesByMonth": expenses_by_month,
+        "incomeByMonth": income_by_month,
+        "expensesPareto": expenses_pareto,
+        "expensesDistribution": expenses_distribution,
+        "pivotTable": pivot_table
+    }
+
+@analytics_router.get("/analytics")
+def get_analytics(
+    request: Request,
+    response: Response,
+    year: int = Query(None, description="Año para filtrar"),
+    start_date: datetime = Query(None, description="Fecha de inicio (opcional)"),
+    end_date: datetime = Query(None, description="Fecha de fin (opcional)"),
+    pareto_top: int = Query(20, ge=1, description="Categorías del pareto; el resto se agrupa en 'other'"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    # Sin año explícito se usa el actual, que cambia con la fecha; los importes dependen
+    # además de la moneda base y de los tipos importados
+    base_currency = current_user.base_currency
+    version = user_data_version(current_user, date.today(), base_currency, fx_rates.version(db))
+    cached = not_modified(request, response, version, user_last_modified(current_user))
+    if cached:
+        return cached
+    if analytics_cache.enabled:
+        columns = analytics_cache.get_or_load(db, current_user.id)
+        return _analytics_from_columns(db, columns.snapshot(), year, start_date, end_date, pareto_top, base_currency)
+    # Las consultas de abajo suman importes tal cual; con movimientos en otras monedas
+    # se calcula sobre las columnas leídas solo para esta petición
+    if fx.has_foreign_currency(db, Transaction, current_user.id, base_currency):
+        columns = load_columns(db, current_user.id)
+        return _analytics_from_columns(db, columns.snapshot(), year, start_date, end_date, pareto_top, base_currency)
+
+    # Totales del periodo (ingresos activos y gastos) en un solo recorrido de transactions.
+    # Las columnas propias de un tipo se toman de la tabla: vía Income/Expense el ORM
+    # añadiría el filtro de kind a toda la consulta
+    ledger = Transaction.__table__
+    period = [Transaction.user_id == current_user.id]
+    if year:
+        year_start, year_end = year_range(year)
+        period += [Transaction.date >= year_start, Transaction.date < year_end]
+    if start_date:
+        period.append(Transaction.date >= start_date)
+    if end_date:
+        period.append(Transaction.date <= end_date)
+    total_income, total_expense = db.query(
+        func.coalesce(func.sum(Transaction.amount).filter(Transaction.kind == Transaction.INCOME, ledger.c.is_active == True), 0),
+        func.coalesce(func.sum(Transaction.amount).filter(Transaction.kind == Transaction.EXPENSE), 0),
+    ).filter(*period).one()
+    monthly_balance = total_income - total_expense
+    savings = monthly_balance
+    savings_percent = round((savings / total_income * 100), 2) if total_income else 0
 
-    pareto_data = sorted(expenses_by_category, key=lambda x: x["total"], reverse=True)
-    cumulative = 0
-    total = sum(x["total"] for x in pareto_data) or 1
-    expenses_pareto = []
-    for item in pareto_data:
-        cumulative += item["total"]
-        expenses_pareto.append({
-            "category": item["category"],
-            "total": item["total"],
-            "cumulativePercent": round(cumulative / total * 100, 1)
-        })
-
-    ranges = [(0, 100), (101, 500), (501, 1000)]
-    expenses_distribution = []
-    for r in ranges:
-        count = db.query(func.count(Expense.id)).filter(
-            Expense.user_id == current_user.id,
-            Expense.amount >= r[0],
-            Expense.amount <= r[1]
-        ).scalar()
-        expenses_distribution.append({
-            "amountRange": f"{r[0]}-{r[1]}",
-            "count": count
-        })
-
-    pivot_table = [
-        {"month": f"{int(y):04d}-{int(m):02d}", "category": c, "total": float(t)}
-        for y, m, c, t in db.query(
-            func.extract('year', Expense.date),
-            func.extract('month', Expense.date),
-            Expense.category,
-            func.sum(Expense.amount)
+    # Totales por (mes, tipo, etiqueta) de todo el historial, también en un solo recorrido:
+    # de ellos salen los totales por categoría y fuente, el pivot y los meses del año
+    label_id = func.coalesce(ledger.c.category_id, ledger.c.source_id)
+    ledger_rows = (
+        db.query(
+            func.extract('year', Transaction.date),
+            func.extract('month', Transaction.date),
+            Transaction.kind,
+            label_id,
+            func.sum(Transaction.amount)
         )
-        .filter(Expense.user_id == current_user.id)
-        .group_by(func.extract('year', Expense.date), func.extract('month', Expense.date), Expense.category)
-        .order_by(func.extract('year', Expense.date), func.extract('month', Expense.date), Expense.category)
+        .filter(Transaction.user_id == current_user.id)
+        .group_by(func.extract('year', Transaction.date), func.extract('month', Transaction.date), Transaction.kind, label_id)
         .all()
+    )
+    by_label = {Transaction.INCOME: {}, Transaction.EXPENSE: {}}
+    for _, _, kind, c, t in ledger_rows:
+        by_label[kind][c] = by_label[kind].get(c, 0) + t
+    expenses_by_category = _label_totals(db, list(by_label[Transaction.EXPENSE].items()))
+    income_by_category = _label_totals(db, list(by_label[Transaction.INCOME].items()))
+
+    pareto_rows = db.execute(text(_PARETO_SQL), {"user_id": current_user.id, "top": pareto_top}).all()
+    pareto_names = label_cache.names(db, [c for c, _, _ in pareto_rows])
+    expenses_pareto = [
+        {
+            "category": _category_name(pareto_names, c),
+            "total": float(t),
+            "cumulativePercent": round(float(p or 0), 1)
+        }
+        for c, t, p in pareto_rows
+    ]
+
+    distribution = db.query(*(
+        func.count(Expense.id).filter(Expense.amount >= low, Expense.amount <= high)
+        for low, high in DISTRIBUTION_RANGES
+    )).filter(Expense.user_id == current_user.id).one()
+    expenses_distribution = [
+        {"amountRange": f"{low}-{high}", "count": count}
+        for (low, high), count in zip(DISTRIBUTION_RANGES, distribution)
     ]
 
+    pivot_rows = [(y, m, c, t) for y, m, kind, c, t in ledger_rows if kind == Transaction.EXPENSE]
+    pivot_names = label_cache.names(db, [c for _, _, c, _ in pivot_rows])
+    pivot_table = sorted(
+        (
+            {"month": f"{int(y):04d}-{int(m):02d}", "category": pivot_names.get(c), "total": float(t)}
+            for y, m, c, t in pivot_rows
+        ),
+        key=lambda item: (item["month"], item["category"] or "")
+    )
+
     selected_year = year if year else datetime.now().year
     all_months = [f"{selected_year:04d}-{m:02d}" for m in range(1, 13)]
     all_month_names = [f"{calendar.month_name[m]} {selected_year}" for m in range(1, 13)]
 
-    expenses_by_month_raw = {
-        f"{int(y):04d}-{int(m):02d}": float(t)
-        for y, m, t in db.query(
-            func.extract('year', Expense.date),
-            func.extract('month', Expense.date),
-            func.sum(Expense.amount)
-        )
-        .filter(
-            Expense.user_id == current_user.id,
-            func.extract('year', Expense.date) == selected_year
-        )
-        .group_by(func.extract('year', Expense.date), func.extract('month', Expense.date))
-        .all()
-    }
-
-    income_by_month_raw = {
-        f"{int(y):04d}-{int(m):02d}": float(t)
-        for y, m, t in db.query(
-            func.extract('year', Income.date),
-            func.extract('month', Income.date),
-            func.sum(Income.amount)
-        )
-        .filter(
-            Income.user_id == current_user.id,
-            func.extract('year', Income.date) == selected_year
-        )
-        .group_by(func.extract('year', Income.date), func.extract('month', Income.date))
-        .all()
-    }
+    by_month_raw = {Transaction.INCOME: {}, Transaction.EXPENSE: {}}
+    for y, m, kind, _, t in ledger_rows:
+        if int(y) == selected_year:
+            key = f"{int(y):04d}-{int(m):02d}"
+            by_month_raw[kind][key] = by_month_raw[kind].get(key, 0) + float(t)
 
     expenses_by_month = [
         {
             "month": month,
             "monthName": month_name,
-            "total": expenses_by_month_raw.get(month, 0)
+            "total": by_month_raw[Transaction.EXPENSE].get(month, 0)
         }
         for month, month_name in zip(all_months, all_month_names)
     ]
@@ -188,7 +313,7 @@ def get_analytics(
         {
             "month": month,
             "monthName": month_name,
-            "total": income_by_month_raw.get(month, 0)
+            "total": by_month_raw[Transaction.INCOME].get(month, 0)
         }
         for month, month_name in zip(all_months, all_month_names)
     ]
@@ -221,41 +346,33 @@ def get_monthly_kpis(
     year: int = Query(None, description="Año a consultar"),
     month: int = Query(None, ge=1, le=12, description="Mes a consultar (1=Enero, 12=Diciembre)"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     selected_year = year if year else datetime.now().year
     selected_month = month if month else datetime.now().month
+    month_start, month_end = month_range(selected_year, selected_month)
 
-    income_query = db.query(Income).filter(
-        Income.user_id == current_user.id,
-        func.extract('year', Income.date) == selected_year,
-        func.extract('month', Income.date) == selected_month
-    )
-    
-    expense_query = db.query(Expense).filter(
-        Expense.user_id == current_user.id,
-        func.extract('year', Expense.date) == selected_year,
-        func.extract('month', Expense.date) == selected_month
-    )
-    
-    total_income = income_query.with_entities(func.coalesce(func.sum(Income.amount), 0)).scalar()
-    total_expense = expense_query.with_entities(func.coalesce(func.sum(Expense.amount), 0)).scalar()
+    # Totales del mes y gasto por categoría en la moneda base, en una sola consulta
+    rows = db.execute(text(f"""
+        SELECT m.kind, m.category_id, COALESCE(SUM({fx.amount_sql("m")}), 0)
+        FROM transactions m {fx.join_sql("m")}
+        WHERE m.user_id = :user_id AND m.date >= :start AND m.date < :end
+        GROUP BY 1, 2
+    """), {
+        "user_id": current_user.id,
+        "start": month_start,
+        "end": month_end,
+        "base_currency": current_user.base_currency,
+    }).all()
+
+    total_income = sum(float(t) for kind, _, t in rows if kind == "income")
+    total_expense = sum(float(t) for kind, _, t in rows if kind == "expense")
     monthly_balance = total_income - total_expense
     savings = monthly_balance
     savings_percent = round((savings / total_income * 100), 2) if total_income else 0
 
     # Expenses by category para el mes filtrado
-    expenses_by_category = [
-        {"category": c, "total": float(t)}
-        for c, t in db.query(Expense.category, func.sum(Expense.amount))
-            .filter(
-                Expense.user_id == current_user.id,
-                func.extract('year', Expense.date) == selected_year,
-                func.extract('month', Expense.date) == selected_month
-            )
-            .group_by(Expense.category)
-            .all()
-    ]
+    expenses_by_category = _label_totals(db, [(c, t) for kind, c, t in rows if kind == "expense"])
 
     return {
         "year": selected_year,
@@ -268,3 +385,299 @@ def get_monthly_kpis(
         "savingsPercent": savings_percent,
         "expensesByCategory": expenses_by_category
     }
+
+
+@analytics_router.get("/analytics/timeseries")
+def get_timeseries(
+    start_date: datetime = Query(None, description="Fecha de inicio (por defecto, hace un año)"),
+    end_date: datetime = Query(None, description="Fecha de fin, inclusive (por defecto, ahora)"),
+    granularity: str = Query(None, pattern="^(day|week|month)$", description="day, week o month (por defecto, según el rango)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Series de ingresos, gastos y neto por día, semana o mes, con los periodos
+    sin movimientos rellenados en la base de datos con generate_series. Los
+    importes se convierten a la moneda base con un join a `fx_rates`.
+    """
+    end = end_date or datetime.now()
+    start = start_date or end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+
+    days = (end - start).days + 1
+    steps = {name: step for name, step, _ in TIMESERIES_GRANULARITIES}
+    if granularity is None:
+        granularity = next(name for name, _, max_days in TIMESERIES_GRANULARITIES if max_days is None or days <= max_days)
+    else:
+        points = {"day": days, "week": days // 7 + 1, "month": days // 28 + 1}[granularity]
+        if points > TIMESERIES_MAX_POINTS:
+            raise HTTPException(status_code=400, detail=f"Range too large for granularity '{granularity}'")
+
+    rows = db.execute(text(f"""
+        WITH buckets AS (
+            SELECT generate_series(date_trunc(:granularity, CAST(:start AS TIMESTAMP)),
+                                   date_trunc(:granularity, CAST(:end AS TIMESTAMP)),
+                                   CAST(:step AS INTERVAL)) AS bucket
+        ), totals AS (
+            SELECT date_trunc(:granularity, m.date) AS bucket,
+                   SUM({fx.amount_sql("m")}) FILTER (WHERE m.kind = 'income') AS income,
+                   SUM({fx.amount_sql("m")}) FILTER (WHERE m.kind = 'expense') AS expense
+            FROM transactions m {fx.join_sql("m")}
+            WHERE m.user_id = :user_id AND m.date >= :start AND m.date <= :end
+            GROUP BY 1
+        )
+        SELECT b.bucket, COALESCE(t.income, 0), COALESCE(t.expense, 0)
+        FROM buckets b
+        LEFT JOIN totals t ON t.bucket = b.bucket
+        ORDER BY b.bucket
+    """), {
+        "granularity": granularity,
+        "step": steps[granularity],
+        "start": start,
+        "end": end,
+        "user_id": current_user.id,
+        "base_currency": current_user.base_currency,
+    }).all()
+
+    label_format = "%Y-%m" if granularity == "month" else "%Y-%m-%d"
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "labels": [bucket.strftime(label_format) for bucket, _, _ in rows],
+        "income": [float(income) for _, income, _ in rows],
+        "expense": [float(expense) for _, _, expense in rows],
+        "net": [float(income) - float(expense) for _, income, expense in rows]
+    }
+
+@analytics_router.get("/analytics/trends")
+def get_trends(
+    days: int = Query(90, ge=7, le=366, description="Días recientes incluidos en la serie diaria"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Medias móviles, variaciones mes a mes, proyección del gasto a fin de mes y días
+    con gasto atípico, calculados con NumPy sobre los totales diarios del usuario
+    (una sola consulta agrupada por día y moneda; la conversión a la moneda base
+    se aplica de forma vectorizada sobre esos totales).
+    """
+    rows = db.execute(text("""
+        SELECT CAST(date AS DATE) AS day, currency,
+               COALESCE(SUM(amount) FILTER (WHERE kind = 'income'), 0),
+               COALESCE(SUM(amount) FILTER (WHERE kind = 'expense'), 0)
+        FROM transactions
+        WHERE user_id = :user_id
+        GROUP BY 1, 2
+        ORDER BY 1
+    """), {"user_id": current_user.id}).all()
+    day_values, currencies, incomes, expenses = zip(*rows) if rows else ((), (), (), ())
+
+    day_values = np.array(day_values, dtype="datetime64[D]")
+    factors = fx_rates.factors(
+        db, fx.currency_codes(currencies), day_values.astype(np.int64), current_user.base_currency
+    )
+    # Vuelve a un total por día una vez convertidas las monedas de ese día
+    unique_days, inverse = np.unique(day_values, return_inverse=True)
+    trends = build_trends(
+        unique_days,
+        np.bincount(inverse, weights=np.array(incomes, dtype=np.float64) * factors, minlength=len(unique_days)),
+        np.bincount(inverse, weights=np.array(expenses, dtype=np.float64) * factors, minlength=len(unique_days)),
+        datetime.now().date(),
+        days,
+    )
+    trends["monthly"]["monthNames"] = [
+        f"{calendar.month_name[int(key[5:7])]} {key[:4]}" for key in trends["monthly"]["months"]
+    ]
+    return trends
+
+@analytics_router.get("/analytics/statistics")
+def get_expense_statistics(
+    start_date: datetime = Query(None, description="Fecha de inicio (inclusive)"),
+    end_date: datetime = Query(None, description="Fecha de fin (inclusive)"),
+    top: int = Query(10, ge=1, le=100, description="Categorías con detalle; el resto se agrupa en 'other'"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Distribución de los importes de gasto (conteo, total, media, desviación,
+    mediana, p90, p99, mínimo y máximo) por categoría, por mes y global, en una
+    única consulta con GROUPING SETS, con los importes en la moneda base.
+    """
+    date_filter = ""
+    if start_date:
+        date_filter += " AND m.date >= :start_date"
+    if end_date:
+        date_filter += " AND m.date <= :end_date"
+
+    rows = db.execute(text(f"""
+        WITH filtered AS (
+            SELECT m.category_id, m.date, {fx.amount_sql("m")} AS amount
+            FROM expenses m {fx.join_sql("m")}
+            WHERE m.user_id = :user_id{date_filter}
+        ), ranked AS (
+            SELECT category_id, ROW_NUMBER() OVER (ORDER BY SUM(amount) DESC, category_id) AS position
+            FROM filtered
+            GROUP BY category_id
+        ), bucketed AS (
+            SELECT CASE WHEN r.position <= :top THEN f.category_id END AS bucket,
+                   CAST(date_trunc('month', f.date) AS DATE) AS month,
+                   f.amount
+            FROM filtered f
+            JOIN ranked r ON r.category_id = f.category_id
+        )
+        SELECT GROUPING(bucket, month) AS grouping_set, bucket, month,
+               COUNT(*), SUM(amount), AVG(amount), STDDEV_SAMP(amount),
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY amount),
+               percentile_cont(0.9) WITHIN GROUP (ORDER BY amount),
+               percentile_cont(0.99) WITHIN GROUP (ORDER BY amount),
+               MIN(amount), MAX(amount)
+        FROM bucketed
+        GROUP BY GROUPING SETS ((bucket), (month), ())
+    """), {
+        "user_id": current_user.id,
+        "top": top,
+        "start_date": start_date,
+        "end_date": end_date,
+        "base_currency": current_user.base_currency,
+    }).all()
+
+    def stats(row):
+        count, total, mean, stddev, median, p90, p99, minimum, maximum = row[3:]
+        values = {
+            "count": count,
+            "total": total,
+            "mean": mean,
+            "stddev": stddev,
+            "median": median,
+            "p90": p90,
+            "p99": p99,
+            "min": minimum,
+            "max": maximum
+        }
+        return {key: (round(float(v), 2) if v is not None and key != "count" else v) for key, v in values.items()}
+
+    names = label_cache.names(db, [row.bucket for row in rows if row.grouping_set == 1])
+    by_category = sorted(
+        (
+            {"category": _category_name(names, row.bucket), **stats(row)}
+            for row in rows if row.grouping_set == 1
+        ),
+        key=lambda item: (item["category"] == OTHER_CATEGORY, -item["total"])
+    )
+    by_month = sorted(
+        (
+            {
+                "month": row.month.strftime("%Y-%m"),
+                "monthName": f"{month_name[row.month.month]} {row.month.year}",
+                **stats(row)
+            }
+            for row in rows if row.grouping_set == 2
+        ),
+        key=lambda item: item["month"]
+    )
+    overall = next((stats(row) for row in rows if row.grouping_set == 3), None)
+    return {
+        "overall": overall or {"count": 0},
+        "byCategory": by_category,
+        "byMonth": by_month
+    }
+
+def _live_delta(user_id: int, change: dict) -> dict:
+    """Totales y celdas (mes, categoría, fuente) afectadas por un cambio, leídos del primario."""
+    db = UserSessionLocal(user_id)
+    try:
+        totals = lifetime_totals(db, user_id)
+        delta = {
+            "totals": {
+                "totalIncome": totals["total_income"],
+                "totalExpense": totals["total_expense"],
+                "balance": totals["balance"]
+            }
+        }
+        if change["months"]:
+            month_starts = [date(int(m[:4]), int(m[5:7]), 1) for m in change["months"]]
+            checkpoints = {
+                row.month: row
+                for row in db.query(BalanceCheckpoint).filter(
+                    BalanceCheckpoint.user_id == user_id,
+                    BalanceCheckpoint.month.in_(month_starts)
+                )
+            }
+            delta["months"] = [
+                {
+                    "month": m.strftime("%Y-%m"),
+                    "income": checkpoints[m].income_total if m in checkpoints else 0,
+                    "expense": checkpoints[m].expense_total if m in checkpoints else 0
+                }
+                for m in sorted(month_starts)
+            ]
+        for key, model, code in (
+            ("categories", Expense, Expense.category_id),
+            ("sources", Income, Income.source_id),
+        ):
+            if not change[key]:
+                continue
+            totals_by_code = dict(
+                db.query(code, func.sum(model.amount))
+                .filter(model.user_id == user_id, code.in_(change[key]))
+                .group_by(code)
+                .all()
+            )
+            names = label_cache.names(db, change[key])
+            delta[key] = [
+                {"category": names.get(c), "total": float(totals_by_code.get(c, 0))}
+                for c in sorted(change[key]) if c in names
+            ]
+        return delta
+    finally:
+        db.close()
+
+def _sse(event_name: str, data: dict) -> str:
+    return f"event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@analytics_router.get("/analytics/stream")
+async def stream_analytics(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Server-sent events con los cambios del dashboard: un evento `snapshot` al
+    conectar y un `delta` con los totales y las celdas de mes/categoría afectadas
+    cada vez que se escriben ingresos o gastos del usuario.
+    """
+    user_id = current_user.id
+    # La conexión usada para autenticar no debe quedar retenida durante todo el stream
+    await run_in_threadpool(db.close)
+
+    async def events():
+        queue = change_bus.subscribe(user_id)
+        try:
+            empty = {"months": [], "categories": [], "sources": []}
+            yield _sse("snapshot", await run_in_threadpool(_live_delta, user_id, empty))
+            while True:
+                try:
+                    change = await asyncio.wait_for(queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                # Se agrupan los cambios que lleguen durante la ventana de debounce
+                await asyncio.sleep(settings.SSE_DEBOUNCE_SECONDS)
+                merged = {key: set(change[key]) for key in empty}
+                while not queue.empty():
+                    pending = queue.get_nowait()
+                    for key in empty:
+                        merged[key] |= set(pending[key])
+                yield _sse("delta", await run_in_threadpool(_live_delta, user_id, merged))
+        finally:
+            change_bus.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
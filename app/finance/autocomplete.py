@@ -0,0 +1,337 @@
+"""
+Autocompletado de categorías, métodos de pago y fuentes por prefijo, ordenado
+por frecuencia de uso con decaimiento por antigüedad:
+
+    puntuación = use_count * 0.5 ** (días desde last_used_at / AUTOCOMPLETE_HALF_LIFE_DAYS)
+
+`labels.use_count` y `labels.last_used_at` se mantienen en la misma transacción
+que cada alta, cambio o baja (un UPDATE por etiqueta afectada en cada flush). Por
+encima, cada worker guarda por usuario las etiquetas ordenadas por nombre en
+minúsculas: un prefijo es un rango que se localiza con bisect y se puntúa con
+NumPy. Al confirmar, los cambios se aplican también al índice en memoria; un LRU
+lo mantiene por debajo de AUTOCOMPLETE_CACHE_MB. Sin índice, la consulta usa el
+índice (user_id, kind, lower(name) text_pattern_ops).
+
+Para recalcular los contadores desde expenses/incomes:
+
+    python -m app.finance.autocomplete rebuild [--user-id 42]
+"""
+import argparse
+import bisect
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+import numpy as np
+from sqlalchemy import event, func, inspect, literal, text
+from sqlalchemy.orm import object_session
+from app.config import settings
+from app.database.database import SessionLocal, shard_map
+from app.finance.analytics_cache import to_epoch
+from app.models.expense import Expense
+from app.models.income import Income
+from app.models.label import Label
+
+# (atributo con el nombre, atributo con el id, kind) de cada modelo
+LABEL_ATTRIBUTES = {
+    Expense: [("category", "category_id", Label.CATEGORY), ("payment_method", "payment_method_id", Label.PAYMENT_METHOD)],
+    Income: [("source", "source_id", Label.SOURCE)],
+}
+# Bytes estimados por etiqueta en memoria, además del nombre
+_ENTRY_BYTES = 160
+# Carácter máximo: `prefijo + _MAX_CHAR` acota por arriba todas las claves con ese prefijo
+_MAX_CHAR = "\U0010ffff"
+
+
+def _previous(target, attr: str):
+    history = inspect(target).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(target, attr)
+
+
+def _record(target, sign: int, old: bool = False) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    pending = session.info.setdefault("label_usage", [])
+    for name_attr, id_attr, kind in LABEL_ATTRIBUTES[type(target)]:
+        read = (lambda attr: _previous(target, attr)) if old else (lambda attr: getattr(target, attr))
+        when = read("date") if sign > 0 else None
+        pending.append((target.user_id, kind, read(id_attr), read(name_attr), sign, when))
+
+
+def _after_insert(mapper, connection, target):
+    _record(target, 1)
+
+
+def _after_update(mapper, connection, target):
+    attrs = ["date"] + [id_attr for _, id_attr, _ in LABEL_ATTRIBUTES[type(target)]]
+    if all(_previous(target, attr) == getattr(target, attr) for attr in attrs):
+        return
+    _record(target, -1, old=True)
+    _record(target, 1)
+
+
+def _after_delete(mapper, connection, target):
+    _record(target, -1)
+
+
+for _model in LABEL_ATTRIBUTES:
+    event.listen(_model, "after_insert", _after_insert)
+    event.listen(_model, "after_update", _after_update)
+    event.listen(_model, "after_delete", _after_delete)
+
+
+def _aggregate(pending) -> list[dict]:
+    """Suma los cambios por etiqueta; si se anulan (cambio de fecha sin cambio de etiqueta) solo mueve la fecha."""
+    merged = {}
+    for user_id, kind, label_id, name, delta, when in pending:
+        entry = merged.setdefault(label_id, {"id": label_id, "user_id": user_id, "kind": kind, "name": name, "delta": 0, "when": None})
+        entry["delta"] += delta
+        if when is not None and (entry["when"] is None or when > entry["when"]):
+            entry["when"] = when
+    return [entry for entry in merged.values() if entry["delta"] or entry["when"] is not None]
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _apply_usage(session, flush_context):
+    pending = session.info.pop("label_usage", None)
+    if not pending:
+        return
+    changes = _aggregate(pending)
+    if not changes:
+        return
+    session.connection().execute(text("""
+        UPDATE labels SET use_count = use_count + :delta, last_used_at = GREATEST(last_used_at, :when)
+        WHERE id = :id
+    """), changes)
+    session.info.setdefault("label_usage_flushed", []).extend(changes)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_usage(session):
+    for change in session.info.pop("label_usage_flushed", ()):
+        label_index.apply(change)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_usage(session):
+    session.info.pop("label_usage", None)
+    session.info.pop("label_usage_flushed", None)
+
+
+def _epoch(value) -> float:
+    return float(to_epoch(value)) if value is not None else np.nan
+
+
+def scores(counts: np.ndarray, last_used: np.ndarray, now: float) -> np.ndarray:
+    age_days = np.maximum(now - np.where(np.isnan(last_used), now, last_used), 0) / 86400
+    return counts * 0.5 ** (age_days / settings.AUTOCOMPLETE_HALF_LIFE_DAYS)
+
+
+class KindIndex:
+    """Etiquetas de un usuario y un kind en arreglos paralelos ordenados por nombre en minúsculas."""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1].lower(), row[0]))
+        self.keys = [name.lower() for _, name, _, _ in rows]
+        self.names = [name for _, name, _, _ in rows]
+        self.ids = [label_id for label_id, _, _, _ in rows]
+        self.counts = np.array([count for _, _, count, _ in rows], dtype=np.int64)
+        self.last_used = np.array([_epoch(last) for _, _, _, last in rows], dtype=np.float64)
+        self.positions = {label_id: pos for pos, label_id in enumerate(self.ids)}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(name) * 2 for name in self.names) + len(self.names) * _ENTRY_BYTES
+
+    def apply(self, label_id: int, name: str, delta: int, when) -> None:
+        pos = self.positions.get(label_id)
+        if pos is None:
+            key = name.lower()
+            pos = bisect.bisect_right(self.keys, key)
+            self.keys.insert(pos, key)
+            self.names.insert(pos, name)
+            self.ids.insert(pos, label_id)
+            self.counts = np.insert(self.counts, pos, 0)
+            self.last_used = np.insert(self.last_used, pos, np.nan)
+            self.positions = {i: p for p, i in enumerate(self.ids)}
+        self.counts[pos] += delta
+        if when is not None:
+            self.last_used[pos] = np.fmax(self.last_used[pos], _epoch(when))
+
+    def search(self, prefix: str, limit: int, now: float) -> list[dict]:
+        prefix = prefix.lower()
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_right(self.keys, prefix + _MAX_CHAR, lo=low)
+        counts, last_used = self.counts[low:high], self.last_used[low:high]
+        candidates = np.flatnonzero(counts > 0)
+        ranked = scores(counts[candidates], last_used[candidates], now)
+        # Desempate por nombre: las posiciones ya están en orden alfabético
+        top = candidates[np.lexsort((candidates, -ranked))[:limit]] + low
+        return [
+            {
+                "name": self.names[pos],
+                "count": int(self.counts[pos]),
+                "lastUsed": None if np.isnan(self.last_used[pos]) else np.datetime64(int(self.last_used[pos]), "s").astype(datetime),
+            }
+            for pos in top.tolist()
+        ]
+
+
+class UserLabels:
+    def __init__(self, rows):
+        by_kind = defaultdict(list)
+        for label_id, kind, name, count, last_used in rows:
+            by_kind[kind].append((label_id, name, count, last_used))
+        self.kinds = {kind: KindIndex(kind_rows) for kind, kind_rows in by_kind.items()}
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(index.nbytes for index in self.kinds.values())
+
+    def apply(self, kind: str, label_id: int, name: str, delta: int, when) -> None:
+        with self.lock:
+            index = self.kinds.get(kind)
+            if index is None:
+                index = self.kinds[kind] = KindIndex([])
+            index.apply(label_id, name, delta, when)
+
+    def search(self, kind: str, prefix: str, limit: int, now: float) -> list[dict]:
+        with self.lock:
+            index = self.kinds.get(kind)
+            return index.search(prefix, limit, now) if index is not None else []
+
+
+class LabelIndex:
+    """LRU de UserLabels limitado por memoria total, como la caché de analytics."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[int, UserLabels] = OrderedDict()
+        self._sizes: dict[int, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _get(self, user_id: int) -> UserLabels | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry.loaded_at > self.ttl:
+                self._discard(user_id)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    def _discard(self, user_id: int) -> None:
+        if self._entries.pop(user_id, None) is not None:
+            self._total_bytes -= self._sizes.pop(user_id, 0)
+
+    def _account(self, user_id: int) -> None:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            size = entry.nbytes
+            self._total_bytes += size - self._sizes.get(user_id, 0)
+            self._sizes[user_id] = size
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted, _ = self._entries.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(evicted, 0)
+            self._metrics["evictions"] += 1
+
+    def get_or_load(self, db, user_id: int) -> UserLabels:
+        entry = self._get(user_id)
+        if entry is not None:
+            self._metrics["hits"] += 1
+            return entry
+        self._metrics["misses"] += 1
+        rows = db.execute(text("""
+            SELECT id, kind, name, use_count, last_used_at FROM labels
+            WHERE user_id = :user_id AND use_count > 0
+        """), {"user_id": user_id}).all()
+        entry = UserLabels(rows)
+        with self._lock:
+            self._discard(user_id)
+            self._entries[user_id] = entry
+            self._account(user_id)
+        return entry
+
+    def apply(self, change: dict) -> None:
+        """Refleja un cambio ya confirmado, si el usuario está en memoria."""
+        entry = self._get(change["user_id"])
+        if entry is None:
+            return
+        entry.apply(change["kind"], change["id"], change["name"], change["delta"], change["when"])
+        with self._lock:
+            self._account(change["user_id"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._metrics, "users": len(self._entries), "bytes": self._total_bytes, "maxBytes": self.max_bytes}
+
+
+label_index = LabelIndex(max_bytes=settings.AUTOCOMPLETE_CACHE_MB * 1024 * 1024, ttl=settings.AUTOCOMPLETE_CACHE_TTL)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_db(db, user_id: int, kind: str, prefix: str, limit: int, now: datetime) -> list[dict]:
+    """Misma búsqueda sobre `labels`, con el índice lower(name) text_pattern_ops para el prefijo."""
+    age_days = func.greatest(func.extract("epoch", literal(now) - func.coalesce(Label.last_used_at, now)), 0) / 86400
+    score = Label.use_count * func.power(0.5, age_days / settings.AUTOCOMPLETE_HALF_LIFE_DAYS)
+    rows = (
+        db.query(Label.name, Label.use_count, Label.last_used_at)
+        .filter(
+            Label.user_id == user_id,
+            Label.kind == kind,
+            Label.use_count > 0,
+            func.lower(Label.name).like(_escape_like(prefix.lower()) + "%", escape="\\"),
+        )
+        .order_by(score.desc(), func.lower(Label.name), Label.id)
+        .limit(limit)
+        .all()
+    )
+    return [{"name": name, "count": count, "lastUsed": last_used} for name, count, last_used in rows]
+
+
+def rebuild(connection, user_id: int | None = None) -> int:
+    """Recalcula use_count y last_used_at desde expenses/incomes (todas o las de un usuario)."""
+    where = "WHERE user_id = :user_id" if user_id is not None else ""
+    params = {"user_id": user_id}
+    connection.execute(text(f"UPDATE labels SET use_count = 0, last_used_at = NULL {where}"), params)
+    result = connection.execute(text(f"""
+        UPDATE labels l SET use_count = u.uses, last_used_at = u.last_used
+        FROM (
+            SELECT category_id AS id, COUNT(*) AS uses, MAX(date) AS last_used FROM expenses {where} GROUP BY 1
+            UNION ALL
+            SELECT payment_method_id, COUNT(*), MAX(date) FROM expenses {where} GROUP BY 1
+            UNION ALL
+            SELECT source_id, COUNT(*), MAX(date) FROM incomes {where} GROUP BY 1
+        ) AS u
+        WHERE l.id = u.id
+    """), params)
+    return result.rowcount
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Contadores de uso de etiquetas para el autocompletado")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="Recalcula los contadores desde expenses e incomes")
+    rebuild_cmd.add_argument("--user-id", type=int)
+    args = parser.parse_args(argv)
+
+    for engine in shard_map.engines_for(args.user_id):
+        with engine.begin() as conn:
+            print(f"{rebuild(conn, args.user_id)} etiquetas actualizadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.schemas.autocomplete import AutocompleteItem
+from app.finance.autocomplete import label_index, search_db
+from app.finance.analytics_cache import to_epoch
+from app.utils.dependencies import get_read_db, get_current_user
+from typing import List, Literal
+
+autocomplete_router = APIRouter()
+
+# Resultados máximos por consulta
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+
+@autocomplete_router.get("/autocomplete", response_model=List[AutocompleteItem])
+def autocomplete(
+    kind: Literal["category", "payment_method", "source"] = Query(..., description="Qué etiquetas sugerir"),
+    q: str = Query("", max_length=100, description="Prefijo (sin distinguir mayúsculas)"),
+    limit: int = Query(10, ge=1, le=AUTOCOMPLETE_MAX_LIMIT),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """Etiquetas del usuario que empiezan por `q`, las más usadas y recientes primero."""
+    now = datetime.utcnow()
+    if label_index.enabled:
+        labels = label_index.get_or_load(db, current_user.id)
+        return labels.search(kind, q, limit, float(to_epoch(now)))
+    return search_db(db, current_user.id, kind, q, limit, now)
@@ -2,12 +2,14 @@ import calendar
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from datetime import datetime
+from datetime import date, datetime
 from app.models.expense import Expense
 from app.models.income import Income
 from app.models.user import User
-from app.utils.dependencies import get_db, get_current_user
+from app.utils.dependencies import get_db, get_read_db, get_current_user
 from calendar import month_name
+from app.models.balance_checkpoint import BalanceCheckpoint
+from app.finance.checkpoints import balance_as_of, lifetime_totals, month_start
 
 balance_router = APIRouter()
 
@@ -18,8 +20,9 @@ def get_balance(
     year: int = Query(None, ge=1900),
     start_date: datetime = Query(None, description="Fecha de inicio (inclusive)"),
     end_date: datetime = Query(None, description="Fecha de fin (inclusive)"),
+    as_of: datetime = Query(None, description="Saldo acumulado a esta fecha (inclusive)"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     filters = [Income.user_id == current_user.id]
     expense_filters = [Expense.user_id == current_user.id]
@@ -42,23 +45,68 @@ def get_balance(
             filters.append(func.extract('day', Income.date) == day)
             expense_filters.append(func.extract('day', Expense.date) == day)
 
-    total_income = db.query(func.coalesce(func.sum(Income.amount), 0)).filter(
-        Income.user_id == current_user.id,
-    ).scalar()
-    total_expense = db.query(func.coalesce(func.sum(Expense.amount), 0)).filter(
-        Expense.user_id == current_user.id,
-    ).scalar()
-    balance = total_income - total_expense
+    if as_of:
+        totals = balance_as_of(db, current_user.id, as_of)
+    else:
+        totals = lifetime_totals(db, current_user.id)
 
     return {
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "balance": balance,
+        "total_income": totals["total_income"],
+        "total_expense": totals["total_expense"],
+        "balance": totals["balance"],
         "filters": {
             "day": day,
             "month": month,
             "year": year,
             "start_date": start_date,
-            "end_date": end_date
+            "end_date": end_date,
+            "as_of": as_of
         }
     }
+
+@balance_router.get("/balance/series")
+def get_balance_series(
+    start_date: datetime = Query(None, description="Mes inicial (por defecto, el primer movimiento)"),
+    end_date: datetime = Query(None, description="Mes final (por defecto, el mes actual)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """Saldo acumulado al cierre de cada mes, leído solo de los checkpoints."""
+    last_month = month_start(end_date or datetime.now())
+    query = db.query(BalanceCheckpoint).filter(
+        BalanceCheckpoint.user_id == current_user.id,
+        BalanceCheckpoint.month <= last_month
+    )
+    first_month = month_start(start_date) if start_date else None
+    opening = None
+    if first_month:
+        opening = (
+            db.query(BalanceCheckpoint)
+            .filter(BalanceCheckpoint.user_id == current_user.id, BalanceCheckpoint.month < first_month)
+            .order_by(BalanceCheckpoint.month.desc())
+            .first()
+        )
+        query = query.filter(BalanceCheckpoint.month >= first_month)
+    checkpoints = {row.month: row for row in query.order_by(BalanceCheckpoint.month).all()}
+    if not first_month:
+        if not checkpoints:
+            return []
+        first_month = min(checkpoints)
+
+    cumulative_income = opening.cumulative_income if opening else 0
+    cumulative_expense = opening.cumulative_expense if opening else 0
+    series = []
+    current = first_month
+    while current <= last_month:
+        row = checkpoints.get(current)
+        if row:
+            cumulative_income, cumulative_expense = row.cumulative_income, row.cumulative_expense
+        series.append({
+            "month": current.strftime("%Y-%m"),
+            "monthName": f"{month_name[current.month]} {current.year}",
+            "income": row.income_total if row else 0,
+            "expense": row.expense_total if row else 0,
+            "balance": cumulative_income - cumulative_expense
+        })
+        current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+    return series
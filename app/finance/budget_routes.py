@@ -0,0 +1,116 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.models.budget import Budget, SpendingCounter
+from app.models.label import Label
+from app.models.user import User
+from app.schemas.budget import BudgetRequest, BudgetResponse, BudgetStatusResponse
+from app.finance.budgets import STATUS_OK, status_for
+from app.utils.label_cache import label_cache
+from app.utils.dependencies import get_db, get_read_db, get_current_user
+from typing import List
+
+budget_router = APIRouter()
+
+
+def _budget_response(db: Session, budgets) -> list[dict]:
+    names = label_cache.names(db, [b.category_id for b in budgets])
+    return [
+        {"category": names.get(b.category_id), "amount": b.amount, "alert_percent": b.alert_percent}
+        for b in budgets
+    ]
+
+
+@budget_router.get("/budgets", response_model=List[BudgetResponse])
+def get_budgets(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    budgets = db.query(Budget).filter(Budget.user_id == current_user.id).all()
+    return sorted(_budget_response(db, budgets), key=lambda b: b["category"] or "")
+
+
+@budget_router.put("/budgets/{category}", response_model=BudgetResponse)
+def set_budget(
+    category: str,
+    request: BudgetRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    category_id = label_cache.resolve(db.connection(), current_user.id, Label.CATEGORY, category)
+    budget = db.query(Budget).filter(Budget.user_id == current_user.id, Budget.category_id == category_id).first()
+    if budget is None:
+        budget = Budget(user_id=current_user.id, category_id=category_id)
+        db.add(budget)
+    budget.amount = request.amount
+    budget.alert_percent = request.alert_percent
+    db.commit()
+    return {"category": category, "amount": budget.amount, "alert_percent": budget.alert_percent}
+
+
+@budget_router.delete("/budgets/{category}")
+def delete_budget(
+    category: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    budget = (
+        db.query(Budget)
+        .join(Label, Label.id == Budget.category_id)
+        .filter(Budget.user_id == current_user.id, Label.kind == Label.CATEGORY, Label.name == category)
+        .first()
+    )
+    if not budget:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    db.delete(budget)
+    db.commit()
+    return {"detail": "Budget deleted successfully"}
+
+
+@budget_router.get("/budgets/status", response_model=BudgetStatusResponse)
+def get_budget_status(
+    month: str = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes YYYY-MM (por defecto el actual)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Gastado frente a presupuesto por categoría en el mes. El gasto sale de
+    `spending_counters` (una fila por presupuesto), no de sumar `expenses`.
+    """
+    if month:
+        year, month_number = map(int, month.split("-"))
+        if not 1 <= month_number <= 12:
+            raise HTTPException(status_code=400, detail="Invalid month")
+        period = date(year, month_number, 1)
+    else:
+        period = date.today().replace(day=1)
+
+    rows = (
+        db.query(Budget, SpendingCounter.spent)
+        .outerjoin(
+            SpendingCounter,
+            (SpendingCounter.user_id == Budget.user_id)
+            & (SpendingCounter.category_id == Budget.category_id)
+            & (SpendingCounter.month == period),
+        )
+        .filter(Budget.user_id == current_user.id)
+        .all()
+    )
+    names = label_cache.names(db, [budget.category_id for budget, _ in rows])
+    items = []
+    for budget, spent in rows:
+        spent = round(float(spent or 0), 2)
+        items.append({
+            "category": names.get(budget.category_id),
+            "budget": budget.amount,
+            "spent": spent,
+            "remaining": round(budget.amount - spent, 2),
+            "percent": round(spent * 100 / budget.amount, 2),
+            "status": status_for(spent, budget.amount, budget.alert_percent),
+        })
+    items.sort(key=lambda item: item["percent"], reverse=True)
+    return {
+        "month": period.strftime("%Y-%m"),
+        "items": items,
+        "alerts": [item for item in items if item["status"] != STATUS_OK],
+    }
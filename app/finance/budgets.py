@@ -0,0 +1,95 @@
+"""
+Contadores de gasto por (usuario, mes, categoría) para los presupuestos.
+
+Los eventos del mapper de Expense suman o restan cada alta, cambio y baja en
+`spending_counters` dentro de la misma transacción, así evaluar todos los
+presupuestos de un mes es una búsqueda por clave y no un SUM sobre `expenses`.
+
+Uso desde la línea de comandos:
+
+    python -m app.finance.budgets rebuild [--user-id 42]
+"""
+import argparse
+from sqlalchemy import event, inspect, text
+from app.database.database import shard_map
+from app.finance.checkpoints import month_start
+from app.models.expense import Expense
+
+STATUS_OK = "ok"
+STATUS_WARNING = "warning"
+STATUS_EXCEEDED = "exceeded"
+
+
+def apply_spending(connection, user_id: int, when, category_id: int, delta: float) -> None:
+    if not delta:
+        return
+    connection.execute(text("""
+        INSERT INTO spending_counters (user_id, month, category_id, spent)
+        VALUES (:user_id, :month, :category_id, :delta)
+        ON CONFLICT (user_id, month, category_id) DO UPDATE SET spent = spending_counters.spent + EXCLUDED.spent
+    """), {"user_id": user_id, "month": month_start(when), "category_id": category_id, "delta": delta})
+
+
+def _previous(target, attr: str):
+    history = inspect(target).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(target, attr)
+
+
+def _after_insert(mapper, connection, target):
+    apply_spending(connection, target.user_id, target.date, target.category_id, float(target.amount))
+
+
+def _after_update(mapper, connection, target):
+    old = tuple(_previous(target, attr) for attr in ("user_id", "date", "category_id", "amount"))
+    new = (target.user_id, target.date, target.category_id, target.amount)
+    if old == new:
+        return
+    apply_spending(connection, old[0], old[1], old[2], -float(old[3]))
+    apply_spending(connection, *new[:3], float(new[3]))
+
+
+def _after_delete(mapper, connection, target):
+    apply_spending(connection, target.user_id, target.date, target.category_id, -float(target.amount))
+
+
+event.listen(Expense, "after_insert", _after_insert)
+event.listen(Expense, "after_update", _after_update)
+event.listen(Expense, "after_delete", _after_delete)
+
+
+def status_for(spent: float, amount: float, alert_percent: int) -> str:
+    if spent > amount:
+        return STATUS_EXCEEDED
+    if spent >= amount * alert_percent / 100:
+        return STATUS_WARNING
+    return STATUS_OK
+
+
+def rebuild(connection, user_id: int | None = None) -> int:
+    """Recalcula los contadores desde `expenses` (todos o los de un usuario)."""
+    where = "WHERE user_id = :user_id" if user_id is not None else ""
+    params = {"user_id": user_id}
+    connection.execute(text(f"DELETE FROM spending_counters {where}"), params)
+    result = connection.execute(text(f"""
+        INSERT INTO spending_counters (user_id, month, category_id, spent)
+        SELECT user_id, CAST(date_trunc('month', date) AS DATE), category_id, SUM(amount)
+        FROM expenses {where}
+        GROUP BY 1, 2, 3
+    """), params)
+    return result.rowcount
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Contadores de gasto de los presupuestos")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="Recalcula los contadores desde expenses")
+    rebuild_cmd.add_argument("--user-id", type=int)
+    args = parser.parse_args(argv)
+
+    for engine in shard_map.engines_for(args.user_id):
+        with engine.begin() as conn:
+            print(f"{rebuild(conn, args.user_id)} contadores generados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Checkpoints mensuales del saldo por usuario (tabla `balance_checkpoints`).
+
+Cada fila guarda lo ingresado/gastado en el mes y los acumulados hasta su cierre,
+así el saldo a una fecha es el checkpoint del mes anterior más un escaneo del mes
+en curso. Se mantienen en la misma transacción que las escrituras de
+`transactions` mediante eventos del mapper; con CHECKPOINTS_ASYNC esa
+transacción solo encola el delta y lo aplica el runner de trabajos (el saldo
+puede ir unos segundos por detrás). Por defecto va desactivado: el saldo se lee
+justo después de escribir y la versión síncrona nunca lo da atrasado; solo
+compensa cuando el bloqueo por usuario serializa importaciones grandes.
+
+`rebuild` cancela los deltas encolados o en curso de lo que recalcula (su efecto
+ya está en `transactions`); comparte bloqueos con el trabajo para que ningún
+delta se aplique dos veces.
+
+Uso desde la línea de comandos:
+
+    python -m app.finance.checkpoints rebuild [--user-id 42]
+    python -m app.finance.checkpoints verify [--user-id 42] [--fix]
+"""
+import argparse
+from datetime import date, datetime
+from sqlalchemy import event, func, inspect, text
+from app.config import settings
+from app.database.database import shard_map
+from app.jobs.queue import enqueue
+from app.models.balance_checkpoint import BalanceCheckpoint
+from app.models.expense import Expense
+from app.models.income import Income
+from app.models.transaction import Transaction
+
+# Espacio de claves para pg_advisory_xact_lock(clave, user_id)
+ADVISORY_LOCK_KEY = 3001
+# Diferencia máxima tolerada entre checkpoints y tablas (los importes son Float)
+DRIFT_TOLERANCE = 0.01
+
+_MONTHLY_TOTALS = """
+    SELECT user_id, CAST(date_trunc('month', date) AS DATE) AS month,
+           COALESCE(SUM(amount) FILTER (WHERE kind = 'income'), 0) AS income_total,
+           COALESCE(SUM(amount) FILTER (WHERE kind = 'expense'), 0) AS expense_total
+    FROM transactions {where}
+    GROUP BY 1, 2
+"""
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def apply_delta(connection, user_id: int, when: datetime, income_delta: float = 0, expense_delta: float = 0) -> None:
+    """Suma los deltas al mes de `when` y a los acumulados de ese mes y los posteriores."""
+    if not income_delta and not expense_delta:
+        return
+    params = {
+        "lock_key": ADVISORY_LOCK_KEY,
+        "user_id": user_id,
+        "month": month_start(when),
+        "income": income_delta,
+        "expense": expense_delta,
+    }
+    connection.execute(text("SELECT pg_advisory_xact_lock(:lock_key, :user_id)"), params)
+    connection.execute(text("""
+        INSERT INTO balance_checkpoints (user_id, month, income_total, expense_total, cumulative_income, cumulative_expense)
+        SELECT :user_id, :month, :income, :expense,
+               COALESCE(prev.cumulative_income, 0) + :income,
+               COALESCE(prev.cumulative_expense, 0) + :expense
+        FROM (SELECT 1) AS one
+        LEFT JOIN LATERAL (
+            SELECT cumulative_income, cumulative_expense FROM balance_checkpoints
+            WHERE user_id = :user_id AND month < :month
+            ORDER BY month DESC LIMIT 1
+        ) AS prev ON TRUE
+        ON CONFLICT (user_id, month) DO UPDATE SET
+            income_total = balance_checkpoints.income_total + EXCLUDED.income_total,
+            expense_total = balance_checkpoints.expense_total + EXCLUDED.expense_total,
+            cumulative_income = balance_checkpoints.cumulative_income + EXCLUDED.income_total,
+            cumulative_expense = balance_checkpoints.cumulative_expense + EXCLUDED.expense_total
+    """), params)
+    connection.execute(text("""
+        UPDATE balance_checkpoints
+        SET cumulative_income = cumulative_income + :income,
+            cumulative_expense = cumulative_expense + :expense
+        WHERE user_id = :user_id AND month > :month
+    """), params)
+
+
+def lock_for_delta(connection, user_id: int) -> None:
+    """Bloqueos de un delta diferido antes de comprobar si `rebuild` lo canceló."""
+    connection.execute(text("LOCK TABLE balance_checkpoints IN ROW EXCLUSIVE MODE"))
+    connection.execute(text("SELECT pg_advisory_xact_lock(:lock_key, :user_id)"), {"lock_key": ADVISORY_LOCK_KEY, "user_id": user_id})
+
+
+def _cancel_pending_deltas(connection, user_id: int | None) -> None:
+    where = "AND CAST(payload->>'user_id' AS INTEGER) = :user_id" if user_id is not None else ""
+    connection.execute(text(f"""
+        UPDATE jobs SET status = 'cancelled', finished_at = :now
+        WHERE name = 'checkpoints.apply_delta' AND status IN ('queued', 'running') {where}
+    """), {"now": datetime.utcnow(), "user_id": user_id})
+
+
+def _previous(target, attr: str):
+    """Valor de `attr` antes del flush (o el actual si no cambió)."""
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+
+def _deltas(target, amount: float) -> dict:
+    if isinstance(target, Income):
+        return {"income_delta": amount}
+    return {"expense_delta": amount}
+
+
+def _record_delta(connection, user_id: int, when: datetime, **deltas) -> None:
+    """Aplica el delta en la transacción o, con CHECKPOINTS_ASYNC, lo encola en ella."""
+    if settings.CHECKPOINTS_ASYNC:
+        enqueue("checkpoints.apply_delta", {"user_id": user_id, "when": when.isoformat(), **deltas}, bind=connection)
+    else:
+        apply_delta(connection, user_id, when, **deltas)
+
+
+def _after_insert(mapper, connection, target):
+    _record_delta(connection, target.user_id, target.date, **_deltas(target, float(target.amount)))
+
+
+def _after_update(mapper, connection, target):
+    old_amount, old_date, old_user_id = (_previous(target, attr) for attr in ("amount", "date", "user_id"))
+    if (old_amount, old_date, old_user_id) == (target.amount, target.date, target.user_id):
+        return
+    _record_delta(connection, old_user_id, old_date, **_deltas(target, -float(old_amount)))
+    _record_delta(connection, target.user_id, target.date, **_deltas(target, float(target.amount)))
+
+
+def _after_delete(mapper, connection, target):
+    _record_delta(connection, target.user_id, target.date, **_deltas(target, -float(target.amount)))
+
+
+for _model in (Expense, Income):
+    event.listen(_model, "after_insert", _after_insert)
+    event.listen(_model, "after_update", _after_update)
+    event.listen(_model, "after_delete", _after_delete)
+
+
+def balance_as_of(db, user_id: int, as_of: datetime) -> dict:
+    """Saldo a una fecha: checkpoint del mes anterior + escaneo del mes de `as_of`."""
+    start = datetime.combine(month_start(as_of), datetime.min.time())
+    checkpoint = (
+        db.query(BalanceCheckpoint)
+        .filter(BalanceCheckpoint.user_id == user_id, BalanceCheckpoint.month < start.date())
+        .order_by(BalanceCheckpoint.month.desc())
+        .first()
+    )
+    month_income, month_expense = db.query(
+        func.coalesce(func.sum(Transaction.amount).filter(Transaction.kind == Transaction.INCOME), 0),
+        func.coalesce(func.sum(Transaction.amount).filter(Transaction.kind == Transaction.EXPENSE), 0),
+    ).filter(
+        Transaction.user_id == user_id, Transaction.date >= start, Transaction.date <= as_of
+    ).one()
+    total_income = (checkpoint.cumulative_income if checkpoint else 0) + month_income
+    total_expense = (checkpoint.cumulative_expense if checkpoint else 0) + month_expense
+    return {"total_income": total_income, "total_expense": total_expense, "balance": total_income - total_expense}
+
+
+def lifetime_totals(db, user_id: int) -> dict:
+    """Totales de todo el historial: acumulados del último checkpoint del usuario."""
+    checkpoint = (
+        db.query(BalanceCheckpoint)
+        .filter(BalanceCheckpoint.user_id == user_id)
+        .order_by(BalanceCheckpoint.month.desc())
+        .first()
+    )
+    total_income = checkpoint.cumulative_income if checkpoint else 0
+    total_expense = checkpoint.cumulative_expense if checkpoint else 0
+    return {"total_income": total_income, "total_expense": total_expense, "balance": total_income - total_expense}
+
+
+def rebuild(connection, user_id: int | None = None) -> int:
+    """Recalcula los checkpoints desde `transactions` (todos o los de un usuario)."""
+    where = "WHERE user_id = :user_id" if user_id is not None else ""
+    params = {"user_id": user_id, "lock_key": ADVISORY_LOCK_KEY}
+    # Espera a los deltas que ya se están aplicando y frena los siguientes hasta el commit
+    if user_id is not None:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:lock_key, :user_id)"), params)
+    else:
+        connection.execute(text("LOCK TABLE balance_checkpoints IN SHARE ROW EXCLUSIVE MODE"))
+    _cancel_pending_deltas(connection, user_id)
+    connection.execute(text(f"DELETE FROM balance_checkpoints {where}"), params)
+    result = connection.execute(text(f"""
+        INSERT INTO balance_checkpoints (user_id, month, income_total, expense_total, cumulative_income, cumulative_expense)
+        SELECT user_id, month, income_total, expense_total,
+               SUM(income_total) OVER w, SUM(expense_total) OVER w
+        FROM ({_MONTHLY_TOTALS.format(where=where)}) AS monthly
+        WINDOW w AS (PARTITION BY user_id ORDER BY month)
+    """), params)
+    return result.rowcount
+
+
+def verify(connection, user_id: int | None = None) -> list[dict]:
+    """Compara los checkpoints con `transactions` y devuelve los meses con deriva."""
+    where = "WHERE user_id = :user_id" if user_id is not None else ""
+    rows = connection.execute(text(f"""
+        WITH expected AS (
+            SELECT user_id, month, income_total, expense_total,
+                   SUM(income_total) OVER w AS cumulative_income,
+                   SUM(expense_total) OVER w AS cumulative_expense
+            FROM ({_MONTHLY_TOTALS.format(where=where)}) AS monthly
+            WINDOW w AS (PARTITION BY user_id ORDER BY month)
+        ), stored AS (
+            SELECT * FROM balance_checkpoints {where}
+        )
+        SELECT COALESCE(e.user_id, s.user_id), COALESCE(e.month, s.month),
+               e.cumulative_income, s.cumulative_income, e.cumulative_expense, s.cumulative_expense
+        FROM expected e
+        FULL OUTER JOIN stored s ON s.user_id = e.user_id AND s.month = e.month
+        WHERE ABS(COALESCE(e.income_total, 0) - COALESCE(s.income_total, 0)) > :tolerance
+           OR ABS(COALESCE(e.expense_total, 0) - COALESCE(s.expense_total, 0)) > :tolerance
+           OR ABS(COALESCE(e.cumulative_income, 0) - COALESCE(s.cumulative_income, 0)) > :tolerance
+           OR ABS(COALESCE(e.cumulative_expense, 0) - COALESCE(s.cumulative_expense, 0)) > :tolerance
+        ORDER BY 1, 2
+    """), {"user_id": user_id, "tolerance": DRIFT_TOLERANCE}).all()
+    return [
+        {
+            "user_id": uid,
+            "month": month,
+            "expected_income": exp_income,
+            "stored_income": st_income,
+            "expected_expense": exp_expense,
+            "stored_expense": st_expense,
+        }
+        for uid, month, exp_income, st_income, exp_expense, st_expense in rows
+    ]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Checkpoints de saldo por usuario")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="Recalcula los checkpoints desde cero")
+    rebuild_cmd.add_argument("--user-id", type=int)
+    verify_cmd = sub.add_parser("verify", help="Detecta deriva entre checkpoints y movimientos")
+    verify_cmd.add_argument("--user-id", type=int)
+    verify_cmd.add_argument("--fix", action="store_true", help="Reconstruye los usuarios con deriva")
+    args = parser.parse_args(argv)
+
+    total_drift = 0
+    for engine in shard_map.engines_for(args.user_id):
+        with engine.begin() as conn:
+            if args.command == "rebuild":
+                print(f"{rebuild(conn, args.user_id)} checkpoints generados")
+                continue
+            drift = verify(conn, args.user_id)
+            for row in drift:
+                print(row)
+            users = sorted({row["user_id"] for row in drift})
+            print(f"{len(drift)} meses con deriva en {len(users)} usuarios")
+            if args.fix:
+                for uid in users:
+                    rebuild(conn, uid)
+                print("Checkpoints reconstruidos")
+            total_drift += len(drift)
+    if total_drift and not args.fix:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.schemas.currency import BaseCurrencyRequest, CurrenciesResponse
+from app.finance.fx import convertible, fx_rates
+from app.utils.dependencies import get_db, get_read_db, get_current_user
+
+currency_router = APIRouter()
+
+
+@currency_router.get("/currencies", response_model=CurrenciesResponse)
+def get_currencies(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """Moneda base del usuario y monedas con tipos de cambio importados."""
+    return {"base_currency": current_user.base_currency, "available": fx_rates.currencies(db)}
+
+
+@currency_router.put("/currency", response_model=CurrenciesResponse)
+def set_base_currency(
+    request: BaseCurrencyRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Cambia la moneda a la que se convierten los informes. Los importes guardados
+    no cambian; la moneda base forma parte del ETag de /finance/analytics.
+    """
+    available = fx_rates.currencies(db)
+    # La moneda de referencia vale 1 aunque aún no se haya importado nada
+    if request.currency != current_user.base_currency and request.currency not in convertible(db):
+        raise HTTPException(status_code=400, detail=f"No exchange rates imported for {request.currency}")
+    current_user.base_currency = request.currency
+    db.commit()
+    return {"base_currency": current_user.base_currency, "available": available}
@@ -0,0 +1,50 @@
+"""
+Versión de los datos financieros de cada usuario (`users.data_version`).
+
+Las altas, modificaciones y bajas de ingresos o gastos solo anotan su usuario;
+al final de cada flush un único UPDATE incrementa la versión de los usuarios
+afectados, en la misma transacción. Los GET la usan para ETag/Last-Modified y
+responder 304.
+"""
+from datetime import datetime
+from sqlalchemy import event, text
+from sqlalchemy.orm import object_session
+from app.database.database import SessionLocal
+from app.models.expense import Expense
+from app.models.income import Income
+
+
+def _record(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).add(target.user_id)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _bump(session, flush_context):
+    user_ids = session.info.pop("changed_users", None)
+    if not user_ids:
+        return
+    session.connection().execute(
+        text("UPDATE users SET data_version = data_version + 1, data_changed_at = :now WHERE id = ANY(:user_ids)"),
+        {"now": datetime.utcnow(), "user_ids": sorted(user_ids)},
+    )
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard(session):
+    session.info.pop("changed_users", None)
+
+
+for _model in (Expense, Income):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _record)
+
+
+def user_data_version(user, *extra) -> str:
+    """Clave de versión del usuario; `extra` añade lo que también cambie la respuesta (p. ej. la fecha)."""
+    return ":".join(str(part) for part in (user.id, user.data_version, *extra))
+
+
+def user_last_modified(user) -> datetime:
+    return user.data_changed_at or user.created_at
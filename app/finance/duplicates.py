@@ -0,0 +1,99 @@
+"""
+Detección de duplicados por huella de contenido (`fingerprint`).
+
+Al crear, cada fila se comprueba con una búsqueda en el índice
+(user_id, fingerprint); en lotes, con una sola consulta `= ANY(...)`. Un lock
+advisory por usuario evita que dos importaciones simultáneas dejen pasar la
+misma fila.
+
+Para los duplicados ya existentes:
+
+    python -m app.finance.duplicates scan [--table expenses] [--user-id 42] [--batch-size 500]
+"""
+import argparse
+from sqlalchemy import text
+from app.database.database import shard_map
+from app.models.expense import Expense
+from app.models.income import Income
+
+# Espacio de claves para pg_advisory_xact_lock(clave, user_id)
+ADVISORY_LOCK_KEY = 3002
+TABLES = {"expenses": Expense, "incomes": Income}
+
+
+def lock_user(db, user_id: int) -> None:
+    """Serializa las altas con control de duplicados del usuario hasta el fin de la transacción."""
+    db.execute(text("SELECT pg_advisory_xact_lock(:key, :user_id)"), {"key": ADVISORY_LOCK_KEY, "user_id": user_id})
+
+
+def existing_fingerprints(db, model, user_id: int, fingerprints) -> set[str]:
+    fingerprints = list(set(fingerprints))
+    if not fingerprints:
+        return set()
+    rows = db.query(model.fingerprint).filter(
+        model.user_id == user_id, model.fingerprint.in_(fingerprints)
+    ).distinct()
+    return {fp for fp, in rows}
+
+
+def split_duplicates(db, model, user_id: int, fingerprints: list[str]) -> list[int]:
+    """Posiciones de `fingerprints` ya guardadas o repetidas antes dentro del propio lote."""
+    seen = existing_fingerprints(db, model, user_id, fingerprints)
+    duplicates = []
+    for position, fp in enumerate(fingerprints):
+        if fp in seen:
+            duplicates.append(position)
+        seen.add(fp)
+    return duplicates
+
+
+def scan(connection, table: str, user_id: int | None = None, batch_size: int = 500):
+    """
+    Recorre los usuarios en lotes por id y devuelve los grupos duplicados de cada
+    lote: (user_id, fingerprint, ids). Usa el índice (user_id, fingerprint) con un
+    GROUP BY por lote, sin autojoin sobre toda la tabla.
+    """
+    last_id = 0
+    while True:
+        if user_id is not None:
+            users = [user_id] if last_id < user_id else []
+        else:
+            users = connection.execute(
+                text("SELECT id FROM users WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size},
+            ).scalars().all()
+        if not users:
+            return
+        last_id = users[-1]
+        rows = connection.execute(text(f"""
+            SELECT user_id, fingerprint, array_agg(id ORDER BY id)
+            FROM {table}
+            WHERE user_id = ANY(:users)
+            GROUP BY user_id, fingerprint
+            HAVING COUNT(*) > 1
+            ORDER BY user_id
+        """), {"users": users}).all()
+        yield from rows
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Duplicados de ingresos y gastos")
+    sub = parser.add_subparsers(dest="command", required=True)
+    scan_cmd = sub.add_parser("scan", help="Lista los grupos de filas con la misma huella")
+    scan_cmd.add_argument("--table", choices=sorted(TABLES), action="append")
+    scan_cmd.add_argument("--user-id", type=int)
+    scan_cmd.add_argument("--batch-size", type=int, default=500, help="Usuarios por consulta")
+    args = parser.parse_args(argv)
+
+    groups = 0
+    for engine in shard_map.engines_for(args.user_id):
+        with engine.connect() as conn:
+            for table in args.table or sorted(TABLES):
+                for uid, fp, ids in scan(conn, table, args.user_id, args.batch_size):
+                    groups += 1
+                    print(f"{table}\tuser={uid}\t{fp[:12]}\tids={','.join(map(str, ids))}")
+    print(f"{groups} grupos duplicados")
+
+
+if __name__ == "__main__":
+    main()
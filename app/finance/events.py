@@ -0,0 +1,198 @@
+"""
+Notificación de cambios en ingresos y gastos para el stream SSE del dashboard.
+
+Los eventos del mapper anotan en la sesión qué usuario, meses y categorías se
+tocaron; al confirmar la transacción el cambio se publica:
+
+- EVENTS_BACKEND=local: directamente en el bus del proceso (un solo worker).
+- EVENTS_BACKEND=postgres: con `pg_notify` dentro de la misma transacción; cada
+  worker escucha el canal con LISTEN y lo reenvía a su bus local.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import defaultdict
+import asyncpg
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import object_session
+from app.config import settings
+from app.database.database import SessionLocal
+from app.finance.analytics_cache import analytics_cache
+from app.models.expense import Expense
+from app.models.income import Income
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "finance_changes"
+# Identifica a este worker para no invalidar su propia caché con sus propios cambios
+ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+# Eventos pendientes por suscriptor antes de descartar
+QUEUE_SIZE = 100
+# Espera antes de reintentar la conexión LISTEN
+RECONNECT_SECONDS = 5
+
+
+class ChangeBus:
+    """Suscriptores por usuario: colas asyncio alimentadas desde cualquier hilo."""
+
+    def __init__(self):
+        self._subscribers: dict[int, set] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._metrics = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[user_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def _put(self, queue: asyncio.Queue, change: dict) -> None:
+        try:
+            queue.put_nowait(change)
+            self._metrics["delivered"] += 1
+        except asyncio.QueueFull:
+            self._metrics["dropped"] += 1
+
+    def dispatch(self, change: dict) -> None:
+        self._metrics["published"] += 1
+        with self._lock:
+            subscribers = list(self._subscribers.get(change["user_id"], ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, change)
+
+    def stats(self) -> dict:
+        with self._lock:
+            connections = sum(len(s) for s in self._subscribers.values())
+            return {**self._metrics, "users": len(self._subscribers), "connections": connections}
+
+
+change_bus = ChangeBus()
+
+
+def _touched(target) -> dict:
+    """Mes y categoría/fuente, actuales y anteriores, tocados por un movimiento."""
+    state = inspect(target)
+    code_attr = "source_id" if isinstance(target, Income) else "category_id"
+    dates = {target.date, *state.attrs.date.history.deleted}
+    codes = {getattr(target, code_attr), *state.attrs[code_attr].history.deleted}
+    return {
+        "months": {d.strftime("%Y-%m") for d in dates if d is not None},
+        "sources" if isinstance(target, Income) else "categories": {c for c in codes if c is not None},
+    }
+
+
+def _record_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    changes = session.info.setdefault("changes", {})
+    change = changes.setdefault(target.user_id, {"months": set(), "categories": set(), "sources": set()})
+    for key, values in _touched(target).items():
+        change[key] |= values
+
+
+for _model in (Expense, Income):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _record_change)
+
+
+def _serialize(user_id: int, change: dict) -> dict:
+    return {
+        "origin": ORIGIN,
+        "user_id": user_id,
+        "months": sorted(change["months"]),
+        "categories": sorted(change["categories"]),
+        "sources": sorted(change["sources"]),
+    }
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _notify_postgres(session):
+    if settings.EVENTS_BACKEND != "postgres":
+        return
+    # El flush final del commit ocurre después de este evento; se adelanta para registrar sus cambios
+    session.flush()
+    if not session.info.get("changes"):
+        return
+    for user_id, change in session.info["changes"].items():
+        session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": CHANNEL, "payload": json.dumps(_serialize(user_id, change))},
+        )
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_local(session):
+    changes = session.info.pop("changes", None)
+    if settings.EVENTS_BACKEND == "postgres" or not changes:
+        return
+    for user_id, change in changes.items():
+        change_bus.dispatch(_serialize(user_id, change))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("changes", None)
+
+
+class PostgresListener:
+    """Conexión asyncpg dedicada por shard que escucha CHANNEL y reenvía al bus local."""
+
+    def __init__(self, dsns: list[str], on_remote_change):
+        self.dsns = dsns
+        self.on_remote_change = on_remote_change
+        self._tasks: list[asyncio.Task] = []
+
+    def _handle(self, connection, pid, channel, payload) -> None:
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            logger.warning("Notificación inválida en %s: %r", channel, payload)
+            return
+        if change.get("origin") != ORIGIN:
+            self.on_remote_change(change["user_id"])
+        change_bus.dispatch(change)
+
+    async def _run(self, dsn: str) -> None:
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(CHANNEL, self._handle)
+                while not connection.is_closed():
+                    await asyncio.sleep(RECONNECT_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("LISTEN %s interrumpido; reintentando", CHANNEL)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    def start(self) -> None:
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._run(dsn)) for dsn in self.dsns]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+change_listener = PostgresListener([settings.DATABASE_URL, *settings.DB_SHARD_URLS], analytics_cache.invalidate)
@@ -1,42 +1,113 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime
 from app.models.expense import Expense
 from app.models.user import User
 from app.schemas.expense import ExpenseCreateRequest, ExpenseResponse, ExpenseByCategoryResponse, ExpenseListItemResponse, PaginatedExpenseResponse
-from app.utils.dependencies import get_db, get_current_user
-from typing import List
+from app.finance.analytics_cache import analytics_cache
+from app.finance.data_version import user_data_version, user_last_modified
+from app.utils.conditional import not_modified
+from app.schemas.bulk import BulkCreateResponse
+from app.finance import duplicates, fx
+from app.utils import idempotency
+from app.utils.fingerprint import fingerprint, EXPENSE
+from app.utils.dependencies import get_db, get_read_db, get_current_user
+from typing import List, Literal
+
+# Filas máximas por importación en lote
+BULK_MAX_ROWS = 5000
 
 
 expense_router = APIRouter()
 
-@expense_router.post("/expense", response_model=ExpenseResponse)
-def create_expense(
-    request: ExpenseCreateRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    new_expense = Expense(
-        user_id=current_user.id,
+def _new_expense(user: User, request: ExpenseCreateRequest) -> Expense:
+    expense = Expense(
+        user_id=user.id,
         amount=request.amount,
+        currency=request.currency or user.base_currency,
         payment_method=request.payment_method,
         category=request.category,
         description=request.description,
         date=request.date,
     )
+    expense.fingerprint = fingerprint(EXPENSE, user.id, request.date, request.amount, expense.currency, request.description)
+    return expense
+
+@expense_router.post("/expense", response_model=ExpenseResponse)
+def create_expense(
+    request: ExpenseCreateRequest,
+    on_duplicate: Literal["allow", "reject"] = Query("allow", description="reject: 409 si ya existe un gasto idéntico"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    payload = request.model_dump(mode="json")
+    replayed = idempotency.replay(db, current_user.id, idempotency_key, payload)
+    if replayed is not None:
+        return replayed
+    new_expense = _new_expense(current_user, request)
+    fx.require_rates(db, [new_expense.currency], current_user.base_currency)
+    if on_duplicate == "reject":
+        duplicates.lock_user(db, current_user.id)
+        if duplicates.existing_fingerprints(db, Expense, current_user.id, [new_expense.fingerprint]):
+            raise HTTPException(status_code=409, detail="Duplicate expense")
     db.add(new_expense)
-    db.commit()
+    db.flush()
+    idempotency.remember(db, current_user.id, idempotency_key, payload, ExpenseResponse.model_validate(new_expense).model_dump(mode="json"))
+    stored = idempotency.commit(db, current_user.id, idempotency_key, payload)
+    if stored is not None:
+        return stored
     db.refresh(new_expense)
+    analytics_cache.upsert(new_expense)
     return new_expense
 
+@expense_router.post("/expense/bulk", response_model=BulkCreateResponse)
+def create_expenses_bulk(
+    requests: List[ExpenseCreateRequest] = Body(..., max_length=BULK_MAX_ROWS),
+    on_duplicate: Literal["skip", "reject", "allow"] = Query("skip", description="Qué hacer con filas ya existentes o repetidas en el lote"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Importación en lote (p. ej. un extracto bancario) con control de duplicados por huella."""
+    payload = [request.model_dump(mode="json") for request in requests]
+    replayed = idempotency.replay(db, current_user.id, idempotency_key, payload)
+    if replayed is not None:
+        return replayed
+    expenses = [_new_expense(current_user, request) for request in requests]
+    fx.require_rates(db, {expense.currency for expense in expenses}, current_user.base_currency)
+    skipped = []
+    if on_duplicate != "allow":
+        duplicates.lock_user(db, current_user.id)
+        skipped = duplicates.split_duplicates(db, Expense, current_user.id, [e.fingerprint for e in expenses])
+        if skipped and on_duplicate == "reject":
+            raise HTTPException(status_code=409, detail={"message": "Duplicate expenses", "duplicates": skipped})
+    skipped_positions = set(skipped)
+    created = [expense for position, expense in enumerate(expenses) if position not in skipped_positions]
+    db.add_all(created)
+    db.flush()
+    result = {"created": len(created), "skipped": len(skipped), "duplicates": skipped, "ids": [e.id for e in created]}
+    idempotency.remember(db, current_user.id, idempotency_key, payload, result)
+    stored = idempotency.commit(db, current_user.id, idempotency_key, payload)
+    if stored is not None:
+        return stored
+    # Tras el commit las filas están expiradas: leerlas haría un SELECT por fila
+    analytics_cache.invalidate(current_user.id)
+    return result
+
 @expense_router.get("/expense", response_model=list[ExpenseResponse])
 def get_all_expenses(
+    request: Request,
+    response: Response,
     start_date: datetime = Query(None, description="Fecha de inicio (inclusive)"),
     end_date: datetime = Query(None, description="Fecha de fin (inclusive)"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
+    cached = not_modified(request, response, user_data_version(current_user), user_last_modified(current_user))
+    if cached:
+        return cached
     query = db.query(Expense).filter(Expense.user_id == current_user.id)
     if start_date:
         query = query.filter(Expense.date >= start_date)
@@ -57,12 +128,15 @@ def update_expense(
         raise HTTPException(status_code=404, detail="Expense not found")
 
     expense.amount = request.amount
+    expense.currency = request.currency or expense.currency
+    fx.require_rates(db, [expense.currency], current_user.base_currency)
     expense.payment_method = request.payment_method
     expense.category = request.category
     expense.description = request.description
     expense.date = request.date
     db.commit()
     db.refresh(expense)
+    analytics_cache.upsert(expense)
     return expense
 
 @expense_router.delete("/expense/{expense_id}")
@@ -77,6 +151,7 @@ def delete_expense(
 
     db.delete(expense)
     db.commit()
+    analytics_cache.remove(Expense, current_user.id, expense_id)
     return {"detail": "Expense deleted successfully"}
 
 @expense_router.patch("/expense/{expense_id}", response_model=ExpenseResponse)
@@ -96,12 +171,13 @@ def patch_expense(
 
     db.commit()
     db.refresh(expense)
+    analytics_cache.upsert(expense)
     return expense
 
 @expense_router.get("/expense/by-category", response_model=List[ExpenseByCategoryResponse])
 def get_expense_by_category(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     results = (
         db.query(Expense.category, func.sum(Expense.amount).label("total"))
@@ -117,7 +193,7 @@ def get_expense_list(
     start_date: datetime = Query(None, description="Fecha de inicio (inclusive)"),
     end_date: datetime = Query(None, description="Fecha de cierre (inclusive)"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     query = db.query(Expense).filter(Expense.user_id == current_user.id, Expense.is_active == True)
     if start_date:
@@ -134,7 +210,7 @@ def get_all_expenses(
     limit: int = Query(10, ge=1, le=100, description="Cantidad máxima de resultados por página"),
     offset: int = Query(0, ge=0, description="Número de registros a omitir"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     query = db.query(Expense).filter(Expense.user_id == current_user.id)
     if start_date:
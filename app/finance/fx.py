@@ -0,0 +1,309 @@
+"""
+Tipos de cambio y conversión a la moneda base del usuario.
+
+`fx_rates` se carga desde ficheros CSV (date,currency,rate), nunca desde la red:
+
+    python -m app.finance.fx import rates.csv [otro.csv ...]
+    python -m app.finance.fx list
+    python -m app.finance.fx missing
+
+Cada shard guarda su copia de `fx_rates` (la conversión en SQL es un join
+local), así que la importación se escribe en todos.
+
+Al importar se rellenan los días sin cotización (fines de semana, festivos) con
+la anterior, así en SQL la conversión es un join exacto por (moneda, día). Para
+NumPy, `fx_rates` mantiene en memoria una serie ordenada por moneda y convierte
+arreglos enteros con `searchsorted` (último tipo conocido en o antes del día),
+un paso por moneda distinta y no por fila.
+
+Los tipos son el valor de una unidad en FX_REFERENCE_CURRENCY, que vale 1: la
+importación añade esa fila implícita para cada día importado (y rechaza filas de
+la moneda de referencia con otro tipo). Antes de la primera cotización de una
+moneda se usa la primera. Las escrituras en monedas sin cotizaciones se
+rechazan (`require_rates`), así que un factor solo puede faltar en movimientos
+anteriores a esta comprobación: esos se dejan sin convertir (igual en SQL y
+NumPy) y `missing` los señala.
+"""
+import argparse
+import csv
+import threading
+import time
+from datetime import date, datetime
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import text
+from app.config import settings
+from app.database.database import engine, shard_map
+from app.models.fx_rate import FxRate  # noqa: F401  (tabla en los metadatos)
+
+# Códigos enteros de moneda para las columnas NumPy (estables dentro del proceso)
+_codes: dict[str, int] = {}
+_names: list[str] = []
+_codes_lock = threading.Lock()
+
+
+def currency_code(currency: str) -> int:
+    code = _codes.get(currency)
+    if code is None:
+        with _codes_lock:
+            code = _codes.setdefault(currency, len(_names))
+            if code == len(_names):
+                _names.append(currency)
+    return code
+
+
+def currency_name(code: int) -> str:
+    return _names[code]
+
+
+def currency_codes(currencies) -> np.ndarray:
+    """Códigos de una secuencia de monedas, resolviendo solo las distintas."""
+    names, inverse = np.unique(np.asarray(currencies, dtype=object).astype(str), return_inverse=True)
+    return np.array([currency_code(name) for name in names.tolist()], dtype=np.int16)[inverse]
+
+
+def amount_sql(alias: str) -> str:
+    """
+    Importe de `alias` en :base_currency. Requiere `join_sql(alias)` en el FROM; si
+    falta el día exacto (p. ej. hoy, antes de importar) usa la última cotización y,
+    antes de la primera, la primera.
+    """
+    def rate(join: str, currency: str) -> str:
+        return f"""COALESCE({join}.rate, (
+            SELECT r.rate FROM fx_rates r
+            WHERE r.currency = {currency} AND r.date <= CAST({alias}.date AS DATE)
+            ORDER BY r.date DESC LIMIT 1
+        ), (
+            SELECT r.rate FROM fx_rates r WHERE r.currency = {currency} ORDER BY r.date LIMIT 1
+        ))"""
+    return f"""CASE WHEN {alias}.currency = :base_currency THEN {alias}.amount
+        ELSE {alias}.amount * COALESCE({rate(f"{alias}_fx", f"{alias}.currency")} / {rate(f"{alias}_fxb", ":base_currency")}, 1)
+    END"""
+
+
+def join_sql(alias: str) -> str:
+    return f"""
+        LEFT JOIN fx_rates {alias}_fx ON {alias}_fx.currency = {alias}.currency AND {alias}_fx.date = CAST({alias}.date AS DATE)
+        LEFT JOIN fx_rates {alias}_fxb ON {alias}_fxb.currency = :base_currency AND {alias}_fxb.date = CAST({alias}.date AS DATE)
+    """
+
+
+def has_foreign_currency(db, model, user_id: int, base_currency: str) -> bool:
+    # `<>` no aprovecha el índice (user_id, currency); dos rangos sí
+    return db.query(
+        db.query(model.id).filter(
+            model.user_id == user_id,
+            (model.currency < base_currency) | (model.currency > base_currency),
+        ).exists()
+    ).scalar()
+
+
+class FxRates:
+    """
+    Series de tipos por moneda en memoria: días (int64 desde epoch) y tipos
+    (float64) ordenados por día. Cada FX_CACHE_TTL segundos se comprueba con una
+    consulta mínima si hubo importaciones y solo entonces se recargan.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._series: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        self._version: str | None = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _refresh(self, db) -> None:
+        if time.monotonic() - self._checked_at <= self.ttl:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at <= self.ttl:
+                return
+            count, last_import = db.execute(text("SELECT COUNT(*), MAX(imported_at) FROM fx_rates")).one()
+            version = f"{count}:{last_import.isoformat() if last_import else ''}"
+            if version != self._version:
+                rows = db.execute(text("SELECT currency, date, rate FROM fx_rates ORDER BY currency, date")).all()
+                series = {}
+                if rows:
+                    currencies, days, rates = zip(*rows)
+                    currencies = np.array(currencies)
+                    days = np.array(days, dtype="datetime64[D]").astype(np.int64)
+                    rates = np.array(rates, dtype=np.float64)
+                    # Filas ya ordenadas por moneda: cada moneda es un tramo contiguo
+                    starts = np.flatnonzero(np.r_[True, currencies[1:] != currencies[:-1]])
+                    for start, end in zip(starts, np.r_[starts[1:], len(rows)]):
+                        series[currency_code(str(currencies[start]))] = (days[start:end], rates[start:end])
+                self._series = series
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def version(self, db) -> str:
+        """Cambia con cada importación; forma parte del ETag de las respuestas convertidas."""
+        self._refresh(db)
+        return self._version or ""
+
+    def _rates_on(self, code: int, days: np.ndarray) -> np.ndarray | None:
+        series = self._series.get(code)
+        if series is None:
+            return None
+        known_days, rates = series
+        # Último tipo en o antes de cada día; antes de la primera cotización, la primera
+        positions = np.searchsorted(known_days, days, side="right") - 1
+        return rates[np.clip(positions, 0, None)]
+
+    def factors(self, db, codes: np.ndarray, days: np.ndarray, base_currency: str) -> np.ndarray:
+        """Factor de conversión a `base_currency` de cada elemento (códigos de moneda y días desde epoch)."""
+        self._refresh(db)
+        base = currency_code(base_currency)
+        result = np.ones(len(codes), dtype=np.float64)
+        for code in np.unique(codes).tolist():
+            if code == base:
+                continue
+            mask = codes == code
+            source, target = self._rates_on(code, days[mask]), self._rates_on(base, days[mask])
+            if source is not None and target is not None:
+                result[mask] = source / target
+        return result
+
+    def convert(self, db, amounts: np.ndarray, codes: np.ndarray, days: np.ndarray, base_currency: str) -> np.ndarray:
+        base = currency_code(base_currency)
+        if not len(codes) or (codes == base).all():
+            return amounts
+        return amounts * self.factors(db, codes, days, base_currency)
+
+    def currencies(self, db) -> list[dict]:
+        self._refresh(db)
+        return sorted(
+            (
+                {
+                    "currency": currency_name(code),
+                    "from": str(np.datetime64(int(days[0]), "D")),
+                    "to": str(np.datetime64(int(days[-1]), "D")),
+                }
+                for code, (days, _) in self._series.items()
+            ),
+            key=lambda item: item["currency"],
+        )
+
+
+fx_rates = FxRates(settings.FX_CACHE_TTL)
+
+
+def convertible(db) -> set[str]:
+    """Monedas con cotizaciones importadas, más la de referencia."""
+    return {item["currency"] for item in fx_rates.currencies(db)} | {settings.FX_REFERENCE_CURRENCY}
+
+
+def require_rates(db, currencies, base_currency: str) -> None:
+    """400 si hay importes en otra moneda que la base y esa moneda o la base no tienen cotizaciones."""
+    foreign = set(currencies) - {base_currency}
+    if not foreign:
+        return
+    missing = sorted((foreign | {base_currency}) - convertible(db))
+    if missing:
+        raise HTTPException(status_code=400, detail=f"No exchange rates imported for {', '.join(missing)}")
+
+
+def read_csv(path: str) -> list[dict]:
+    """Filas {currency, date, rate} de un CSV con cabecera date,currency,rate."""
+    rows = []
+    with open(path, newline="") as f:
+        for line, record in enumerate(csv.DictReader(f), start=2):
+            try:
+                rate = float(record["rate"])
+                currency = record["currency"].strip().upper()
+                if rate <= 0 or len(currency) != 3 or not currency.isalpha():
+                    raise ValueError
+                rows.append({"currency": currency, "date": date.fromisoformat(record["date"].strip()), "rate": rate})
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{path}:{line}: se esperaba date (YYYY-MM-DD), currency (ISO 4217) y rate > 0")
+            if currency == settings.FX_REFERENCE_CURRENCY and rate != 1:
+                raise ValueError(f"{path}:{line}: {currency} es la moneda de referencia (FX_REFERENCE_CURRENCY), su tipo es 1")
+    return rows
+
+
+def with_reference(rows: list[dict]) -> list[dict]:
+    """Añade el tipo 1 de la moneda de referencia en cada día importado que no lo traiga."""
+    reference = settings.FX_REFERENCE_CURRENCY
+    quoted = {row["date"] for row in rows if row["currency"] == reference}
+    days = sorted({row["date"] for row in rows} - quoted)
+    return rows + [{"currency": reference, "date": day, "rate": 1.0} for day in days]
+
+
+def import_rates(connection, rows: list[dict]) -> int:
+    """Inserta o sustituye las cotizaciones y rellena los huecos diarios de las monedas afectadas."""
+    if not rows:
+        return 0
+    imported, rows = len(rows), with_reference(rows)
+    now = datetime.utcnow()
+    connection.execute(text("""
+        INSERT INTO fx_rates (currency, date, rate, filled, imported_at)
+        VALUES (:currency, :date, :rate, FALSE, :now)
+        ON CONFLICT (currency, date) DO UPDATE
+        SET rate = EXCLUDED.rate, filled = FALSE, imported_at = EXCLUDED.imported_at
+    """), [{**row, "now": now} for row in rows])
+    # Los huecos se recalculan desde la cotización real anterior, también los ya rellenos
+    connection.execute(text("""
+        INSERT INTO fx_rates (currency, date, rate, filled, imported_at)
+        SELECT span.currency, CAST(day AS DATE), previous.rate, TRUE, :now
+        FROM (
+            SELECT currency, MIN(date) AS first_day, MAX(date) AS last_day
+            FROM fx_rates WHERE currency = ANY(:currencies) AND NOT filled
+            GROUP BY currency
+        ) AS span
+        CROSS JOIN generate_series(span.first_day, span.last_day, interval '1 day') AS day
+        CROSS JOIN LATERAL (
+            SELECT r.rate FROM fx_rates r
+            WHERE r.currency = span.currency AND r.date <= CAST(day AS DATE) AND NOT r.filled
+            ORDER BY r.date DESC LIMIT 1
+        ) AS previous
+        ON CONFLICT (currency, date) DO UPDATE
+        SET rate = EXCLUDED.rate, imported_at = EXCLUDED.imported_at
+        WHERE fx_rates.filled AND fx_rates.rate <> EXCLUDED.rate
+    """), {"currencies": sorted({row["currency"] for row in rows}), "now": now})
+    return imported
+
+
+# Movimientos en otra moneda que la base de su usuario con una de las dos sin
+# cotizaciones: los informes los suman sin convertir
+_MISSING_SQL = text("""
+    SELECT t.currency, u.base_currency, COUNT(*), COUNT(DISTINCT t.user_id)
+    FROM transactions t
+    JOIN users u ON u.id = t.user_id
+    WHERE t.currency <> u.base_currency
+      AND (
+          t.currency <> :reference AND NOT EXISTS (SELECT 1 FROM fx_rates r WHERE r.currency = t.currency)
+          OR u.base_currency <> :reference AND NOT EXISTS (SELECT 1 FROM fx_rates r WHERE r.currency = u.base_currency)
+      )
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+""")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Tipos de cambio locales")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="Importa cotizaciones desde CSV (date,currency,rate)")
+    import_cmd.add_argument("files", nargs="+")
+    sub.add_parser("list", help="Monedas disponibles y su rango de fechas")
+    sub.add_parser("missing", help="Movimientos que no se pueden convertir a la moneda base de su usuario")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        rows = [row for path in args.files for row in read_csv(path)]
+        for shard_engine in shard_map.engines:
+            with shard_engine.begin() as conn:
+                print(f"{import_rates(conn, rows)} cotizaciones importadas")
+        return
+    if args.command == "missing":
+        for shard, shard_engine in enumerate(shard_map.engines):
+            with shard_engine.connect() as conn:
+                for currency, base, transactions, users in conn.execute(_MISSING_SQL, {"reference": settings.FX_REFERENCE_CURRENCY}):
+                    print(f"shard {shard}\t{currency} -> {base}\t{transactions} movimientos\t{users} usuarios")
+        return
+    with engine.connect() as conn:
+        for item in fx_rates.currencies(conn):
+            print(f"{item['currency']}\t{item['from']}\t{item['to']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,110 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Body, Depends, Header, Query, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app.models.income import Income
 from app.models.user import User
 from app.schemas.income import IncomeCreateRequest, IncomeResponse, PaginatedIncomeResponse
-from app.utils.dependencies import get_db, get_current_user
-from typing import List
+from app.finance.analytics_cache import analytics_cache
+from app.finance.data_version import user_data_version, user_last_modified
+from app.utils.conditional import not_modified
+from app.schemas.bulk import BulkCreateResponse
+from app.finance import duplicates, fx
+from app.utils import idempotency
+from app.utils.fingerprint import fingerprint, INCOME
+from app.utils.dependencies import get_db, get_read_db, get_current_user
+from typing import List, Literal
+
+# Filas máximas por importación en lote
+BULK_MAX_ROWS = 5000
 
 income_router = APIRouter()
 
+def _new_income(user: User, request: IncomeCreateRequest) -> Income:
+    income = Income(
+        user_id=user.id,
+        source=request.source,
+        amount=request.amount,
+        currency=request.currency or user.base_currency,
+        observations=request.observations,
+        date=request.date,
+    )
+    income.fingerprint = fingerprint(INCOME, user.id, request.date, request.amount, income.currency, request.source)
+    return income
+
 @income_router.post("/income", response_model=IncomeResponse)
 def create_income(
     request: IncomeCreateRequest,
+    on_duplicate: Literal["allow", "reject"] = Query("allow", description="reject: 409 si ya existe un ingreso idéntico"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    new_income = Income(
-        user_id=current_user.id,
-        source=request.source,
-        amount=request.amount,
-        observations=request.observations,
-        date=request.date,
-    )
+    payload = request.model_dump(mode="json")
+    replayed = idempotency.replay(db, current_user.id, idempotency_key, payload)
+    if replayed is not None:
+        return replayed
+    new_income = _new_income(current_user, request)
+    fx.require_rates(db, [new_income.currency], current_user.base_currency)
+    if on_duplicate == "reject":
+        duplicates.lock_user(db, current_user.id)
+        if duplicates.existing_fingerprints(db, Income, current_user.id, [new_income.fingerprint]):
+            raise HTTPException(status_code=409, detail="Duplicate income")
     db.add(new_income)
-    db.commit()
+    db.flush()
+    idempotency.remember(db, current_user.id, idempotency_key, payload, IncomeResponse.model_validate(new_income).model_dump(mode="json"))
+    stored = idempotency.commit(db, current_user.id, idempotency_key, payload)
+    if stored is not None:
+        return stored
     db.refresh(new_income)
+    analytics_cache.upsert(new_income)
     return new_income
 
+@income_router.post("/income/bulk", response_model=BulkCreateResponse)
+def create_incomes_bulk(
+    requests: List[IncomeCreateRequest] = Body(..., max_length=BULK_MAX_ROWS),
+    on_duplicate: Literal["skip", "reject", "allow"] = Query("skip", description="Qué hacer con filas ya existentes o repetidas en el lote"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Importación en lote con control de duplicados por huella."""
+    payload = [request.model_dump(mode="json") for request in requests]
+    replayed = idempotency.replay(db, current_user.id, idempotency_key, payload)
+    if replayed is not None:
+        return replayed
+    incomes = [_new_income(current_user, request) for request in requests]
+    fx.require_rates(db, {income.currency for income in incomes}, current_user.base_currency)
+    skipped = []
+    if on_duplicate != "allow":
+        duplicates.lock_user(db, current_user.id)
+        skipped = duplicates.split_duplicates(db, Income, current_user.id, [i.fingerprint for i in incomes])
+        if skipped and on_duplicate == "reject":
+            raise HTTPException(status_code=409, detail={"message": "Duplicate incomes", "duplicates": skipped})
+    skipped_positions = set(skipped)
+    created = [income for position, income in enumerate(incomes) if position not in skipped_positions]
+    db.add_all(created)
+    db.flush()
+    result = {"created": len(created), "skipped": len(skipped), "duplicates": skipped, "ids": [i.id for i in created]}
+    idempotency.remember(db, current_user.id, idempotency_key, payload, result)
+    stored = idempotency.commit(db, current_user.id, idempotency_key, payload)
+    if stored is not None:
+        return stored
+    # Tras el commit las filas están expiradas: leerlas haría un SELECT por fila
+    analytics_cache.invalidate(current_user.id)
+    return result
+
 @income_router.get("/income", response_model=List[IncomeResponse])
 def get_all_incomes(
+    request: Request,
+    response: Response,
     start_date: datetime = Query(None, description="Fecha de inicio (inclusive)"),
     end_date: datetime = Query(None, description="Fecha de fin (inclusive)"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
+    cached = not_modified(request, response, user_data_version(current_user), user_last_modified(current_user))
+    if cached:
+        return cached
     query = db.query(Income).filter(
         Income.user_id == current_user.id
     )
@@ -57,11 +128,14 @@ def update_income(
 
     income.source = request.source
     income.amount = request.amount
+    income.currency = request.currency or income.currency
+    fx.require_rates(db, [income.currency], current_user.base_currency)
     income.category = request.category
     income.observations = request.observations
     income.date = request.date
     db.commit()
     db.refresh(income)
+    analytics_cache.upsert(income)
     return income
 
 @income_router.delete("/income/{income_id}")
@@ -76,6 +150,7 @@ def delete_income(
 
     db.delete(income)
     db.commit()
+    analytics_cache.remove(Income, current_user.id, income_id)
     return {"detail": "Income deleted successfully"}
 
 @income_router.patch("/income/{income_id}", response_model=IncomeResponse)
@@ -95,6 +170,7 @@ def patch_income(
 
     db.commit()
     db.refresh(income)
+    analytics_cache.upsert(income)
     return income
 @income_router.get("/income/paginated_details", response_model=PaginatedIncomeResponse)
 def get_all_incomes(
@@ -103,7 +179,7 @@ def get_all_incomes(
     limit: int = Query(10, ge=1, le=100, description="Cantidad máxima de resultados por página"),
     offset: int = Query(0, ge=0, description="Número de registros a omitir"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     query = db.query(Income).filter(
         Income.user_id == current_user.id
@@ -3,6 +3,10 @@ from .income_routes import income_router
 from .expense_routes import expense_router
 from .balance_routes import balance_router
 from .analytics_routes import analytics_router
+from .sync_routes import sync_router
+from .budget_routes import budget_router
+from .currency_routes import currency_router
+from .autocomplete_routes import autocomplete_router
 
 finance_router = APIRouter(tags=["Finance"])
 
@@ -10,4 +14,8 @@ finance_router.include_router(balance_router)
 finance_router.include_router(analytics_router)
 finance_router.include_router(income_router)
 finance_router.include_router(expense_router)
+finance_router.include_router(sync_router)
+finance_router.include_router(budget_router)
+finance_router.include_router(currency_router)
+finance_router.include_router(autocomplete_router)
 
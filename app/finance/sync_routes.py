@@ -0,0 +1,142 @@
+import base64
+import heapq
+import itertools
+import json
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.deleted_record import DeletedRecord
+from app.models.expense import Expense
+from app.models.income import Income
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.schemas.sync import SyncResponse
+from app.finance.tombstones import retention_start
+from app.utils.dependencies import get_db, get_current_user
+
+sync_router = APIRouter()
+
+
+# Posición en el orden (updated_at, kind, id) de los movimientos y (deleted_at, id) de las lápidas
+RowCursor = tuple[datetime, str, int]
+DeletedCursor = tuple[datetime, int]
+
+
+def encode_token(rows: RowCursor, deleted: DeletedCursor, version: int | None) -> str:
+    data = {
+        "r": [rows[0].isoformat(), rows[1], rows[2]],
+        "d": [deleted[0].isoformat(), deleted[1]],
+        "v": version,
+    }
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token: str) -> tuple[RowCursor, DeletedCursor, int | None]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        if "t" in data:
+            # Formato anterior: una sola marca de tiempo para movimientos y lápidas
+            since = datetime.fromisoformat(data["t"])
+            return (since, "", 0), (since, 0), data.get("v")
+        rows, deleted = data["r"], data["d"]
+        return (
+            (datetime.fromisoformat(rows[0]), str(rows[1]), int(rows[2])),
+            (datetime.fromisoformat(deleted[0]), int(deleted[1])),
+            data.get("v"),
+        )
+    except (ValueError, KeyError, TypeError, IndexError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+
+def _changed(db: Session, model, kind: str, user_id: int, after: RowCursor | None, limit: int) -> list:
+    """Filas de `model` posteriores a `after` en el orden (updated_at, kind, id)."""
+    query = db.query(model).filter(model.user_id == user_id)
+    if after is not None:
+        at, after_kind, after_id = after
+        if kind > after_kind:
+            query = query.filter(model.updated_at >= at)
+        elif kind < after_kind:
+            query = query.filter(model.updated_at > at)
+        else:
+            query = query.filter(tuple_(model.updated_at, model.id) > tuple_(at, after_id))
+    return query.order_by(model.updated_at, model.id).limit(limit + 1).all()
+
+
+@sync_router.get("/sync", response_model=SyncResponse)
+def sync(
+    since: str = Query(None, description="Token devuelto por la sincronización anterior (vacío = copia completa)"),
+    limit: int = Query(1000, ge=1, le=5000, description="Máximo de ingresos más gastos, y de bajas, en esta respuesta"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Sincronización incremental: devuelve los ingresos y gastos creados o
+    modificados, y los ids borrados, desde el token `since`, junto al token
+    siguiente. Con `full` el cliente debe descartar su copia local; con
+    `has_more` debe volver a llamar enseguida con el nuevo token.
+
+    El token guarda la posición en el orden (updated_at, kind, id) de los
+    movimientos y (deleted_at, id) de las bajas, así una página nunca repite la
+    anterior aunque muchas filas compartan updated_at. Una copia completa empieza
+    las bajas en su inicio, así sus páginas siguientes son incrementales
+    normales. Al ponerse al día el token queda SYNC_OVERLAP_SECONDS por detrás del
+    inicio de la consulta para no perder escrituras que confirmaron tarde, por lo
+    que una misma fila puede llegar más de una vez; el cliente debe aplicar
+    upserts y después las bajas. Se lee del primario: una réplica atrasada no
+    debe adelantar el token.
+    """
+    started = datetime.utcnow()
+    anchor = started - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+    # La versión se lee (al autenticar) antes que los datos
+    version = current_user.data_version
+    rows_after, deleted_after, since_version = decode_token(since) if since else (None, None, None)
+    # Solo las bajas caducan: un cursor de filas antiguo es normal en mitad de una copia completa
+    full = deleted_after is None or deleted_after[0] < retention_start()
+    empty_deleted = {"expenses": [], "incomes": []}
+    if not full and since_version is not None and since_version == version:
+        return {"token": since, "full": False, "has_more": False, "expenses": [], "incomes": [], "deleted": empty_deleted}
+    if full:
+        rows_after, deleted_after = None, (anchor, 0)
+
+    changed = heapq.merge(
+        ((row.updated_at, Transaction.EXPENSE, row.id, row) for row in _changed(db, Expense, Transaction.EXPENSE, current_user.id, rows_after, limit)),
+        ((row.updated_at, Transaction.INCOME, row.id, row) for row in _changed(db, Income, Transaction.INCOME, current_user.id, rows_after, limit)),
+        key=lambda entry: entry[:3],
+    )
+    changed = list(itertools.islice(changed, limit + 1))
+    deleted = (
+        db.query(DeletedRecord.kind, DeletedRecord.record_id, DeletedRecord.deleted_at, DeletedRecord.id)
+        .filter(
+            DeletedRecord.user_id == current_user.id,
+            tuple_(DeletedRecord.deleted_at, DeletedRecord.id) > tuple_(*deleted_after),
+        )
+        .order_by(DeletedRecord.deleted_at, DeletedRecord.id)
+        .limit(limit + 1)
+        .all()
+    )
+
+    # Cada lista truncada continúa tras su última fila devuelta; la que se completó, desde el margen
+    rows_truncated, deleted_truncated = len(changed) > limit, len(deleted) > limit
+    changed, deleted = changed[:limit], deleted[:limit]
+    has_more = rows_truncated or deleted_truncated
+    token = encode_token(
+        changed[-1][:3] if rows_truncated else (anchor, "", 0),
+        (deleted[-1].deleted_at, deleted[-1].id) if deleted_truncated else (anchor, 0),
+        None if has_more else version,
+    )
+
+    return {
+        "token": token,
+        "full": full,
+        "has_more": has_more,
+        "expenses": [row for _, kind, _, row in changed if kind == Transaction.EXPENSE],
+        "incomes": [row for _, kind, _, row in changed if kind == Transaction.INCOME],
+        "deleted": {
+            "expenses": [row.record_id for row in deleted if row.kind == DeletedRecord.EXPENSE],
+            "incomes": [row.record_id for row in deleted if row.kind == DeletedRecord.INCOME],
+        },
+    }
@@ -0,0 +1,44 @@
+"""
+Lápidas (`deleted_records`) de ingresos y gastos borrados.
+
+Se escriben en la misma transacción que el DELETE mediante un evento del mapper
+y se conservan SYNC_TOMBSTONE_RETENTION_DAYS días; un cliente con un token de
+sincronización más antiguo recibe una copia completa.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import event, text
+from app.config import settings
+from app.models.deleted_record import DeletedRecord
+from app.models.expense import Expense
+from app.models.income import Income
+
+
+def _write_tombstone(mapper, connection, target):
+    connection.execute(
+        text("""
+            INSERT INTO deleted_records (user_id, kind, record_id, deleted_at)
+            VALUES (:user_id, :kind, :record_id, :now)
+        """),
+        {
+            "user_id": target.user_id,
+            "kind": DeletedRecord.INCOME if isinstance(target, Income) else DeletedRecord.EXPENSE,
+            "record_id": target.id,
+            "now": datetime.utcnow(),
+        },
+    )
+
+
+for _model in (Expense, Income):
+    event.listen(_model, "after_delete", _write_tombstone)
+
+
+def retention_start() -> datetime:
+    """Lápidas anteriores a esta fecha pueden haberse purgado."""
+    return datetime.utcnow() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def purge(connection) -> int:
+    result = connection.execute(
+        text("DELETE FROM deleted_records WHERE deleted_at < :limit"), {"limit": retention_start()}
+    )
+    return result.rowcount
@@ -0,0 +1,133 @@
+"""
+Tendencias y proyecciones vectorizadas sobre los totales diarios de un usuario.
+
+Todo se calcula con operaciones de NumPy sobre arreglos densos (un elemento por
+día o por mes); no hay bucles por fila en Python.
+"""
+import calendar
+from datetime import date
+import numpy as np
+
+# Ventanas de las medias móviles
+DAILY_WINDOWS = (7, 30)
+MONTHLY_WINDOW = 3
+# Días recientes usados para el ritmo de gasto de la proyección
+RUN_RATE_DAYS = 30
+# Umbral del z-score robusto (mediana/MAD) para marcar un día como atípico
+ANOMALY_THRESHOLD = 3.5
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Media móvil por sumas acumuladas; las primeras ventanas son parciales."""
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - window, 0)
+    return (csum[end] - csum[start]) / (end - start)
+
+
+def pct_change(values: np.ndarray) -> np.ndarray:
+    """Variación porcentual respecto al elemento anterior (NaN si el anterior es 0)."""
+    out = np.full(len(values), np.nan)
+    if len(values) > 1:
+        previous = values[:-1]
+        np.divide(np.diff(values) * 100, previous, out=out[1:], where=previous != 0)
+    return out
+
+
+def robust_zscores(values: np.ndarray) -> np.ndarray:
+    """z-score robusto: 0.6745 * (x - mediana) / MAD."""
+    if not len(values):
+        return values
+    median = np.median(values)
+    mad = np.median(np.abs(values - median))
+    if mad == 0:
+        mad = np.mean(np.abs(values - median)) or 1.0
+    return 0.6745 * (values - median) / mad
+
+
+def dense_daily(days: np.ndarray, income: np.ndarray, expense: np.ndarray, until: date):
+    """Convierte filas dispersas (día, ingreso, gasto) en arreglos diarios contiguos hasta `until`."""
+    until = np.datetime64(until, "D")
+    first = min(days.min(), until) if len(days) else until
+    last = max(days.max(), until) if len(days) else until
+    calendar_days = np.arange(first, last + 1, dtype="datetime64[D]")
+    position = (days - first).astype(np.int64)
+    daily_income = np.zeros(len(calendar_days))
+    daily_expense = np.zeros(len(calendar_days))
+    daily_income[position] = income
+    daily_expense[position] = expense
+    return calendar_days, daily_income, daily_expense
+
+
+def monthly_totals(calendar_days: np.ndarray, daily_income: np.ndarray, daily_expense: np.ndarray):
+    """Agrupa los arreglos diarios por mes (índice = meses desde 1970-01)."""
+    months = calendar_days.astype("datetime64[M]").astype(np.int64)
+    offset = months - months[0]
+    size = offset[-1] + 1
+    month_index = months[0] + np.arange(size)
+    return (
+        month_index,
+        np.bincount(offset, weights=daily_income, minlength=size),
+        np.bincount(offset, weights=daily_expense, minlength=size),
+    )
+
+
+def _clean(values: np.ndarray) -> list:
+    rounded = np.round(values, 2)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+
+def build_trends(days: np.ndarray, income: np.ndarray, expense: np.ndarray, today: date, recent_days: int) -> dict:
+    calendar_days, daily_income, daily_expense = dense_daily(days, income, expense, today)
+    month_index, month_income, month_expense = monthly_totals(calendar_days, daily_income, daily_expense)
+    month_net = month_income - month_expense
+
+    # Proyección del gasto a fin de mes con el ritmo de los últimos RUN_RATE_DAYS días
+    today_pos = int((np.datetime64(today, "D") - calendar_days[0]).astype(np.int64))
+    month_first_pos = today_pos - (today.day - 1)
+    spent_to_date = daily_expense[max(month_first_pos, 0):today_pos + 1].sum()
+    run_rate = daily_expense[max(today_pos + 1 - RUN_RATE_DAYS, 0):today_pos + 1].mean()
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    remaining_days = days_in_month - today.day
+    previous_pos = ((today.year - 1970) * 12 + today.month - 2) - int(month_index[0])
+    previous_month_expense = month_expense[previous_pos] if previous_pos >= 0 else 0.0
+
+    # Días con gasto atípico (solo se evalúan los días con gasto)
+    spending = daily_expense > 0
+    scores = np.zeros(len(daily_expense))
+    scores[spending] = robust_zscores(daily_expense[spending])
+    flagged = np.flatnonzero(scores > ANOMALY_THRESHOLD)
+
+    recent = slice(max(len(calendar_days) - recent_days, 0), None)
+    return {
+        "monthly": {
+            "months": np.datetime_as_string(month_index.astype("datetime64[M]")).tolist(),
+            "income": _clean(month_income),
+            "expense": _clean(month_expense),
+            "net": _clean(month_net),
+            "expenseRollingAvg": _clean(rolling_mean(month_expense, MONTHLY_WINDOW)),
+            "incomeRollingAvg": _clean(rolling_mean(month_income, MONTHLY_WINDOW)),
+            "expenseMoMDelta": _clean(np.concatenate(([np.nan], np.diff(month_expense)))),
+            "expenseMoMPercent": _clean(pct_change(month_expense)),
+            "netMoMDelta": _clean(np.concatenate(([np.nan], np.diff(month_net)))),
+        },
+        "daily": {
+            "days": np.datetime_as_string(calendar_days[recent]).tolist(),
+            "expense": _clean(daily_expense[recent]),
+            **{
+                f"expenseRollingAvg{window}d": _clean(rolling_mean(daily_expense, window)[recent])
+                for window in DAILY_WINDOWS
+            },
+        },
+        "projection": {
+            "month": f"{today.year:04d}-{today.month:02d}",
+            "spentToDate": round(float(spent_to_date), 2),
+            "dailyRunRate": round(float(run_rate), 2),
+            "projectedMonthEnd": round(float(spent_to_date + run_rate * remaining_days), 2),
+            "previousMonth": round(float(previous_month_expense), 2),
+        },
+        "anomalies": [
+            {"date": str(d), "expense": round(float(amount), 2), "score": round(float(score), 2)}
+            for d, amount, score in zip(calendar_days[flagged], daily_expense[flagged], scores[flagged])
+        ],
+    }
@@ -0,0 +1,81 @@
+"""
+Registro de trabajos y encolado en la tabla `jobs`.
+
+Un trabajo es una función registrada con `@job(nombre)` que recibe el payload
+como argumentos con nombre. `enqueue` inserta la fila; si se le pasa la conexión
+o sesión de la petición, el trabajo solo existe si esa transacción confirma.
+"""
+import json
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+from sqlalchemy import text
+from app.database.database import engine
+from app.models.job import Job  # noqa: F401  (tabla en los metadatos)
+
+
+@dataclass
+class JobSpec:
+    name: str
+    func: Callable
+    max_attempts: int = 3
+    # Ejecuciones simultáneas máximas de este trabajo por proceso runner
+    concurrency: int = 1
+    # Segundos base del backoff exponencial entre reintentos
+    retry_backoff: float = 5
+
+
+@dataclass
+class PeriodicSpec:
+    name: str
+    every: float
+    payload: dict
+
+
+registry: dict[str, JobSpec] = {}
+periodic_jobs: list[PeriodicSpec] = []
+# Id en `jobs` del trabajo que ejecuta el hilo actual del runner
+current_job_id: ContextVar[int | None] = ContextVar("current_job_id", default=None)
+
+
+def job(name: str, max_attempts: int = 3, concurrency: int = 1, retry_backoff: float = 5):
+    """Registra la función decorada como el trabajo `name`."""
+    def decorator(func):
+        registry[name] = JobSpec(name, func, max_attempts, concurrency, retry_backoff)
+        return func
+    return decorator
+
+
+def periodic(name: str, every: float, payload: dict | None = None) -> None:
+    """Programa el trabajo `name` cada `every` segundos (una vez por ventana entre todos los runners)."""
+    periodic_jobs.append(PeriodicSpec(name, every, payload or {}))
+
+
+_INSERT_SQL = text("""
+    INSERT INTO jobs (name, payload, status, attempts, max_attempts, dedupe_key, run_at, created_at)
+    VALUES (:name, CAST(:payload AS JSON), 'queued', 0, :max_attempts, :dedupe_key, :run_at, :now)
+    ON CONFLICT (dedupe_key) DO NOTHING
+""")
+
+
+def enqueue(name: str, payload: dict | None = None, *, delay: float = 0, dedupe_key: str | None = None, bind=None) -> None:
+    """
+    Encola `name`. `bind` puede ser una Session o Connection para hacerlo dentro de
+    su transacción; si se omite se usa una transacción propia.
+    """
+    spec = registry.get(name)
+    now = datetime.utcnow()
+    params = {
+        "name": name,
+        "payload": json.dumps(payload or {}),
+        "max_attempts": spec.max_attempts if spec else 3,
+        "dedupe_key": dedupe_key,
+        "run_at": now + timedelta(seconds=delay),
+        "now": now,
+    }
+    if bind is not None:
+        bind.execute(_INSERT_SQL, params)
+        return
+    with engine.begin() as conn:
+        conn.execute(_INSERT_SQL, params)
@@ -0,0 +1,248 @@
+"""
+Runner de la cola `jobs`: hilos que reclaman trabajos con FOR UPDATE SKIP LOCKED,
+los ejecutan con reintentos y backoff exponencial, y un programador que encola
+los trabajos periódicos.
+
+Con JOBS_MODE=inprocess arranca dentro de la API; con JOBS_MODE=external la API
+solo encola y los trabajos los ejecuta un proceso aparte. Con varios shards cada
+uno tiene su tabla `jobs` (los trabajos se encolan en la transacción del
+usuario) y el runner las recorre por turnos; los periódicos van al shard 0.
+
+    python -m app.jobs.runner [--threads 4]
+"""
+import argparse
+import itertools
+import json
+import logging
+import signal
+import threading
+import time
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.config import settings
+from app.database.database import shard_map
+from app.jobs import tasks  # noqa: F401  (registra los trabajos)
+from app.jobs.queue import current_job_id, enqueue, periodic_jobs, registry
+
+logger = logging.getLogger(__name__)
+
+# Trabajos en 'running' más tiempo que esto se consideran huérfanos: se reencolan si les quedan intentos
+STALE_AFTER_SECONDS = 600
+# Cada cuánto se revisan periódicos y huérfanos
+SCHEDULER_TICK_SECONDS = 5
+
+_CLAIM_SQL = text("""
+    UPDATE jobs SET status = 'running', started_at = :now, attempts = attempts + 1
+    WHERE id = (
+        SELECT id FROM jobs
+        WHERE status = 'queued' AND run_at <= :now AND name = ANY(:names)
+        ORDER BY run_at, id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, name, payload, attempts, max_attempts, run_at
+""")
+# Cada reclamación ya cuenta como intento: un huérfano sin intentos restantes falla
+_REQUEUE_STALE_SQL = text("""
+    UPDATE jobs SET
+        status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+        finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE :now END,
+        last_error = 'Sin terminar tras ' || :stale_after || ' s (runner caído o colgado)'
+    WHERE status = 'running' AND started_at < :limit
+    RETURNING id, name, status
+""")
+
+
+class JobRunner:
+    def __init__(self, binds: list, threads: int, poll_interval: float):
+        self.binds = binds
+        self._turn = itertools.count()
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._workers: list[threading.Thread] = []
+        self._running: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._metrics: dict[str, dict] = defaultdict(lambda: {
+            "succeeded": 0,
+            "retried": 0,
+            "failed": 0,
+            "queueLatencyTotal": 0.0,
+            "queueLatencyMax": 0.0,
+            "durationTotal": 0.0,
+            "durationMax": 0.0,
+        })
+
+    def _claimable(self) -> list[str]:
+        with self._lock:
+            return [name for name, spec in registry.items() if self._running[name] < spec.concurrency]
+
+    def _claim(self):
+        """Primer trabajo disponible empezando por el shard al que le toca; (bind, fila) o None."""
+        names = self._claimable()
+        if not names:
+            return None
+        start = next(self._turn)
+        for i in range(len(self.binds)):
+            bind = self.binds[(start + i) % len(self.binds)]
+            with bind.begin() as conn:
+                claimed = conn.execute(_CLAIM_SQL, {"now": datetime.utcnow(), "names": names}).mappings().first()
+            if claimed is not None:
+                return bind, claimed
+        return None
+
+    def _finish(self, bind, job_id: int, status: str, error: str | None = None, retry_in: float | None = None) -> None:
+        # Solo si sigue en 'running': un trabajo cancelado mientras corría se queda cancelado
+        now = datetime.utcnow()
+        with bind.begin() as conn:
+            if retry_in is not None:
+                conn.execute(
+                    text("UPDATE jobs SET status = 'queued', run_at = :run_at, last_error = :error "
+                         "WHERE id = :id AND status = 'running'"),
+                    {"id": job_id, "run_at": now + timedelta(seconds=retry_in), "error": error},
+                )
+            else:
+                conn.execute(
+                    text("UPDATE jobs SET status = :status, finished_at = :now, last_error = :error "
+                         "WHERE id = :id AND status = 'running'"),
+                    {"id": job_id, "status": status, "now": now, "error": error},
+                )
+
+    def run_one(self) -> bool:
+        """Reclama y ejecuta un trabajo; devuelve False si no había ninguno disponible."""
+        found = self._claim()
+        if found is None:
+            return False
+        bind, claimed = found
+        name = claimed["name"]
+        spec = registry[name]
+        payload = claimed["payload"]
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        with self._lock:
+            self._running[name] += 1
+        started = time.perf_counter()
+        latency = max((datetime.utcnow() - claimed["run_at"]).total_seconds(), 0)
+        outcome = "succeeded"
+        token = current_job_id.set(claimed["id"])
+        try:
+            spec.func(**payload)
+            self._finish(bind, claimed["id"], "done")
+        except Exception:
+            error = traceback.format_exc(limit=5)
+            if claimed["attempts"] < claimed["max_attempts"]:
+                outcome = "retried"
+                self._finish(bind, claimed["id"], "queued", error, retry_in=spec.retry_backoff * 2 ** (claimed["attempts"] - 1))
+            else:
+                outcome = "failed"
+                logger.error("Trabajo %s (%s) agotó sus reintentos:\n%s", claimed["id"], name, error)
+                self._finish(bind, claimed["id"], "failed", error)
+        finally:
+            current_job_id.reset(token)
+            duration = time.perf_counter() - started
+            with self._lock:
+                self._running[name] -= 1
+                metrics = self._metrics[name]
+                metrics[outcome] += 1
+                metrics["queueLatencyTotal"] += latency
+                metrics["queueLatencyMax"] = max(metrics["queueLatencyMax"], latency)
+                metrics["durationTotal"] += duration
+                metrics["durationMax"] = max(metrics["durationMax"], duration)
+        return True
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if not self.run_one():
+                    self._stop.wait(self.poll_interval)
+            except Exception:
+                logger.exception("Error en el runner de trabajos")
+                self._stop.wait(self.poll_interval)
+
+    def schedule(self) -> None:
+        """Encola los periódicos de la ventana actual y reencola los trabajos huérfanos."""
+        now = time.time()
+        for spec in periodic_jobs:
+            window = int(now // spec.every)
+            enqueue(spec.name, spec.payload, dedupe_key=f"periodic:{spec.name}:{window}")
+        now = datetime.utcnow()
+        for bind in self.binds:
+            with bind.begin() as conn:
+                stale = conn.execute(_REQUEUE_STALE_SQL, {
+                    "now": now,
+                    "stale_after": STALE_AFTER_SECONDS,
+                    "limit": now - timedelta(seconds=STALE_AFTER_SECONDS),
+                }).all()
+            for job_id, name, status in stale:
+                if status == "failed":
+                    logger.error("Trabajo %s (%s) huérfano sin reintentos restantes", job_id, name)
+                else:
+                    logger.warning("Trabajo %s (%s) huérfano, reencolado", job_id, name)
+
+    def _schedule_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.schedule()
+            except Exception:
+                logger.exception("Error programando trabajos periódicos")
+            self._stop.wait(SCHEDULER_TICK_SECONDS)
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._stop.clear()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            for i in range(self.threads)
+        ]
+        self._workers.append(threading.Thread(target=self._schedule_loop, name="job-scheduler", daemon=True))
+        for thread in self._workers:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._workers:
+            thread.join(timeout=30)
+        self._workers = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = {}
+            for name, m in self._metrics.items():
+                runs = m["succeeded"] + m["retried"] + m["failed"]
+                jobs[name] = {
+                    "succeeded": m["succeeded"],
+                    "retried": m["retried"],
+                    "failed": m["failed"],
+                    "running": self._running[name],
+                    "avgQueueLatency": round(m["queueLatencyTotal"] / runs, 3) if runs else None,
+                    "maxQueueLatency": round(m["queueLatencyMax"], 3),
+                    "avgDuration": round(m["durationTotal"] / runs, 3) if runs else None,
+                    "maxDuration": round(m["durationMax"], 3),
+                }
+            return {"mode": settings.JOBS_MODE, "threads": self.threads, "jobs": jobs}
+
+
+job_runner = JobRunner(shard_map.engines, threads=settings.JOBS_WORKER_THREADS, poll_interval=settings.JOBS_POLL_INTERVAL)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Runner de la cola de trabajos")
+    parser.add_argument("--threads", type=int, default=settings.JOBS_WORKER_THREADS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    runner = JobRunner(shard_map.engines, threads=args.threads, poll_interval=settings.JOBS_POLL_INTERVAL)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    runner.start()
+    logger.info("Runner de trabajos iniciado con %s hilos", args.threads)
+    stopped.wait()
+    runner.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Trabajos registrados en la cola y su programación periódica. Los de
+mantenimiento recorren todos los shards.
+"""
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.admin import analytics
+from app.config import settings
+from app.database.database import shard_map
+from app.database.partitions import ensure_future_partitions
+from app.finance import checkpoints, tombstones
+from app.jobs.queue import current_job_id, job, periodic
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+
+@job("checkpoints.apply_delta", max_attempts=5, concurrency=4)
+def apply_checkpoint_delta(user_id: int, when: str, income_delta: float = 0, expense_delta: float = 0) -> None:
+    """Delta de checkpoints diferido (CHECKPOINTS_ASYNC); los deltas conmutan, el orden no importa."""
+    with shard_map.engines_for(user_id)[0].begin() as conn:
+        # Con los mismos bloqueos que rebuild: si lo canceló, su efecto ya está en los checkpoints
+        checkpoints.lock_for_delta(conn, user_id)
+        status = conn.execute(
+            text("SELECT status FROM jobs WHERE id = :id"), {"id": current_job_id.get()}
+        ).scalar()
+        if status != "running":
+            return
+        checkpoints.apply_delta(conn, user_id, datetime.fromisoformat(when), income_delta, expense_delta)
+
+
+@job("checkpoints.verify", max_attempts=2)
+def verify_checkpoints() -> None:
+    """Reconstruye los checkpoints de los usuarios con deriva."""
+    for engine in shard_map.engines:
+        with engine.begin() as conn:
+            users = sorted({row["user_id"] for row in checkpoints.verify(conn)})
+            for user_id in users:
+                checkpoints.rebuild(conn, user_id)
+        if users:
+            logger.warning("Checkpoints reconstruidos por deriva para %s usuarios", len(users))
+
+
+@job("admin.analytics", max_attempts=2)
+def refresh_platform_analytics() -> None:
+    """Recalcula el resultado compartido de /admin/analytics."""
+    analytics.refresh_snapshot()
+
+
+@job("partitions.ensure", max_attempts=3)
+def ensure_partitions() -> None:
+    for engine in shard_map.engines:
+        with engine.begin() as conn:
+            ensure_future_partitions(conn)
+
+
+@job("jobs.cleanup")
+def cleanup_jobs() -> None:
+    """Borra los trabajos terminados con más de JOBS_RETENTION_DAYS días."""
+    for engine in shard_map.engines:
+        with engine.begin() as conn:
+            conn.execute(
+                text("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < :limit"),
+                {"limit": datetime.utcnow() - timedelta(days=settings.JOBS_RETENTION_DAYS)},
+            )
+
+
+@job("sync.purge_tombstones")
+def purge_tombstones() -> None:
+    for engine in shard_map.engines:
+        with engine.begin() as conn:
+            tombstones.purge(conn)
+
+
+@job("idempotency.purge")
+def purge_idempotency_keys() -> None:
+    for engine in shard_map.engines:
+        with engine.begin() as conn:
+            conn.execute(
+                text("DELETE FROM idempotency_keys WHERE created_at < :limit"),
+                {"limit": datetime.utcnow() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)},
+            )
+
+
+periodic("checkpoints.verify", every=DAY)
+periodic("partitions.ensure", every=DAY)
+periodic("admin.analytics", every=settings.ADMIN_ANALYTICS_TTL)
+periodic("jobs.cleanup", every=DAY)
+periodic("sync.purge_tombstones", every=DAY)
+periodic("idempotency.purge", every=60 * 60)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, Float, Date, ForeignKey
+from app.database.database import Base
+
+class BalanceCheckpoint(Base):
+    """Totales mensuales por usuario y acumulados hasta el cierre de cada mes."""
+    __tablename__ = "balance_checkpoints"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(Date, primary_key=True)  # primer día del mes
+    income_total = Column(Float, nullable=False, default=0)
+    expense_total = Column(Float, nullable=False, default=0)
+    cumulative_income = Column(Float, nullable=False, default=0)
+    cumulative_expense = Column(Float, nullable=False, default=0)
+
+    @property
+    def closing_balance(self):
+        return self.cumulative_income - self.cumulative_expense
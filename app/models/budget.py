@@ -0,0 +1,27 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, Float, Date, DateTime, ForeignKey, UniqueConstraint
+from app.database.database import Base
+
+class Budget(Base):
+    """Presupuesto mensual de un usuario para una categoría de gasto."""
+    __tablename__ = "budgets"
+    __table_args__ = (UniqueConstraint("user_id", "category_id", name="uq_budgets_user_id_category_id"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("labels.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    # Porcentaje del presupuesto a partir del cual se avisa
+    alert_percent = Column(Integer, nullable=False, default=80)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class SpendingCounter(Base):
+    """Gasto acumulado por usuario, mes y categoría, mantenido en cada escritura de `expenses`."""
+    __tablename__ = "spending_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(Date, primary_key=True)  # primer día del mes
+    category_id = Column(Integer, ForeignKey("labels.id"), primary_key=True)
+    spent = Column(Float, nullable=False, default=0)
@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, ForeignKey, Index
+from app.database.database import Base
+
+class DeletedRecord(Base):
+    """Lápida de un ingreso o gasto borrado, para que /finance/sync propague la baja."""
+    __tablename__ = "deleted_records"
+    __table_args__ = (Index("ix_deleted_records_user_id_deleted_at", "user_id", "deleted_at"),)
+
+    EXPENSE = "expense"
+    INCOME = "income"
+
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(20), nullable=False)
+    record_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,28 +1,40 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, event
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, event
 from sqlalchemy.orm import relationship
-from app.database.database import Base
+from app.models.label import Label
+from app.models.transaction import Transaction
+from app.utils.label_cache import label_cache
+from app.utils.fingerprint import fingerprint, EXPENSE
 
-class Expense(Base):
-    __tablename__ = "expenses"
+class Expense(Transaction):
+    """Gasto: fila de `transactions` con kind = 'expense' (vista `expenses`)."""
+    __mapper_args__ = {"polymorphic_identity": Transaction.EXPENSE}
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  
-    amount = Column(Float, nullable=False)  
-    payment_method = Column(String, nullable=False)  
-    category = Column(String, nullable=False)  
-    description = Column(String, nullable=True) 
-    date = Column(DateTime, default=datetime.utcnow, nullable=False)  
-    month = Column(String, nullable=False) 
-    user = relationship("User", back_populates="expenses")  
+    # Columnas propias, nulas en los ingresos (NOT NULL en la vista por CHECK en la migración)
+    payment_method = Column(String, nullable=True)
+    category = Column(String, nullable=True)
+    # Ids en `labels` de category y payment_method; las agregaciones agrupan por ellos
+    category_id = Column(Integer, ForeignKey("labels.id"), nullable=True)
+    payment_method_id = Column(Integer, ForeignKey("labels.id"), nullable=True)
+    description = Column(String, nullable=True)
+    user = relationship("User", back_populates="expenses")
 
-    @property
-    def computed_month(self):
-        """Propiedad computada para obtener el mes basado en la fecha."""
-        return self.date.strftime("%B")
+Index("ix_transactions_user_id_category_id", Expense.user_id, Expense.category_id)
 
 @event.listens_for(Expense, "before_insert")
 @event.listens_for(Expense, "before_update")
 def set_month(mapper, connection, target):
     """Calcula y asigna el valor del campo 'month' antes de guardar en la base de datos."""
-    target.month = target.date.strftime("%B")
\ No newline at end of file
+    target.month = target.date.strftime("%B")
+
+@event.listens_for(Expense, "before_insert")
+@event.listens_for(Expense, "before_update")
+def set_label_ids(mapper, connection, target):
+    """Mantiene category_id y payment_method_id sincronizados con los nombres."""
+    target.category_id = label_cache.resolve(connection, target.user_id, Label.CATEGORY, target.category)
+    target.payment_method_id = label_cache.resolve(connection, target.user_id, Label.PAYMENT_METHOD, target.payment_method)
+
+@event.listens_for(Expense, "before_insert")
+@event.listens_for(Expense, "before_update")
+def set_fingerprint(mapper, connection, target):
+    """Recalcula la huella de contenido usada para detectar duplicados."""
+    target.fingerprint = fingerprint(EXPENSE, target.user_id, target.date, target.amount, target.currency, target.description)
@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Float, Date, DateTime, Boolean
+from app.database.database import Base
+
+class FxRate(Base):
+    """
+    Valor de una unidad de `currency` en la moneda de referencia del fichero
+    importado, por día. La referencia se cancela al convertir: X de A a B es
+    X * rate(A) / rate(B).
+    """
+    __tablename__ = "fx_rates"
+
+    # (currency, date) sirve a la vez para el join exacto y para la búsqueda "último antes de"
+    currency = Column(String(3), primary_key=True)
+    date = Column(Date, primary_key=True)
+    rate = Column(Float, nullable=False)
+    # Día sin cotización, relleno con la anterior al importar (se recalcula en cada importación)
+    filled = Column(Boolean, nullable=False, default=False)
+    imported_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,29 +1,39 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, event, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, event, Boolean
 from sqlalchemy.orm import relationship
-from app.database.database import Base
+from app.models.label import Label
+from app.models.transaction import Transaction
+from app.utils.label_cache import label_cache
+from app.utils.fingerprint import fingerprint, INCOME
 
-class Income(Base):
-    __tablename__ = "incomes"
+class Income(Transaction):
+    """Ingreso: fila de `transactions` con kind = 'income' (vista `incomes`)."""
+    __mapper_args__ = {"polymorphic_identity": Transaction.INCOME}
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  
-    source = Column(String, nullable=False)  
-    amount = Column(Float, nullable=False)  
-    observations = Column(String, nullable=True)  
-    date = Column(DateTime, default=datetime.utcnow, nullable=False)  
-    month = Column(String, nullable=False)  
+    # Columnas propias, nulas en los gastos (NOT NULL en la vista por CHECK en la migración)
+    source = Column(String, nullable=True)
+    # Id en `labels` de source; las agregaciones agrupan por él
+    source_id = Column(Integer, ForeignKey("labels.id"), nullable=True)
+    observations = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
 
     user = relationship("User", back_populates="incomes")
-    
-    @property
-    def computed_month(self):
-        """Propiedad computada para obtener el mes basado en la fecha."""
-        return self.date.strftime("%B")
+
+Index("ix_transactions_user_id_source_id", Income.user_id, Income.source_id)
 
 @event.listens_for(Income, "before_insert")
 @event.listens_for(Income, "before_update")
 def set_month(mapper, connection, target):
     """Calcula y asigna el valor del campo 'month' antes de guardar en la base de datos."""
-    target.month = target.date.strftime("%B")
\ No newline at end of file
+    target.month = target.date.strftime("%B")
+
+@event.listens_for(Income, "before_insert")
+@event.listens_for(Income, "before_update")
+def set_source_id(mapper, connection, target):
+    """Mantiene source_id sincronizado con el nombre de la fuente."""
+    target.source_id = label_cache.resolve(connection, target.user_id, Label.SOURCE, target.source)
+
+@event.listens_for(Income, "before_insert")
+@event.listens_for(Income, "before_update")
+def set_fingerprint(mapper, connection, target):
+    """Recalcula la huella de contenido usada para detectar duplicados."""
+    target.fingerprint = fingerprint(INCOME, target.user_id, target.date, target.amount, target.currency, target.source)
@@ -0,0 +1,32 @@
+from datetime import datetime
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Text, Index, JSON
+from app.database.database import Base
+
+class Job(Base):
+    """Cola de trabajos en segundo plano (ver app/jobs)."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        Index("uq_jobs_dedupe_key", "dedupe_key", unique=True),
+    )
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    # Descartado antes de terminar (p. ej. un delta de checkpoints tras un rebuild)
+    CANCELLED = "cancelled"
+
+    id = Column(BigInteger, primary_key=True)
+    name = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String(20), nullable=False, default=QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    # Evita encolar dos veces el mismo trabajo (p. ej. un periódico en la misma ventana)
+    dedupe_key = Column(String(255), nullable=True)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from app.database.database import Base
+
+class Label(Base):
+    """Diccionario por usuario de categorías, métodos de pago y fuentes de ingreso."""
+    __tablename__ = "labels"
+    # El autocompletado usa además un índice (user_id, kind, lower(name) text_pattern_ops)
+    # creado en la migración
+    __table_args__ = (UniqueConstraint("user_id", "kind", "name", name="uq_labels_user_id_kind_name"),)
+
+    CATEGORY = "category"
+    PAYMENT_METHOD = "payment_method"
+    SOURCE = "source"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(20), nullable=False)
+    name = Column(String, nullable=False)
+    # Movimientos que la usan y fecha del más reciente (app/finance/autocomplete.py)
+    use_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_used_at = Column(DateTime, nullable=True)
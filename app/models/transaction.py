@@ -0,0 +1,46 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
+from app.database.database import Base
+
+class Transaction(Base):
+    """
+    Libro único de movimientos: ingresos y gastos en una sola tabla, distinguidos por
+    `kind`. `Income` y `Expense` son subclases (herencia de tabla única) y las vistas
+    `incomes`/`expenses` mantienen las consultas SQL escritas contra las tablas antiguas.
+
+    Los ids anteriores a la unificación se conservaron por tipo, así que la clave es
+    (id, kind); los nuevos salen de una única secuencia.
+    """
+    __tablename__ = "transactions"
+    # En Postgres la tabla está particionada por rango de `date` (PK real: id, kind, date)
+    __table_args__ = (
+        # Saldo, neto mensual y pivot de ingresos y gastos en un solo recorrido de este índice
+        Index("ix_transactions_user_id_date", "user_id", "date", postgresql_include=["kind", "amount"]),
+        Index("ix_transactions_user_id_kind_updated_at", "user_id", "kind", "updated_at"),
+        Index("ix_transactions_user_id_fingerprint", "user_id", "fingerprint"),
+        Index("ix_transactions_user_id_currency", "user_id", "currency"),
+        # Los índices de las columnas propias de cada tipo se declaran junto a la subclase
+    )
+
+    INCOME = "income"
+    EXPENSE = "expense"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    kind = Column(String(10), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    # Código ISO 4217 del importe; por defecto, la moneda base del usuario al crear
+    currency = Column(String(3), nullable=False)
+    date = Column(DateTime, default=datetime.utcnow, nullable=False)
+    month = Column(String, nullable=False)
+    # Huella de contenido (app/utils/fingerprint.py) para detectar duplicados
+    fingerprint = Column(String(64), nullable=False)
+    # Marca de la última escritura; base de /finance/sync
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __mapper_args__ = {"polymorphic_on": kind}
+
+    @property
+    def computed_month(self):
+        """Propiedad computada para obtener el mes basado en la fecha."""
+        return self.date.strftime("%B")
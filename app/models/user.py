@@ -1,11 +1,18 @@
 from typing import Optional
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from app.database.database import Base
+from app.config import settings
 
 class User(Base):
     __tablename__ = "users"
+    # Las búsquedas de /admin/users usan además índices sobre lower(username)/lower(email)
+    # con text_pattern_ops (prefijo) y GIN pg_trgm (contiene), creados en la migración
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at"),
+        Index("ix_users_last_login", "last_login"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
@@ -16,6 +23,13 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Versión de los ingresos/gastos del usuario (ETag / Last-Modified de los GET)
+    data_version = Column(BigInteger, default=0, server_default="0", nullable=False)
+    data_changed_at = Column(DateTime, nullable=True)
+    # Último commit con escrituras del usuario (read-your-writes compartido entre workers)
+    written_at = Column(DateTime, nullable=True)
+    # Moneda (ISO 4217) a la que se convierten los informes de /finance/analytics
+    base_currency = Column(String(3), default=settings.DEFAULT_CURRENCY, nullable=False)
    
     incomes = relationship("Income", back_populates="user", cascade="all, delete-orphan")
     expenses = relationship("Expense", back_populates="user", cascade="all, delete-orphan")
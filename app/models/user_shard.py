@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from app.database.database import Base
+
+class UserShard(Base):
+    """
+    Directorio de usuarios: reserva el id y fija el shard de cada usuario. Solo se
+    usa la copia del shard 0; la tabla existe en todos para que el esquema sea igual.
+    """
+    __tablename__ = "user_shards"
+
+    user_id = Column(Integer, primary_key=True)
+    # Únicos entre todos los shards; el login y los tokens antiguos buscan por email
+    email = Column(String, unique=True, nullable=False)
+    username = Column(String, unique=True, nullable=False)
+    shard = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class AutocompleteItem(BaseModel):
+    name: str
+    count: int
+    lastUsed: datetime | None
@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class BudgetRequest(BaseModel):
+    amount: float = Field(gt=0)
+    alert_percent: int = Field(80, ge=1, le=100)
+
+class BudgetResponse(BaseModel):
+    category: str
+    amount: float
+    alert_percent: int
+
+class BudgetStatusItem(BaseModel):
+    category: str
+    budget: float
+    spent: float
+    remaining: float
+    percent: float
+    status: str
+
+class BudgetStatusResponse(BaseModel):
+    month: str
+    items: List[BudgetStatusItem]
+    alerts: List[BudgetStatusItem]
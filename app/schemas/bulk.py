@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import List
+
+class BulkCreateResponse(BaseModel):
+    created: int
+    skipped: int
+    # Posiciones (en la lista enviada) de las filas descartadas por duplicadas
+    duplicates: List[int]
+    ids: List[int]
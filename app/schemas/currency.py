@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class BaseCurrencyRequest(BaseModel):
+    currency: str = Field(pattern="^[A-Z]{3}$")
+
+class CurrencyRange(BaseModel):
+    currency: str
+    # Primer y último día con cotización (YYYY-MM-DD)
+    from_: str = Field(alias="from")
+    to: str
+
+class CurrenciesResponse(BaseModel):
+    base_currency: str
+    available: List[CurrencyRange]
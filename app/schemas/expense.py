@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List
 
@@ -8,16 +8,20 @@ class ExpenseCreateRequest(BaseModel):
     category: str
     description: str | None = None
     date: datetime
+    # ISO 4217; si se omite, la moneda base del usuario
+    currency: str | None = Field(None, pattern="^[A-Z]{3}$")
 
 class ExpenseResponse(BaseModel):
     id: int
     user_id: int
     amount: float
+    currency: str
     payment_method: str
     category: str
     description: str | None
     date: datetime
     month: str
+    updated_at: datetime | None = None
 
     class Config:
         from_attributes = True
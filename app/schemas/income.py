@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List
 
@@ -7,15 +7,19 @@ class IncomeCreateRequest(BaseModel):
     amount: float
     observations: str | None = None
     date: datetime
+    # ISO 4217; si se omite, la moneda base del usuario
+    currency: str | None = Field(None, pattern="^[A-Z]{3}$")
 
 class IncomeResponse(BaseModel):
     id: int
     user_id: int
     source: str
     amount: float
+    currency: str
     observations: str | None
     date: datetime
     month: str
+    updated_at: datetime | None = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import List
+from app.schemas.expense import ExpenseResponse
+from app.schemas.income import IncomeResponse
+
+class SyncDeleted(BaseModel):
+    expenses: List[int]
+    incomes: List[int]
+
+class SyncResponse(BaseModel):
+    token: str
+    full: bool
+    has_more: bool
+    expenses: List[ExpenseResponse]
+    incomes: List[IncomeResponse]
+    deleted: SyncDeleted
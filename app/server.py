@@ -0,0 +1,189 @@
+"""
+Arranque de producción: gunicorn con workers uvicorn y la app precargada.
+
+El maestro importa `main:app` antes de crear los workers (preload_app), así los
+módulos, NumPy y los metadatos de SQLAlchemy se comparten copy-on-write; aplica
+las migraciones y las particiones una sola vez y cierra sus conexiones. Cada
+worker descarta tras el fork los pools heredados y abre los suyos.
+
+    python -m app.server run                 # = gunicorn -c gunicorn.conf.py main:app
+    python -m app.server memory <pid>        # RSS, PSS y memoria privada del maestro y sus workers
+
+Señales (las de gunicorn): HUP recrea los workers de forma ordenada con el código
+ya precargado; para desplegar código nuevo sin cortar, USR2 arranca un maestro
+nuevo y QUIT al anterior lo drena. TERM/QUIT esperan hasta SERVER_GRACEFUL_TIMEOUT
+a que terminen las peticiones en curso (los streams SSE se cortan al vencer).
+
+Los tiempos de arranque (precarga, migraciones, maestro listo y cada worker
+listo desde su fork) y la memoria de cada proceso se escriben en el log de gunicorn.
+
+Con más de un worker, EVENTS_BACKEND=local, RATE_LIMIT_BACKEND=memory y, con
+réplicas, READ_YOUR_WRITES_BACKEND=local dejarían cada worker con su propio bus
+de cambios, sus buckets y sus ventanas read-your-writes (los streams no verían
+las escrituras de otros workers, el límite efectivo se multiplicaría y una
+lectura en otro worker podría ir a una réplica atrasada): el maestro los cambia
+a postgres antes del fork y lo avisa en el log.
+"""
+import argparse
+import math
+import os
+import time
+
+# Referencia de los tiempos de arranque: gunicorn.conf.py importa este módulo lo primero
+STARTED = time.perf_counter()
+_forked_at: float | None = None
+_worker_log = None
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+def available_cores() -> int:
+    """Núcleos utilizables: afinidad del proceso y, en contenedores, la cuota de CPU del cgroup."""
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cores, 1)
+
+
+def worker_count() -> int:
+    # Workers asíncronos: uno por núcleo (la fórmula 2n+1 es para workers síncronos)
+    from app.config import settings
+
+    return settings.SERVER_WORKERS or available_cores()
+
+
+def memory_usage(pid: int | str = "self") -> dict | None:
+    """RSS, PSS y memoria privada en MB desde /proc (Linux); None si no se puede leer."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split()[-1] == "kB"}
+    except (OSError, ValueError, IndexError):
+        return None
+    return {
+        "rssMb": round(fields.get("Rss", 0) / 1024, 1),
+        "pssMb": round(fields.get("Pss", 0) / 1024, 1),
+        "privateMb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+    }
+
+
+def _format_memory(usage: dict | None) -> str:
+    if usage is None:
+        return "memoria no disponible"
+    return f"RSS {usage['rssMb']} MB, PSS {usage['pssMb']} MB, privada {usage['privateMb']} MB"
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # El nombre del proceso va entre paréntesis y puede tener espacios
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def _shared_backends(server, settings) -> None:
+    """Con varios workers, los backends en memoria del proceso pasan a los de Postgres."""
+    if server.num_workers <= 1:
+        return
+    if settings.EVENTS_BACKEND == "local":
+        settings.EVENTS_BACKEND = "postgres"
+        server.log.warning(
+            "EVENTS_BACKEND=local no funciona con %s workers: se usa postgres (LISTEN/NOTIFY)", server.num_workers
+        )
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        settings.RATE_LIMIT_BACKEND = "postgres"
+        server.log.warning(
+            "RATE_LIMIT_BACKEND=memory daría un límite por worker con %s workers: se usa postgres",
+            server.num_workers,
+        )
+    if settings.READ_YOUR_WRITES_BACKEND == "local" and settings.DB_REPLICA_URLS:
+        settings.READ_YOUR_WRITES_BACKEND = "postgres"
+        server.log.warning(
+            "READ_YOUR_WRITES_BACKEND=local no ve las escrituras de otros workers con %s workers: "
+            "se usa postgres (users.written_at)",
+            server.num_workers,
+        )
+
+
+def _dispose_engines(close: bool) -> None:
+    from app.database.database import replica_pool, shard_map
+
+    for engine in [*shard_map.engines, *replica_pool.engines]:
+        engine.dispose(close=close)
+
+
+# Hooks de gunicorn (gunicorn.conf.py)
+
+def on_starting(server) -> None:
+    """En el maestro, con la app ya precargada: esquema una sola vez para todos los workers."""
+    import main
+    from app.config import settings
+
+    server.log.info("App precargada en %.2f s (%s)", time.perf_counter() - STARTED, _format_memory(memory_usage()))
+    started = time.perf_counter()
+    main.prepare_database()
+    settings.MIGRATE_ON_STARTUP = False
+    # Los workers heredan los ajustes del maestro; la app los lee al arrancar y en la primera petición
+    _shared_backends(server, settings)
+    # Ninguna conexión del maestro debe heredarse
+    _dispose_engines(close=True)
+    server.log.info("Migraciones y particiones en %.2f s", time.perf_counter() - started)
+
+
+def when_ready(server) -> None:
+    server.log.info(
+        "Maestro listo en %.2f s con %s workers (%s)",
+        time.perf_counter() - STARTED, server.num_workers, _format_memory(memory_usage()),
+    )
+
+
+def post_fork(server, worker) -> None:
+    global _forked_at, _worker_log
+    _forked_at = time.perf_counter()
+    _worker_log = worker.log
+    # Los pools vienen del maestro: se olvidan sin cerrar sus sockets (compartidos con él)
+    _dispose_engines(close=False)
+
+
+def worker_ready() -> None:
+    """Al final del startup de la app; solo informa en workers creados por este lanzador."""
+    if _forked_at is not None and _worker_log is not None:
+        _worker_log.info(
+            "Worker %s listo en %.2f s desde el fork (%s)",
+            os.getpid(), time.perf_counter() - _forked_at, _format_memory(memory_usage()),
+        )
+
+
+def worker_exit(server, worker) -> None:
+    # Reciclado por max_requests, HUP o parada: memoria al salir para ver su crecimiento
+    server.log.info("Worker %s sale (%s)", worker.pid, _format_memory(memory_usage(worker.pid)))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Servidor de producción")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("run", help="Arranca gunicorn con gunicorn.conf.py")
+    memory_cmd = sub.add_parser("memory", help="Memoria del maestro y de cada worker")
+    memory_cmd.add_argument("pid", type=int, help="PID del maestro de gunicorn")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        os.execvp("gunicorn", ["gunicorn", "-c", CONFIG_FILE, "main:app"])
+    for role, pid in [("maestro", args.pid), *(("worker", child) for child in _children(args.pid))]:
+        print(f"{role}\t{pid}\t{_format_memory(memory_usage(pid))}")
+
+
+if __name__ == "__main__":
+    main()
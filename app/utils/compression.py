@@ -0,0 +1,122 @@
+"""
+Compresión negociada de respuestas (brotli si está instalado, si no gzip).
+
+Solo se comprimen cuerpos de al menos COMPRESSION_MINIMUM_SIZE bytes; los
+streams SSE y las respuestas ya codificadas pasan intactos.
+"""
+import zlib
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+_SKIP_CONTENT_TYPES = (b"text/event-stream",)
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Elige 'br' o 'gzip' según Accept-Encoding y sus pesos q."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda name: weights.get(name, wildcard))
+    return best if weights.get(best, wildcard) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+            self._finish = self._obj.finish
+            self._compress = self._obj.process
+        else:
+            self._obj = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._finish = self._obj.flush
+            self._compress = self._obj.compress
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime respuestas completas o en streaming."""
+
+    def __init__(self, app, minimum_size: int | None = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MINIMUM_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = next((v.decode("latin-1") for k, v in scope.get("headers", []) if k == b"accept-encoding"), "")
+        encoding = negotiate(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                state["passthrough"] = (
+                    message["status"] in (204, 304)
+                    or b"content-encoding" in headers
+                    or headers.get(b"content-type", b"").startswith(_SKIP_CONTENT_TYPES)
+                )
+                if state["passthrough"]:
+                    await send(message)
+                else:
+                    state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                state["start"] = None
+                headers = [(k, v) for k, v in start.get("headers", []) if k not in (b"content-length", b"vary")]
+                vary = [v for k, v in start.get("headers", []) if k == b"vary"]
+                headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+                if not more_body and len(body) < self.minimum_size:
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    state["passthrough"] = True
+                    await send({**start, "headers": headers})
+                    await send(message)
+                    return
+                state["compressor"] = _Compressor(encoding)
+                headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    body = state["compressor"].compress(body) + state["compressor"].finish()
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start, "headers": headers})
+
+            compressor = state["compressor"]
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,46 @@
+"""
+GET condicional: ETag débil y Last-Modified a partir de la versión de los datos.
+
+El ETag combina la versión con la ruta y la query, así cada combinación de
+filtros tiene el suyo; si el cliente envía uno que coincide (o un
+If-Modified-Since no anterior a Last-Modified) se responde 304 sin cuerpo.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+
+
+def _as_utc(value: datetime) -> datetime:
+    value = value.replace(microsecond=0)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def not_modified(request: Request, response: Response, version: str, last_modified: datetime | None = None) -> Response | None:
+    """
+    Añade ETag/Last-Modified a `response` y devuelve una respuesta 304 si el
+    cliente ya tiene esta versión (o None si hay que generar el cuerpo).
+    """
+    digest = hashlib.sha1(f"{version}|{request.url.path}|{request.url.query}".encode()).hexdigest()[:24]
+    etag = f'W/"{digest}"'
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if last_modified is not None:
+        last_modified = _as_utc(last_modified)
+        response.headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        fresh = "*" in tags or etag.removeprefix("W/") in tags
+    elif last_modified is not None and "if-modified-since" in request.headers:
+        try:
+            fresh = last_modified <= _as_utc(parsedate_to_datetime(request.headers["if-modified-since"]))
+        except (TypeError, ValueError):
+            fresh = False
+    else:
+        fresh = False
+
+    if fresh:
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
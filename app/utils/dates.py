@@ -0,0 +1,17 @@
+from datetime import datetime, timedelta
+
+
+def year_range(year: int) -> tuple[datetime, datetime]:
+    """Rango semiabierto [inicio, fin) del año; permite el pruning de particiones por fecha."""
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def month_range(year: int, month: int) -> tuple[datetime, datetime]:
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def day_range(year: int, month: int, day: int) -> tuple[datetime, datetime]:
+    start = datetime(year, month, day)
+    return start, start + timedelta(days=1)
@@ -1,5 +1,5 @@
 from fastapi import Depends, HTTPException
-from app.database.database import SessionLocal
+from app.database.database import SessionLocal, ReadSessionLocal, shard_map
 from app.models.user import User
 from app.auth.jwt_handler import decode_access_token
 from fastapi.security import OAuth2PasswordBearer
@@ -19,9 +19,24 @@ def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
         user_email = payload.get("sub")
         if not user_email:
             raise HTTPException(status_code=401, detail="Invalid token")
+        # Los tokens llevan el id (`uid`); los emitidos antes de los shards se resuelven por email
+        user_id = payload.get("uid")
+        if user_id is None and shard_map.count > 1:
+            located = shard_map.locate(user_email)
+            user_id = located[0] if located else None
+        if user_id is not None:
+            db.info["shard"] = shard_map.shard_for(user_id)
         user = db.query(User).filter(User.email == user_email).first()
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
+        db.info["user_id"] = user.id
         return user
     except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+def get_read_db(current_user: User = Depends(get_current_user)):
+    db = ReadSessionLocal(current_user.id, written_at=current_user.written_at)
+    try:
+        yield db
+    finally:
+        db.close()
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""
+Huella de contenido de ingresos y gastos para detectar duplicados.
+
+La huella es sha256 de "tipo|user_id|día|céntimos|moneda|texto normalizado"
+(descripción en gastos, fuente en ingresos): 100 USD y 100 EUR el mismo día no
+son duplicados. FINGERPRINT_SQL calcula lo mismo en Postgres y
+la usan la migración y el escaneo de duplicados; ambas versiones deben coincidir.
+"""
+import hashlib
+
+EXPENSE = "expense"
+INCOME = "income"
+
+
+def normalize(value: str | None) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def fingerprint(kind: str, user_id: int, when, amount: float, currency: str, text: str | None) -> str:
+    raw = f"{kind}|{user_id}|{when:%Y-%m-%d}|{round(float(amount) * 100)}|{currency}|{normalize(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# Equivalente SQL; {kind} es un literal y {text} la columna de texto
+FINGERPRINT_SQL = """
+    encode(sha256(convert_to(concat_ws('|',
+        '{kind}', user_id, to_char(date, 'YYYY-MM-DD'), CAST(round(CAST(amount AS DOUBLE PRECISION) * 100) AS BIGINT),
+        currency, lower(btrim(regexp_replace(COALESCE({text}, ''), '\\s+', ' ', 'g')))
+    ), 'UTF8')), 'hex')
+"""
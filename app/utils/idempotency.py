@@ -0,0 +1,51 @@
+"""
+Cabecera Idempotency-Key en las creaciones.
+
+La primera petición con una clave guarda su respuesta en `idempotency_keys` en la
+misma transacción que lo que crea; las repeticiones devuelven esa respuesta sin
+volver a crear nada. Si dos llegan a la vez, la segunda choca con la clave
+primaria al confirmar y devuelve la respuesta de la primera.
+"""
+import hashlib
+import json
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from app.models.idempotency_key import IdempotencyKey
+
+
+def _hash(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def replay(db, user_id: int, key: str | None, payload):
+    """Respuesta guardada para `key`, o None si la clave es nueva (o no se envió)."""
+    if not key:
+        return None
+    stored = db.get(IdempotencyKey, (user_id, key))
+    if stored is None:
+        return None
+    if stored.request_hash != _hash(payload):
+        raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+    return stored.response
+
+
+def remember(db, user_id: int, key: str | None, payload, response) -> None:
+    """Añade a la sesión la respuesta de `key`; se confirma junto con la creación."""
+    if key:
+        db.add(IdempotencyKey(user_id=user_id, key=key, request_hash=_hash(payload), response=response))
+
+
+def commit(db, user_id: int, key: str | None, payload):
+    """
+    Confirma la sesión. Si otra petición con la misma clave confirmó antes,
+    deshace esta y devuelve la respuesta guardada; si no, devuelve None.
+    """
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        stored = replay(db, user_id, key, payload)
+        if stored is None:
+            raise
+        return stored
+    return None
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from app.config import settings
+from app.models.label import Label
+
+
+class LabelCache:
+    """
+    Caché en proceso id <-> nombre de la tabla `labels`.
+
+    Las etiquetas nuevas se insertan en la misma conexión y transacción que la
+    fila que las usa (también dentro del flush), así no se pide una segunda
+    conexión al pool y un rollback deshace también la etiqueta. Hasta el commit
+    sus ids quedan pendientes en `connection.info` y solo entonces pasan a la
+    caché, que nunca apunta a un id que pueda deshacerse.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._ids: OrderedDict[tuple[int, str, str], int] = OrderedDict()
+        self._names: OrderedDict[int, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, user_id: int, kind: str, name: str, label_id: int) -> None:
+        with self._lock:
+            self._ids[(user_id, kind, name)] = label_id
+            self._ids.move_to_end((user_id, kind, name))
+            self._names[label_id] = name
+            self._names.move_to_end(label_id)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+            while len(self._names) > self.max_entries:
+                self._names.popitem(last=False)
+
+    def resolve(self, connection, user_id: int, kind: str, name: str) -> int:
+        """Devuelve el id de la etiqueta, creándola si no existe en la transacción de `connection`."""
+        key = (user_id, kind, name)
+        label_id = self._ids.get(key)
+        if label_id is not None:
+            return label_id
+        pending = connection.info.setdefault("pending_labels", {})
+        label_id = pending.get(key)
+        if label_id is not None:
+            return label_id
+        label_id = connection.execute(
+            insert(Label)
+            .values(user_id=user_id, kind=kind, name=name)
+            .on_conflict_do_nothing(constraint="uq_labels_user_id_kind_name")
+            .returning(Label.id)
+        ).scalar()
+        if label_id is None:
+            label_id = connection.execute(
+                select(Label.id).where(Label.user_id == user_id, Label.kind == kind, Label.name == name)
+            ).scalar_one()
+        pending[key] = label_id
+        return label_id
+
+    def committed(self, connection) -> None:
+        for (user_id, kind, name), label_id in connection.info.pop("pending_labels", {}).items():
+            self._remember(user_id, kind, name, label_id)
+
+    def names(self, db, label_ids) -> dict[int, str]:
+        """Traduce ids a nombres con una sola consulta para los que no están en caché."""
+        result = {}
+        missing = set()
+        for label_id in label_ids:
+            if label_id is None:
+                continue
+            name = self._names.get(label_id)
+            if name is None:
+                missing.add(label_id)
+            else:
+                result[label_id] = name
+        if missing:
+            for label_id, user_id, kind, name in db.execute(
+                select(Label.id, Label.user_id, Label.kind, Label.name).where(Label.id.in_(missing))
+            ):
+                self._remember(user_id, kind, name, label_id)
+                result[label_id] = name
+        return result
+
+
+label_cache = LabelCache(settings.LABEL_CACHE_SIZE)
+
+
+@event.listens_for(Engine, "commit")
+def _labels_committed(conn):
+    if "pending_labels" in conn.info:
+        label_cache.committed(conn)
+
+
+@event.listens_for(Engine, "rollback")
+def _labels_rolled_back(conn):
+    conn.info.pop("pending_labels", None)
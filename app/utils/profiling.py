@@ -0,0 +1,265 @@
+"""
+Perfilado bajo demanda de una petición concreta, solo para administradores.
+
+Con la cabecera `X-Profile: 1` y un token de admin (get_current_admin_user), el
+middleware perfila esa petición: un hilo muestrea las pilas de Python cada
+PROFILE_SAMPLE_INTERVAL segundos y cada conexión que abre la petición recibe
+listeners propios que anotan sus sentencias SQL con su duración. Al terminar se guardan en PROFILE_DIR la traza (JSON) y las
+pilas en formato "folded" (una línea `a;b;c muestras`, lo que leen flamegraph.pl y
+speedscope); la respuesta lleva `X-Profile-Id` para pedirlas a /admin/profiles.
+
+Sin la cabecera no se arranca nada: el middleware solo recorre las cabeceras y las
+sentencias no pasan por ningún listener (solo se mira el perfil al abrir conexión).
+
+Las pilas se quedan con los hilos que ejecutaron SQL de la petición y el del event
+loop, y solo con las que pasan por código de la aplicación; con otras peticiones
+en curso en el mismo worker sus pilas en esos hilos también pueden aparecer.
+"""
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_PATTERN = r"^[0-9T]+-[0-9a-f]+$"
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep
+_current: ContextVar["Profile | None"] = ContextVar("profile", default=None)
+_frame_names: dict = {}
+
+
+def _frame_name(code) -> str:
+    name = _frame_names.get(code)
+    if name is None:
+        path = code.co_filename
+        path = path[len(_ROOT):] if path.startswith(_ROOT) else os.path.basename(path)
+        name = _frame_names.setdefault(code, f"{path}:{code.co_name}")
+    return name
+
+
+def _stack(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _in_app(stack: str) -> bool:
+    return "app/" in stack or "main.py:" in stack
+
+
+class Profile:
+    """Muestras de pila por hilo y sentencias SQL de una petición."""
+
+    def __init__(self, method: str, path: str, user_id: int):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{secrets.token_hex(4)}"
+        self.method = method
+        self.path = path
+        self.user_id = user_id
+        self.status = None
+        self.samples: Counter = Counter()
+        self.queries: list[dict] = []
+        # El hilo del event loop, más los que ejecuten SQL de esta petición
+        self.threads = {threading.get_ident()}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + settings.PROFILE_MAX_SECONDS
+        while not self._stop.wait(settings.PROFILE_SAMPLE_INTERVAL) and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.samples[(ident, _stack(frame))] += 1
+
+    def start(self) -> None:
+        self.started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._started
+
+    def record_query(self, statement: str, started: float, duration: float, rows: int) -> None:
+        # Sin parámetros: pueden llevar datos personales o contraseñas
+        self.threads.add(threading.get_ident())
+        self.queries.append({
+            "statement": " ".join(statement.split()),
+            "startMs": round((started - self._started) * 1000, 3),
+            "durationMs": round(duration * 1000, 3),
+            "rows": rows,
+        })
+
+    def folded(self) -> str:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = Counter()
+        for (ident, stack), count in self.samples.items():
+            if ident in self.threads and _in_app(stack):
+                stacks[f"{names.get(ident, ident)};{stack}"] += count
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def trace(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "userId": self.user_id,
+            "status": self.status,
+            "startedAt": self.started_at.isoformat(),
+            "durationMs": round(self.duration * 1000, 3),
+            "sampleInterval": settings.PROFILE_SAMPLE_INTERVAL,
+            "samples": sum(count for (ident, _), count in self.samples.items() if ident in self.threads),
+            "sqlMs": round(sum(query["durationMs"] for query in self.queries), 3),
+            "queries": self.queries,
+        }
+
+
+@event.listens_for(Engine, "engine_connect")
+def _profile_connection(conn):
+    profile = _current.get()
+    if profile is None:
+        return
+
+    # En la conexión, no en Engine: las sentencias de las demás peticiones no pasan por aquí
+    @event.listens_for(conn, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._profile_started = time.perf_counter()
+
+    @event.listens_for(conn, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profile_started", None)
+        if started is not None:
+            profile.record_query(statement, started, time.perf_counter() - started, cursor.rowcount)
+
+
+def _path(profile_id: str, suffix: str) -> str:
+    return os.path.join(settings.PROFILE_DIR, f"{profile_id}{suffix}")
+
+
+def save(profile: Profile) -> None:
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    with open(_path(profile.id, ".json"), "w") as f:
+        json.dump(profile.trace(), f)
+    with open(_path(profile.id, ".folded"), "w") as f:
+        f.write(profile.folded())
+    # Solo los PROFILE_KEEP más recientes (los ids empiezan por la fecha)
+    traces = sorted(name for name in os.listdir(settings.PROFILE_DIR) if name.endswith(".json"))
+    for name in traces[:-settings.PROFILE_KEEP]:
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(_path(name[:-len(".json")], suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(limit: int) -> list[dict]:
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    traces = sorted((name for name in os.listdir(settings.PROFILE_DIR) if name.endswith(".json")), reverse=True)
+    summaries = []
+    for name in traces[:limit]:
+        trace = load_trace(name[:-len(".json")])
+        if trace is not None:
+            summaries.append({**trace, "queries": len(trace["queries"])})
+    return summaries
+
+
+def load_trace(profile_id: str) -> dict | None:
+    if not re.match(PROFILE_ID_PATTERN, profile_id):
+        return None
+    try:
+        with open(_path(profile_id, ".json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_folded(profile_id: str) -> str | None:
+    if not re.match(PROFILE_ID_PATTERN, profile_id):
+        return None
+    try:
+        with open(_path(profile_id, ".folded")) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _admin_id(token: str) -> int:
+    """Id del admin del token; HTTPException (401/403) si no lo es."""
+    from app.admin.routes import get_current_admin_user
+    from app.database.database import SessionLocal
+    from app.utils.dependencies import get_current_user
+
+    db = SessionLocal()
+    try:
+        return get_current_admin_user(get_current_user(token, db)).id
+    finally:
+        db.close()
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI: perfila las peticiones de admins que traen `X-Profile: 1`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = scope.get("headers", [])
+        if not any(name == PROFILE_HEADER and value not in (b"", b"0") for name, value in headers):
+            await self.app(scope, receive, send)
+            return
+
+        from fastapi import HTTPException
+
+        authorization = next((value for name, value in headers if name == b"authorization"), b"")
+        if authorization[:7].lower() != b"bearer ":
+            await self._reject(send, 401, "Not authenticated")
+            return
+        try:
+            user_id = await run_in_threadpool(_admin_id, authorization[7:].decode("latin-1"))
+        except HTTPException as exc:
+            await self._reject(send, exc.status_code, exc.detail)
+            return
+
+        profile = Profile(scope["method"], scope["path"], user_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token = _current.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+            _current.reset(token)
+            await run_in_threadpool(save, profile)
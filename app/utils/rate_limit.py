@@ -0,0 +1,208 @@
+"""
+Control de admisión: token buckets por usuario y por IP con coste por endpoint,
+límite global de peticiones concurrentes y statement_timeout por ruta.
+
+El estado de los buckets vive en un backend intercambiable: en memoria (por
+worker) o compartido en PostgreSQL entre todos los workers.
+"""
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, text
+from app.auth.jwt_handler import decode_access_token
+from app.config import settings
+from app.database.database import SessionLocal, engine
+
+# Coste en tokens por prefijo de ruta (el prefijo más largo gana); el resto cuesta 1
+ROUTE_COSTS = {
+    "/auth/login": 10,
+    "/auth/register": 10,
+    "/finance/analytics": 5,
+    "/finance/kpi": 3,
+    "/finance/balance": 2,
+    "/admin/analytics": 10,
+    "/admin/users/export": 10,
+}
+# statement_timeout (ms) por prefijo de ruta; el resto usa STATEMENT_TIMEOUT_MS
+ROUTE_STATEMENT_TIMEOUTS_MS = {
+    "/finance/analytics": 5000,
+    "/finance/kpi": 3000,
+    "/admin/users/export": 60000,
+}
+# Conexiones de larga duración que no ocupan un hueco de concurrencia
+LONG_LIVED_PATHS = ("/finance/analytics/stream",)
+
+statement_timeout_ms: ContextVar[int | None] = ContextVar("statement_timeout_ms", default=None)
+_metrics = {"admitted": 0, "rateLimited": 0, "shed": 0, "inFlight": 0}
+
+
+def admission_stats() -> dict:
+    return dict(_metrics)
+
+
+def _match_prefix(path: str, table: dict):
+    best = None
+    for prefix, value in table.items():
+        if (path == prefix or path.startswith(prefix + "/")) and (best is None or len(prefix) > len(best[0])):
+            best = (prefix, value)
+    return best[1] if best else None
+
+
+def route_cost(path: str) -> int:
+    return _match_prefix(path, ROUTE_COSTS) or 1
+
+
+def route_statement_timeout(path: str) -> int:
+    return _match_prefix(path, ROUTE_STATEMENT_TIMEOUTS_MS) or settings.STATEMENT_TIMEOUT_MS
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _set_statement_timeout(session, transaction, connection):
+    timeout = statement_timeout_ms.get()
+    if timeout and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+class InMemoryBucketBackend:
+    """
+    Token buckets en memoria del worker. Al llegar a MAX_KEYS se descartan los
+    usados hace más tiempo (LRU): inundar con claves nuevas solo expulsa buckets
+    inactivos, no reinicia los de los clientes que están limitados ahora.
+    """
+
+    MAX_KEYS = 100000
+
+    def __init__(self):
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, cost: int, rate: float, capacity: float) -> float:
+        """Descuenta `cost` tokens; devuelve 0 si se admite o los segundos hasta poder hacerlo."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            while len(self._buckets) >= self.MAX_KEYS:
+                self._buckets.popitem(last=False)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / rate
+
+
+class PostgresBucketBackend:
+    """Token buckets compartidos entre workers en la tabla UNLOGGED `rate_limit_buckets`."""
+
+    def __init__(self, bind):
+        self.bind = bind
+
+    def consume(self, key: str, cost: int, rate: float, capacity: float) -> float:
+        params = {"key": key, "cost": cost, "rate": rate, "capacity": capacity}
+        with self.bind.begin() as conn:
+            admitted = conn.execute(text("""
+                INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at)
+                VALUES (:key, :capacity - :cost, clock_timestamp())
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) - :cost,
+                    updated_at = clock_timestamp()
+                WHERE LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) >= :cost
+                RETURNING tokens
+            """), params).first()
+            if admitted is not None:
+                return 0.0
+            tokens = conn.execute(text("""
+                SELECT LEAST(:capacity, tokens + EXTRACT(EPOCH FROM clock_timestamp() - updated_at) * :rate)
+                FROM rate_limit_buckets WHERE key = :key
+            """), params).scalar() or 0
+        return max(cost - float(tokens), 0) / rate
+
+
+class AdmissionControlMiddleware:
+    """
+    Middleware ASGI: aplica los buckets por IP y por usuario (429) y el límite
+    global de concurrencia con espera acotada (503), ambos con Retry-After.
+    """
+
+    def __init__(self, app, backend=None):
+        self.app = app
+        self.backend = backend or (
+            PostgresBucketBackend(engine) if settings.RATE_LIMIT_BACKEND == "postgres" else InMemoryBucketBackend()
+        )
+        self.semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_REQUESTS)
+
+    @staticmethod
+    def _user_key(scope) -> str | None:
+        for name, value in scope.get("headers", []):
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                try:
+                    return decode_access_token(value[7:].decode()).get("sub")
+                except (ValueError, UnicodeDecodeError):
+                    return None
+        return None
+
+    async def _consume(self, key: str, cost: int, rate: float, capacity: float) -> float:
+        if isinstance(self.backend, InMemoryBucketBackend):
+            return self.backend.consume(key, cost, rate, capacity)
+        return await run_in_threadpool(self.backend.consume, key, cost, rate, capacity)
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        cost = route_cost(path)
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        retry_after = await self._consume(
+            f"ip:{client_ip}", cost, settings.RATE_LIMIT_IP_RATE, settings.RATE_LIMIT_IP_BURST
+        )
+        user_key = self._user_key(scope)
+        if not retry_after and user_key:
+            retry_after = await self._consume(
+                f"user:{user_key}", cost, settings.RATE_LIMIT_USER_RATE, settings.RATE_LIMIT_USER_BURST
+            )
+        if retry_after:
+            _metrics["rateLimited"] += 1
+            await self._reject(send, 429, "Too many requests", retry_after)
+            return
+
+        token = statement_timeout_ms.set(route_statement_timeout(path))
+        try:
+            if path.startswith(LONG_LIVED_PATHS):
+                await self.app(scope, receive, send)
+                return
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=settings.QUEUE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                _metrics["shed"] += 1
+                await self._reject(send, 503, "Server busy", settings.QUEUE_TIMEOUT_SECONDS)
+                return
+            _metrics["admitted"] += 1
+            _metrics["inFlight"] += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _metrics["inFlight"] -= 1
+                self.semaphore.release()
+        finally:
+            statement_timeout_ms.reset(token)
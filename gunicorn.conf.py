@@ -0,0 +1,26 @@
+"""
+Configuración de gunicorn para producción (ver app/server.py):
+
+    gunicorn -c gunicorn.conf.py main:app
+"""
+from app import server
+from app.config import settings
+
+bind = settings.SERVER_BIND
+workers = server.worker_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+# La app se importa en el maestro antes del fork y los workers la comparten copy-on-write
+preload_app = True
+
+# Reciclado de workers; el jitter evita que todos se reinicien a la vez
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS_JITTER
+# Espera a las peticiones en curso al parar o recrear workers (TERM, HUP, reciclado)
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT
+timeout = settings.SERVER_TIMEOUT
+keepalive = 5
+
+on_starting = server.on_starting
+when_ready = server.when_ready
+post_fork = server.post_fork
+worker_exit = server.worker_exit
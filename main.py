@@ -1,11 +1,20 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.auth.routes import auth_router
-from app.database.database import database, engine, Base
+from app.database.database import database, shard_map, replica_pool, Base
 from app.models import user  
 import subprocess
 from app.finance.routes import finance_router
 from app.admin.routes import admin_router
+from app.auth.last_login_buffer import last_login_buffer
+from app.database.partitions import ensure_future_partitions
+from app.finance.events import change_listener
+from app.config import settings
+from app.utils.rate_limit import AdmissionControlMiddleware
+from app.utils.compression import CompressionMiddleware
+from app.utils.profiling import ProfilingMiddleware
+from app.jobs.runner import job_runner
+from app import server
 
 app = FastAPI()
 
@@ -16,6 +25,14 @@ origins = [
     "http://localhost:8081",  
 ]
 
+app.add_middleware(CompressionMiddleware)
+
+# Antes que CORS, para que las respuestas 429/503 también lleven sus cabeceras
+app.add_middleware(AdmissionControlMiddleware)
+
+# Por fuera de la admisión y la compresión: el perfil incluye la espera en cola y comprimir
+app.add_middleware(ProfilingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,  
@@ -24,14 +41,34 @@ app.add_middleware(
     allow_headers=["*"],  
 )
 
+def prepare_database():
+    """Migraciones, tablas y particiones futuras en todos los shards."""
+    subprocess.run(["alembic", "upgrade", "head"])
+    for engine in shard_map.engines:
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            ensure_future_partitions(conn)
+
 @app.on_event("startup")
 async def startup():
-    subprocess.run(["alembic", "upgrade", "head"])
+    # Con el lanzador de producción (app/server.py) ya lo hizo el maestro antes del fork
+    if settings.MIGRATE_ON_STARTUP:
+        prepare_database()
     await database.connect()
-    Base.metadata.create_all(bind=engine)
+    last_login_buffer.start()
+    replica_pool.start()
+    if settings.EVENTS_BACKEND == "postgres":
+        change_listener.start()
+    if settings.JOBS_MODE == "inprocess":
+        job_runner.start()
+    server.worker_ready()
 
 @app.on_event("shutdown")
 async def shutdown():
+   await change_listener.stop()
+   job_runner.stop()
+   last_login_buffer.stop()
+   replica_pool.stop()
    await database.disconnect()
 
 app.include_router(auth_router, prefix="/auth")
@@ -0,0 +1,69 @@
+"""
+Configuración común de los tests.
+
+Los tests con base de datos usan TEST_DATABASE_URLS: dos o más bases Postgres
+locales vacías, separadas por comas. La primera hace de DATABASE_URL (shard 0)
+y el resto de DB_SHARD_URLS. Se migran con `alembic upgrade head` al empezar y,
+sin la variable, esos tests se saltan. Los demás no necesitan base de datos:
+
+    TEST_DATABASE_URLS=postgresql://u:p@localhost/finanzas_test0,postgresql://u:p@localhost/finanzas_test1 pytest
+"""
+import os
+import subprocess
+import uuid
+import pytest
+from sqlalchemy.engine import make_url
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE_URLS = [url.strip() for url in os.getenv("TEST_DATABASE_URLS", "").split(",") if url.strip()]
+
+# Antes de importar app.config: la URL del shard 0 se arma con las variables DB_*
+if TEST_DATABASE_URLS:
+    primary = make_url(TEST_DATABASE_URLS[0])
+    os.environ.update(
+        DB_HOST=primary.host or "localhost",
+        DB_PORT=str(primary.port or 5432),
+        DB_NAME=primary.database,
+        DB_USER=primary.username or "",
+        DB_PASSWORD=primary.password or "",
+        DB_SHARD_URLS=",".join(TEST_DATABASE_URLS[1:]),
+    )
+# Sin hilos de fondo ni límites de peticiones salvo en los tests que los prueban
+os.environ.update(RATE_LIMIT_ENABLED="False", JOBS_MODE="external", MIGRATE_ON_STARTUP="False", DB_REPLICA_URLS="")
+
+
+@pytest.fixture(scope="session")
+def databases():
+    """Bases de TEST_DATABASE_URLS migradas; salta el test si no hay."""
+    if len(TEST_DATABASE_URLS) < 2:
+        pytest.skip("TEST_DATABASE_URLS necesita al menos dos bases Postgres")
+    subprocess.run(["alembic", "upgrade", "head"], cwd=ROOT, check=True)
+    return TEST_DATABASE_URLS
+
+
+@pytest.fixture(scope="session")
+def client(databases):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # Sin `with`: no se ejecuta el startup (migraciones ya aplicadas, sin hilos de fondo)
+    return TestClient(app)
+
+
+def unique_user() -> dict:
+    suffix = uuid.uuid4().hex[:12]
+    return {"username": f"test-{suffix}", "email": f"test-{suffix}@example.com", "password": "secreta123"}
+
+
+def register(client, user: dict | None = None) -> tuple[dict, dict]:
+    """Registra un usuario nuevo; devuelve sus datos y la cabecera Authorization."""
+    user = user or unique_user()
+    response = client.post("/auth/register", json=user)
+    assert response.status_code == 200, response.text
+    return user, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def user_id(headers: dict) -> int:
+    from app.auth.jwt_handler import decode_access_token
+
+    return decode_access_token(headers["Authorization"][len("Bearer "):])["uid"]
@@ -0,0 +1,61 @@
+"""Tipos de cambio: moneda de referencia y factores en memoria (sin base de datos)."""
+import time
+from datetime import date
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from app.config import settings
+from app.finance import fx
+from app.finance.fx import FxRates, currency_code, with_reference
+
+DAY = np.datetime64("2026-01-10", "D").astype(np.int64)
+
+
+def test_reference_rate_is_added_for_each_imported_day(monkeypatch):
+    monkeypatch.setattr(settings, "FX_REFERENCE_CURRENCY", "USD")
+    rows = [
+        {"currency": "EUR", "date": date(2026, 1, 2), "rate": 1.1},
+        {"currency": "GBP", "date": date(2026, 1, 2), "rate": 1.3},
+        {"currency": "EUR", "date": date(2026, 1, 5), "rate": 1.2},
+        {"currency": "USD", "date": date(2026, 1, 5), "rate": 1.0},
+    ]
+    added = with_reference(rows)[len(rows):]
+    assert added == [{"currency": "USD", "date": date(2026, 1, 2), "rate": 1.0}]
+
+
+def test_reference_currency_with_another_rate_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FX_REFERENCE_CURRENCY", "USD")
+    path = tmp_path / "rates.csv"
+    path.write_text("date,currency,rate\n2026-01-02,EUR,1.1\n2026-01-02,USD,0.9\n")
+    with pytest.raises(ValueError, match=":3:"):
+        fx.read_csv(str(path))
+
+
+def rates(series: dict) -> FxRates:
+    """FxRates ya cargado con `series` ({moneda: [(día, tipo)]}), sin consultar la base."""
+    loaded = FxRates(ttl=3600)
+    loaded._checked_at = time.monotonic()
+    loaded._series = {
+        currency_code(currency): (np.array([day for day, _ in points]), np.array([rate for _, rate in points]))
+        for currency, points in series.items()
+    }
+    return loaded
+
+
+def test_factors_use_first_quote_before_the_series_starts():
+    loaded = rates({"EUR": [(DAY, 1.2), (DAY + 2, 1.4)], "USD": [(DAY, 1.0), (DAY + 2, 1.0)]})
+    codes = np.array([currency_code("EUR")] * 3)
+    days = np.array([DAY - 5, DAY + 1, DAY + 9])
+    assert loaded.factors(None, codes, days, "USD").tolist() == pytest.approx([1.2, 1.2, 1.4])
+
+
+def test_require_rates(monkeypatch):
+    monkeypatch.setattr(fx, "convertible", lambda db: {"USD", "EUR"})
+    fx.require_rates(None, ["EUR", "USD"], "USD")
+    # Todo en la moneda base: no hay nada que convertir
+    fx.require_rates(None, ["JPY"], "JPY")
+    with pytest.raises(HTTPException) as error:
+        fx.require_rates(None, ["JPY"], "USD")
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException):
+        fx.require_rates(None, ["EUR"], "JPY")
@@ -0,0 +1,43 @@
+"""Resultado compartido de /admin/analytics con la lectura y la cola sustituidas (sin base de datos)."""
+from datetime import datetime, timedelta
+import pytest
+from app.admin import analytics
+from app.config import settings
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Sustituye la fila guardada (`state["snapshot"]`) y anota lo encolado."""
+    state = {"snapshot": None, "enqueued": []}
+    monkeypatch.setattr(analytics, "load", lambda db: state["snapshot"])
+    monkeypatch.setattr(
+        analytics, "enqueue", lambda name, payload=None, **kwargs: state["enqueued"].append((name, kwargs["dedupe_key"]))
+    )
+    return state
+
+
+def test_nothing_stored_yet_enqueues_first_computation(stored):
+    assert analytics.get(None) is None
+    assert analytics.get(None) is None
+    # Misma clave: la cola deja un solo trabajo
+    assert stored["enqueued"] == [("admin.analytics", "admin.analytics:none")] * 2
+
+
+def test_fresh_result_is_served_without_enqueuing(stored):
+    stored["snapshot"] = ({"run": 1}, datetime.utcnow())
+    assert analytics.get(None) == {"run": 1, "stale": False}
+    assert stored["enqueued"] == []
+
+
+def test_stale_result_is_served_while_one_refresh_is_queued(stored):
+    computed_at = datetime.utcnow() - timedelta(seconds=settings.ADMIN_ANALYTICS_TTL + 1)
+    stored["snapshot"] = ({"run": 1}, computed_at)
+    assert analytics.get(None) == {"run": 1, "stale": True}
+    assert analytics.get(None) == {"run": 1, "stale": True}
+    assert {key for _, key in stored["enqueued"]} == {f"admin.analytics:{computed_at.isoformat()}"}
+
+
+def test_force_enqueues_a_refresh(stored):
+    stored["snapshot"] = ({"run": 1}, datetime.utcnow())
+    assert analytics.get(None, force=True) == {"run": 1, "stale": True}
+    assert len(stored["enqueued"]) == 1
@@ -0,0 +1,23 @@
+"""Listeners SQL del perfilado con SQLite (sin Postgres)."""
+from sqlalchemy import create_engine, text
+from app.utils import profiling
+from app.utils.profiling import Profile
+
+
+def test_only_connections_opened_while_profiling_record_queries():
+    engine = create_engine("sqlite://")
+    profile = Profile("GET", "/finance/balance", user_id=1)
+    profile._started = 0.0
+    with engine.connect() as before:
+        token = profiling._current.set(profile)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            # Abierta antes del perfil: sin listeners
+            before.execute(text("SELECT 2"))
+        finally:
+            profiling._current.reset(token)
+    with engine.connect() as after:
+        after.execute(text("SELECT 3"))
+    assert [query["statement"] for query in profile.queries] == ["SELECT 1"]
+    assert not before.dispatch.before_cursor_execute
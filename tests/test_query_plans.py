@@ -0,0 +1,342 @@
+"""
+Guarda de regresiones en los planes de consulta de las rutas de finanzas y admin.
+
+El fixture `seeded` siembra en las bases de TEST_DATABASE_URLS un conjunto
+representativo (usuarios con etiquetas e ingresos y gastos repartidos en varios
+años), ejecuta ANALYZE y al terminar lo borra. Cada ruta de ROUTE_CHECKS se llama
+como uno de esos usuarios; se recogen todas las sentencias SQL que emite y se pide
+su plan con EXPLAIN (FORMAT JSON), sin ejecutarlas. Cada ruta declara lo que debe
+cumplir: consultas por petición, índices que debe usar y tablas que no puede
+recorrer enteras.
+
+Los usuarios sembrados tienen emails @plan-check.invalid.
+"""
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+import bcrypt
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from app.config import settings
+from app.database.database import Base, shard_map
+from app.finance import autocomplete, budgets, checkpoints
+
+SEED_DOMAIN = "plan-check.invalid"
+SEED_USERS = 200
+# Movimientos por usuario sembrado, en los últimos SEED_YEARS años
+SEED_ROWS = 2000
+SEED_YEARS = 3
+# Etiquetas de cada usuario sembrado por tipo
+SEED_LABELS = {"category": 12, "payment_method": 3, "source": 4}
+# Uno de cada INCOME_EVERY movimientos sembrados es un ingreso
+INCOME_EVERY = 5
+
+
+@dataclass
+class RouteCheck:
+    path: str
+    # Sentencias SQL máximas por petición, incluida la del usuario del token
+    max_queries: int
+    # Índices (tabla, columnas iniciales de la clave) que alguna sentencia debe usar
+    indexes: tuple = ()
+    # Tablas (o tablas padre de particiones) que ninguna sentencia puede leer con Seq Scan
+    no_seq_scan: tuple = ("transactions",)
+    admin: bool = False
+    # Sentencias adicionales permitidas por cada shard (rutas de admin que los recorren todos)
+    per_shard: int = 0
+
+
+USER_DATE = ("transactions", ("user_id", "date"))
+
+ROUTE_CHECKS = [
+    RouteCheck("/finance/analytics?year={year}", max_queries=12, indexes=(USER_DATE,)),
+    RouteCheck("/finance/kpi/monthly", max_queries=6, indexes=(USER_DATE,)),
+    RouteCheck("/finance/analytics/timeseries", max_queries=6, indexes=(USER_DATE,)),
+    RouteCheck("/finance/analytics/trends", max_queries=6),
+    RouteCheck("/finance/analytics/statistics", max_queries=6),
+    RouteCheck("/finance/balance", max_queries=6),
+    RouteCheck("/finance/balance?year={year}", max_queries=6),
+    RouteCheck("/finance/balance/series", max_queries=6),
+    RouteCheck("/finance/expense/by-category", max_queries=6),
+    RouteCheck("/finance/expense/paginated_details", max_queries=6),
+    RouteCheck("/finance/income/paginated_details", max_queries=6),
+    RouteCheck("/finance/budgets/status", max_queries=6),
+    RouteCheck("/finance/sync", max_queries=8, indexes=(("transactions", ("user_id", "kind", "updated_at")),)),
+    RouteCheck("/finance/autocomplete?kind=category&q=cat", max_queries=4),
+    # Las de admin recorren todos los usuarios a propósito; solo se limita el número de consultas
+    RouteCheck("/admin/users", max_queries=2, per_shard=2, no_seq_scan=(), admin=True),
+    # Se sirve del resultado guardado, que el fixture deja calculado: la petición no encola nada
+    RouteCheck("/admin/analytics", max_queries=2, no_seq_scan=(), admin=True),
+]
+
+
+def _seed_filter(column: str) -> str:
+    return f"{column} LIKE '%@{SEED_DOMAIN}'"
+
+
+def seed(users: int, rows: int, years: int) -> None:
+    """Crea `users` usuarios con `rows` movimientos cada uno en los últimos `years` años."""
+    password = bcrypt.hashpw(b"plan-check", bcrypt.gensalt()).decode("utf-8")
+    now = datetime.utcnow()
+    placed = defaultdict(list)
+    for n in range(users):
+        user_id, shard = shard_map.allocate(f"user{n}@{SEED_DOMAIN}", f"plan-check-{n}")
+        placed[shard].append({
+            "id": user_id,
+            "username": f"plan-check-{n}",
+            "email": f"user{n}@{SEED_DOMAIN}",
+            "password": password,
+            # El primero sirve para las rutas de admin
+            "is_admin": n == 0,
+            "now": now,
+            "currency": settings.DEFAULT_CURRENCY,
+        })
+    for shard, shard_users in placed.items():
+        with shard_map.engines[shard].begin() as conn:
+            conn.execute(text("""
+                INSERT INTO users (id, username, email, password, is_admin, is_active, created_at, updated_at,
+                                   last_login, base_currency)
+                VALUES (:id, :username, :email, :password, :is_admin, TRUE, :now, :now, :now, :currency)
+            """), shard_users)
+            ids = [user["id"] for user in shard_users]
+            conn.execute(text("""
+                INSERT INTO labels (user_id, kind, name, use_count)
+                SELECT u.id, k.kind, k.kind || ' ' || n, 0
+                FROM unnest(CAST(:ids AS INTEGER[])) AS u(id)
+                CROSS JOIN unnest(CAST(:kinds AS VARCHAR[]), CAST(:totals AS INTEGER[])) AS k(kind, total)
+                CROSS JOIN LATERAL generate_series(1, k.total) AS n
+            """), {"ids": ids, "kinds": list(SEED_LABELS), "totals": list(SEED_LABELS.values())})
+            # Fechas uniformes en los últimos `years` años; importes con cola larga
+            conn.execute(text(f"""
+                WITH seeded AS (
+                    SELECT user_id,
+                           array_agg(id ORDER BY id) FILTER (WHERE kind = 'category') AS categories,
+                           array_agg(name ORDER BY id) FILTER (WHERE kind = 'category') AS category_names,
+                           array_agg(id ORDER BY id) FILTER (WHERE kind = 'payment_method') AS methods,
+                           array_agg(name ORDER BY id) FILTER (WHERE kind = 'payment_method') AS method_names,
+                           array_agg(id ORDER BY id) FILTER (WHERE kind = 'source') AS sources,
+                           array_agg(name ORDER BY id) FILTER (WHERE kind = 'source') AS source_names
+                    FROM labels WHERE user_id = ANY(:ids)
+                    GROUP BY user_id
+                ), movements AS (
+                    SELECT s.*, n, n % {INCOME_EVERY} = 0 AS is_income,
+                           CAST(:now AS TIMESTAMP) - random() * CAST(:span AS INTERVAL) AS date,
+                           round(CAST(exp(random() * 7) AS NUMERIC), 2) AS amount
+                    FROM seeded s CROSS JOIN generate_series(1, :rows) AS n
+                )
+                INSERT INTO transactions (kind, user_id, amount, currency, date, month, fingerprint, updated_at,
+                                          source, source_id, is_active,
+                                          category, category_id, payment_method, payment_method_id, description)
+                SELECT CASE WHEN is_income THEN 'income' ELSE 'expense' END, user_id, amount, :currency,
+                       date, trim(to_char(date, 'Month')), md5(user_id || ':' || n), date,
+                       CASE WHEN is_income THEN source_names[1 + n % cardinality(sources)] END,
+                       CASE WHEN is_income THEN sources[1 + n % cardinality(sources)] END,
+                       CASE WHEN is_income THEN n % 50 <> 0 END,
+                       CASE WHEN NOT is_income THEN category_names[1 + n % cardinality(categories)] END,
+                       CASE WHEN NOT is_income THEN categories[1 + n % cardinality(categories)] END,
+                       CASE WHEN NOT is_income THEN method_names[1 + n % cardinality(methods)] END,
+                       CASE WHEN NOT is_income THEN methods[1 + n % cardinality(methods)] END,
+                       CASE WHEN NOT is_income THEN 'movimiento ' || n END
+                FROM movements
+            """), {
+                "ids": ids,
+                "rows": rows,
+                "now": now,
+                "span": f"{years} years",
+                "currency": settings.DEFAULT_CURRENCY,
+            })
+            # Tablas derivadas que las rutas leen en lugar de sumar movimientos
+            for user_id in ids:
+                checkpoints.rebuild(conn, user_id)
+                budgets.rebuild(conn, user_id)
+                autocomplete.rebuild(conn, user_id)
+        # Estadísticas al día para que el planificador vea el volumen real
+        with shard_map.engines[shard].connect() as conn:
+            conn.execute(text("ANALYZE"))
+            conn.commit()
+
+
+def clean() -> None:
+    """Borra los usuarios sembrados y todo lo que cuelga de ellos."""
+    import main  # noqa: F401  (todos los modelos en los metadatos)
+
+    for shard_engine in shard_map.engines:
+        with shard_engine.begin() as conn:
+            ids = conn.execute(text(f"SELECT id FROM users WHERE {_seed_filter('email')}")).scalars().all()
+            if not ids:
+                continue
+            for table in reversed(Base.metadata.sorted_tables):
+                if "user_id" in table.c and table.name != "user_shards":
+                    conn.execute(text(f"DELETE FROM {table.name} WHERE user_id = ANY(:ids)"), {"ids": ids})
+            conn.execute(text("DELETE FROM users WHERE id = ANY(:ids)"), {"ids": ids})
+    for user_id in _seeded_directory():
+        shard_map.release(user_id)
+
+
+def _seeded_directory() -> list[int]:
+    with shard_map.directory.connect() as conn:
+        return conn.execute(text(
+            f"SELECT user_id FROM user_shards WHERE {_seed_filter('email')} ORDER BY user_id"
+        )).scalars().all()
+
+
+class StatementRecorder:
+    """
+    Sentencias emitidas por cualquier engine dentro de `with recorder:`. Sin hilos
+    de fondo arrancados, todas son de la petición en curso.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((conn.engine, statement, parameters, executemany))
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(Engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, "before_cursor_execute", self._record)
+
+
+class PlanInspector:
+    """EXPLAIN de sentencias capturadas y catálogo de índices y particiones por engine."""
+
+    def __init__(self):
+        self._indexes = {}
+        self._parents = {}
+
+    def _catalog(self, engine):
+        if engine not in self._indexes:
+            with engine.connect() as conn:
+                self._indexes[engine] = {
+                    name: (table, tuple(columns))
+                    for name, table, columns in conn.execute(text("""
+                        SELECT c.relname, t.relname, array_agg(a.attname ORDER BY k.ord)
+                        FROM pg_index i
+                        JOIN pg_class c ON c.oid = i.indexrelid
+                        JOIN pg_class t ON t.oid = i.indrelid
+                        CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                        WHERE k.ord <= i.indnkeyatts
+                        GROUP BY c.relname, t.relname
+                    """))
+                }
+                self._parents[engine] = dict(conn.execute(text("""
+                    SELECT c.relname, p.relname
+                    FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    JOIN pg_class p ON p.oid = i.inhparent
+                """)).all())
+        return self._indexes[engine], self._parents[engine]
+
+    def _table(self, parents: dict, name: str | None) -> str | None:
+        # Las particiones se reportan por la tabla padre
+        while name in parents:
+            name = parents[name]
+        return name
+
+    def explain(self, engine, statement: str, parameters) -> list[dict]:
+        """Nodos del plan: tipo, tabla (padre si es partición) y columnas del índice usado."""
+        indexes, parents = self._catalog(engine)
+        with engine.connect() as conn:
+            plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            conn.rollback()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        nodes = []
+        pending = [plan[0]["Plan"]]
+        while pending:
+            node = pending.pop()
+            pending.extend(node.get("Plans", ()))
+            index = node.get("Index Name")
+            # Bitmap Index Scan no trae la tabla: se toma la del índice
+            index_table, index_columns = indexes.get(index, (None, ()))
+            nodes.append({
+                "type": node["Node Type"],
+                "table": self._table(parents, node.get("Relation Name") or index_table),
+                "index": index,
+                "index_columns": index_columns,
+            })
+        return nodes
+
+
+def _is_read(statement: str) -> bool:
+    return statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH")
+
+
+def _uses_index(nodes: list[dict], table: str, columns: tuple) -> bool:
+    return any(
+        node["table"] == table and node["index_columns"][:len(columns)] == columns
+        for node in nodes if node["index"]
+    )
+
+
+def check_route(client, inspector: PlanInspector, route: RouteCheck, token: str) -> list[str]:
+    """Problemas encontrados en la ruta (lista vacía si cumple)."""
+    path = route.path.format(year=datetime.utcnow().year)
+    with StatementRecorder() as recorder:
+        response = client.get(path, headers={"Authorization": f"Bearer {token}"})
+    if response.status_code != 200:
+        return [f"{path}: HTTP {response.status_code}"]
+
+    problems = []
+    max_queries = route.max_queries + route.per_shard * shard_map.count
+    if len(recorder.statements) > max_queries:
+        problems.append(f"{path}: {len(recorder.statements)} consultas (máximo {max_queries})")
+    plans = []
+    for engine, statement, parameters, executemany in recorder.statements:
+        if executemany or not _is_read(statement):
+            continue
+        nodes = inspector.explain(engine, statement, parameters)
+        plans.append(nodes)
+        scanned = sorted({node["table"] for node in nodes if node["type"] == "Seq Scan"} & set(route.no_seq_scan))
+        if scanned:
+            problems.append(f"{path}: Seq Scan sobre {', '.join(scanned)} en\n    {' '.join(statement.split())[:300]}")
+    for table, columns in route.indexes:
+        if not any(_uses_index(nodes, table, columns) for nodes in plans):
+            problems.append(f"{path}: ninguna consulta usa un índice sobre {table} ({', '.join(columns)})")
+    return problems
+
+
+@pytest.fixture(scope="module")
+def seeded(client):
+    """Tokens de un usuario sembrado y del admin sembrado; borra la siembra al terminar."""
+    from app.admin import analytics
+    from app.auth.jwt_handler import create_access_token
+    from app.finance.analytics_cache import analytics_cache
+
+    clean()
+    seed(SEED_USERS, SEED_ROWS, SEED_YEARS)
+    # El primer sembrado es admin; el resto usa otro para no leer siempre el mismo usuario
+    ids = _seeded_directory()
+    admin_id, user_id = ids[0], ids[len(ids) // 2]
+    with shard_map.directory.connect() as conn:
+        emails = dict(conn.execute(
+            text("SELECT user_id, email FROM user_shards WHERE user_id = ANY(:ids)"), {"ids": [admin_id, user_id]}
+        ).all())
+    # Sin caché columnar: la guarda es sobre el SQL de /finance/analytics
+    max_bytes, analytics_cache.max_bytes = analytics_cache.max_bytes, 0
+    # /admin/analytics ya calculado: la petición no encola ningún recálculo
+    analytics.refresh_snapshot()
+    yield {
+        True: create_access_token({"sub": emails[admin_id], "uid": admin_id, "is_admin": True}),
+        False: create_access_token({"sub": emails[user_id], "uid": user_id}),
+    }
+    analytics_cache.max_bytes = max_bytes
+    clean()
+
+
+@pytest.fixture(scope="module")
+def inspector():
+    return PlanInspector()
+
+
+@pytest.mark.parametrize("route", ROUTE_CHECKS, ids=[route.path for route in ROUTE_CHECKS])
+def test_route_query_plan(client, seeded, inspector, route):
+    problems = check_route(client, inspector, route, seeded[route.admin])
+    assert not problems, "\n".join(problems)
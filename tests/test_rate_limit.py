@@ -0,0 +1,126 @@
+"""Control de admisión con InMemoryBucketBackend delante de una app mínima (sin base de datos)."""
+import asyncio
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from app.auth.jwt_handler import create_access_token
+from app.config import settings
+from app.utils import rate_limit
+from app.utils.rate_limit import AdmissionControlMiddleware, InMemoryBucketBackend
+
+
+async def ok(request):
+    return PlainTextResponse("ok")
+
+
+inner = Starlette(routes=[Route("/{path:path}", ok, methods=["GET", "POST"])])
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Buckets de 20 tokens que no se rellenan durante el test."""
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_RATE", 0.01)
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_BURST", 20)
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_RATE", 0.01)
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_BURST", 20)
+    return settings
+
+
+def admitted(client, path: str, method: str = "GET", **kwargs) -> int:
+    """Peticiones admitidas hasta el primer 429."""
+    for count in range(100):
+        response = client.request(method, path, **kwargs)
+        if response.status_code == 429:
+            return count
+        assert response.status_code == 200
+    raise AssertionError("nunca se limitó")
+
+
+def client_for(backend=None) -> TestClient:
+    return TestClient(AdmissionControlMiddleware(inner, backend=backend or InMemoryBucketBackend()))
+
+
+def test_route_costs():
+    assert rate_limit.route_cost("/auth/login") == 10
+    assert rate_limit.route_cost("/finance/analytics/summary") == 5
+    assert rate_limit.route_cost("/finance/expenses") == 1
+    # El prefijo tiene que acabar en un segmento completo
+    assert rate_limit.route_cost("/auth/loginx") == 1
+
+
+def test_weighted_costs_drain_the_bucket(limits):
+    assert admitted(client_for(), "/finance/expenses") == 20
+    # Login (bcrypt) cuesta 10 tokens y analytics 5
+    assert admitted(client_for(), "/auth/login", method="POST") == 2
+    assert admitted(client_for(), "/finance/analytics") == 4
+
+
+def test_429_with_retry_after(limits):
+    client = client_for()
+    for _ in range(2):
+        assert client.post("/auth/login").status_code == 200
+    response = client.post("/auth/login")
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Too many requests"}
+    # Faltan 10 tokens a 0.01 tokens/s
+    assert int(response.headers["retry-after"]) == pytest.approx(1000, abs=1)
+
+
+def test_user_bucket_is_separate_from_ip_bucket(limits, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_BURST", 1000)
+    client = client_for()
+    first = {"Authorization": f"Bearer {create_access_token({'sub': 'first@example.com'})}"}
+    second = {"Authorization": f"Bearer {create_access_token({'sub': 'second@example.com'})}"}
+    assert admitted(client, "/finance/analytics", headers=first) == 4
+    assert admitted(client, "/finance/analytics", headers=second) == 4
+
+
+def test_disabled_admits_everything(limits, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    client = client_for()
+    assert all(client.post("/auth/login").status_code == 200 for _ in range(10))
+
+
+def test_503_when_queue_wait_times_out(limits, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_CONCURRENT_REQUESTS", 1)
+    monkeypatch.setattr(settings, "QUEUE_TIMEOUT_SECONDS", 0.05)
+    release = asyncio.Event()
+
+    async def slow(scope, receive, send):
+        await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    async def scenario():
+        middleware = AdmissionControlMiddleware(slow, backend=InMemoryBucketBackend())
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            busy = asyncio.create_task(client.get("/finance/expenses"))
+            await asyncio.sleep(0.01)
+            shed = await client.get("/finance/expenses")
+            release.set()
+            return (await busy), shed
+
+    shed_before = rate_limit.admission_stats()["shed"]
+    busy, shed = asyncio.run(scenario())
+    assert busy.status_code == 200
+    assert shed.status_code == 503
+    assert shed.json() == {"detail": "Server busy"}
+    assert shed.headers["retry-after"] == "1"
+    assert rate_limit.admission_stats()["shed"] == shed_before + 1
+
+
+def test_full_backend_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(InMemoryBucketBackend, "MAX_KEYS", 3)
+    backend = InMemoryBucketBackend()
+    assert backend.consume("limited", 10, rate=0.01, capacity=10) == 0
+    assert backend.consume("limited", 10, rate=0.01, capacity=10) > 0
+    # Claves nuevas sin fin: el bucket agotado sigue agotado mientras se use
+    for n in range(10):
+        backend.consume(f"flood-{n}", 1, rate=0.01, capacity=10)
+        assert backend.consume("limited", 10, rate=0.01, capacity=10) > 0
+    assert len(backend._buckets) == 3
+    assert "flood-0" not in backend._buckets
@@ -0,0 +1,132 @@
+"""Réplicas de lectura con bases SQLite como sustitutas (sin Postgres)."""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import Column, Integer, String, text
+from sqlalchemy.orm import declarative_base
+from app.config import settings
+from app.database import database
+from app.database.routing import PrimaryPins, ReplicaPool
+
+# Un fichero dentro de un directorio que no existe: conectar siempre falla
+UNREACHABLE = "sqlite:////nonexistent-dir/replica.db"
+
+
+def test_round_robin_between_healthy_replicas():
+    pool = ReplicaPool(["sqlite://", "sqlite://"], health_check_interval=60)
+    pool.check()
+    picks = [pool.choose() for _ in range(4)]
+    assert picks == [pool.engines[0], pool.engines[1], pool.engines[0], pool.engines[1]]
+    assert [state["picks"] for state in pool.stats()] == [2, 2]
+
+
+def test_unhealthy_replica_is_skipped_until_it_recovers():
+    pool = ReplicaPool(["sqlite://", UNREACHABLE], health_check_interval=60)
+    pool.check()
+    assert [state["healthy"] for state in pool.stats()] == [True, False]
+    assert {pool.choose() for _ in range(4)} == {pool.engines[0]}
+
+    pool.engines[1] = pool.engines[0]
+    pool.check()
+    assert {pool.choose() for _ in range(4)} == {pool.engines[0], pool.engines[1]}
+
+
+def test_no_healthy_replica_returns_none():
+    pool = ReplicaPool([UNREACHABLE], health_check_interval=60)
+    pool.check()
+    assert pool.choose() is None
+    assert pool.stats()[0]["failures"] == 1
+
+
+def test_choose_never_connects():
+    # Las comprobaciones son del hilo de fondo: elegir no toca la red aunque la réplica esté caída
+    pool = ReplicaPool([UNREACHABLE], health_check_interval=60)
+    assert pool.choose() is pool.engines[0]
+    assert pool.stats()[0]["failures"] == 0
+
+
+def test_background_checker_marks_replicas():
+    pool = ReplicaPool([UNREACHABLE], health_check_interval=0.01)
+    pool.start()
+    try:
+        for _ in range(200):
+            if pool.stats()[0]["failures"]:
+                break
+            pool._stop.wait(0.01)
+    finally:
+        pool.stop()
+    assert pool.stats()[0]["healthy"] is False
+
+
+class Note(declarative_base()):
+    __tablename__ = "notes"
+    id = Column(Integer, primary_key=True)
+    body = Column(String)
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    pool = ReplicaPool(["sqlite://", "sqlite://"], health_check_interval=60)
+    monkeypatch.setattr(database, "replica_pool", pool)
+    monkeypatch.setattr(database, "primary_pins", PrimaryPins(window=60))
+    return pool
+
+
+def test_reads_go_to_replicas(replicas):
+    binds = {database.ReadSessionLocal(user_id=1).get_bind() for _ in range(2)}
+    assert binds == set(replicas.engines)
+
+
+def test_pinned_user_reads_from_primary(replicas):
+    database.primary_pins.pin(1)
+    assert database.ReadSessionLocal(user_id=1).get_bind() is database.engine
+    assert database.ReadSessionLocal(user_id=2).get_bind() in replicas.engines
+
+
+def test_commit_with_writes_pins_user(replicas):
+    session = database.SessionLocal(bind=replicas.engines[0])
+    session.info["user_id"] = 7
+    session.info["wrote"] = True
+    session.commit()
+    assert database.primary_pins.is_pinned(7)
+    assert database.ReadSessionLocal(user_id=7).get_bind() is database.engine
+
+
+def test_commit_without_writes_does_not_pin(replicas):
+    session = database.SessionLocal(bind=replicas.engines[0])
+    session.info["user_id"] = 8
+    session.commit()
+    assert not database.primary_pins.is_pinned(8)
+
+
+def test_pin_expires():
+    pins = PrimaryPins(window=0)
+    pins.pin(1)
+    assert not pins.is_pinned(1)
+
+
+def test_shared_backend_reads_written_at(replicas, monkeypatch):
+    # Con varios workers la ventana sale de users.written_at (cargado del primario), no de la memoria
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_BACKEND", "postgres")
+    database.primary_pins.pin(1)
+    assert database.ReadSessionLocal(user_id=1).get_bind() in replicas.engines
+    recent = datetime.utcnow() - timedelta(seconds=1)
+    assert database.ReadSessionLocal(user_id=1, written_at=recent).get_bind() is database.engine
+    old = datetime.utcnow() - timedelta(seconds=settings.READ_YOUR_WRITES_SECONDS + 1)
+    assert database.ReadSessionLocal(user_id=1, written_at=old).get_bind() in replicas.engines
+
+
+def test_shared_backend_records_the_write(replicas, monkeypatch):
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_BACKEND", "postgres")
+    engine = replicas.engines[0]
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, written_at TIMESTAMP)"))
+        conn.execute(text("INSERT INTO users (id) VALUES (9)"))
+    Note.metadata.create_all(engine)
+    session = database.SessionLocal(bind=engine)
+    session.info["user_id"] = 9
+    session.add(Note(body="a"))
+    session.commit()
+    with engine.connect() as conn:
+        written_at = conn.execute(text("SELECT written_at FROM users WHERE id = 9")).scalar()
+    assert written_at is not None
+    assert not database.primary_pins.is_pinned(9)
@@ -0,0 +1,42 @@
+"""Hooks del lanzador de producción con un maestro de gunicorn simulado."""
+import logging
+from types import SimpleNamespace
+import pytest
+from app import server
+from app.config import settings
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    monkeypatch.setattr(settings, "EVENTS_BACKEND", "local")
+    monkeypatch.setattr(settings, "RATE_LIMIT_BACKEND", "memory")
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_BACKEND", "local")
+    monkeypatch.setattr(settings, "DB_REPLICA_URLS", [])
+    return settings
+
+
+def master(workers: int):
+    return SimpleNamespace(num_workers=workers, log=logging.getLogger("gunicorn.test"))
+
+
+def test_several_workers_switch_to_shared_backends(backends, caplog):
+    with caplog.at_level(logging.WARNING):
+        server._shared_backends(master(4), settings)
+    assert (settings.EVENTS_BACKEND, settings.RATE_LIMIT_BACKEND) == ("postgres", "postgres")
+    # Sin réplicas la ventana read-your-writes no hace falta
+    assert settings.READ_YOUR_WRITES_BACKEND == "local"
+    assert len(caplog.records) == 2
+
+
+def test_single_worker_keeps_in_process_backends(backends, caplog):
+    server._shared_backends(master(1), settings)
+    assert (settings.EVENTS_BACKEND, settings.RATE_LIMIT_BACKEND) == ("local", "memory")
+    assert not caplog.records
+
+
+def test_replicas_with_several_workers_share_read_your_writes(backends, caplog):
+    settings.DB_REPLICA_URLS = ["postgresql://replica/finanzas_db"]
+    with caplog.at_level(logging.WARNING):
+        server._shared_backends(master(2), settings)
+    assert settings.READ_YOUR_WRITES_BACKEND == "postgres"
+    assert len(caplog.records) == 3
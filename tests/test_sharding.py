@@ -0,0 +1,146 @@
+"""
+Shards: directorio, enrutado de sesiones y endpoints con dos bases Postgres
+(TEST_DATABASE_URLS). El enrutado de ShardSession se prueba también sin ellas.
+"""
+import csv
+import io
+import uuid
+import pytest
+from sqlalchemy import create_engine, text
+from app.config import settings
+from app.database import database
+from app.database.sharding import ShardMap, UserExistsError, interleave_sequences
+from conftest import register, unique_user, user_id
+
+
+def test_single_shard_never_reads_the_directory():
+    shard_map = ShardMap(create_engine("sqlite://"), [], cache_size=10)
+    assert shard_map.shard_for(42) == 0
+    assert shard_map.stats()["misses"] == 0
+
+
+def test_session_bind_follows_info_shard(monkeypatch):
+    shard_map = ShardMap(create_engine("sqlite://"), ["sqlite://"], cache_size=10)
+    monkeypatch.setattr(database, "shard_map", shard_map)
+    assert database.SessionLocal(info={"shard": 1}).get_bind() is shard_map.engines[1]
+    assert database.SessionLocal(info={"shard": 0}).get_bind() is shard_map.engines[0]
+    # Sin shard, el bind de la sesión (el primario del shard 0)
+    assert database.SessionLocal().get_bind() is database.engine
+
+
+def shard_of(user: int) -> int:
+    return database.shard_map.shard_for(user)
+
+
+def users_in(shard: int, user: int) -> int:
+    with database.shard_map.engines[shard].connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM users WHERE id = :id"), {"id": user}).scalar()
+
+
+def register_on(client, shard: int, user: dict | None = None) -> tuple[dict, dict]:
+    """Registra usuarios hasta que uno cae en `shard` (los ids alternan entre shards)."""
+    for _ in range(database.shard_map.count * 2):
+        user_data = dict(user or unique_user())
+        user_data["email"] = f"{uuid.uuid4().hex[:8]}-{user_data['email']}"
+        user_data["username"] = f"{user_data['username']}-{uuid.uuid4().hex[:4]}"
+        registered, headers = register(client, user_data)
+        if shard_of(user_id(headers)) == shard:
+            return registered, headers
+    raise AssertionError(f"ningún usuario cayó en el shard {shard}")
+
+
+def test_allocate_places_by_modulo_and_caches(databases):
+    shard_map = database.shard_map
+    email, username = f"{uuid.uuid4().hex}@example.com", uuid.uuid4().hex
+    allocated, shard = shard_map.allocate(email, username)
+    try:
+        assert shard == allocated % shard_map.count
+        assert shard_map.shard_for(allocated) == shard
+        assert shard_map.locate(email) == (allocated, shard)
+        with pytest.raises(UserExistsError):
+            shard_map.allocate(email, uuid.uuid4().hex)
+    finally:
+        shard_map.release(allocated)
+    assert shard_map.locate(email) is None
+
+
+def test_sequences_are_interleaved(databases):
+    shard_map = database.shard_map
+    connections = [engine.connect() for engine in shard_map.engines]
+    try:
+        for shard, conn in enumerate(connections):
+            step, last = conn.execute(text(
+                "SELECT increment_by, last_value FROM pg_sequences WHERE sequencename = 'transactions_id_seq'"
+            )).one()
+            assert step == settings.SHARD_ID_STRIDE
+            assert last is None or last % settings.SHARD_ID_STRIDE == shard
+        # Ya intercaladas: una segunda pasada no toca nada
+        assert interleave_sequences(connections, settings.SHARD_ID_STRIDE) == []
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def test_register_and_login_on_second_shard(client):
+    user, headers = register_on(client, 1)
+    assert users_in(1, user_id(headers)) == 1
+    assert users_in(0, user_id(headers)) == 0
+
+    response = client.post("/auth/login", json={"email": user["email"], "password": user["password"]})
+    assert response.status_code == 200, response.text
+    again = client.post("/auth/register", json=user)
+    assert again.status_code == 400
+
+
+def test_crud_is_routed_to_the_user_shard(client):
+    _, headers = register_on(client, 1)
+    created = client.post("/finance/expense", headers=headers, json={
+        "amount": 12.5, "payment_method": "Tarjeta", "category": "Comida", "date": "2026-02-03T10:00:00",
+    })
+    assert created.status_code == 200, created.text
+    expense_id = created.json()["id"]
+    assert expense_id % settings.SHARD_ID_STRIDE == 1
+    with database.shard_map.engines[1].connect() as conn:
+        assert conn.execute(text("SELECT amount FROM transactions WHERE id = :id"), {"id": expense_id}).scalar() == 12.5
+    with database.shard_map.engines[0].connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM transactions WHERE id = :id"), {"id": expense_id}).scalar() == 0
+
+    listed = client.get("/finance/expense", headers=headers)
+    assert [row["id"] for row in listed.json()] == [expense_id]
+    updated = client.put(f"/finance/expense/{expense_id}", headers=headers, json={
+        "amount": 20, "payment_method": "Efectivo", "category": "Comida", "date": "2026-02-03T10:00:00",
+    })
+    assert updated.status_code == 200, updated.text
+    assert updated.json()["amount"] == 20
+    assert client.delete(f"/finance/expense/{expense_id}", headers=headers).status_code == 200
+    assert client.get("/finance/expense", headers=headers).json() == []
+
+
+def test_admin_listing_and_export_merge_all_shards(client):
+    _, admin_headers = register_on(client, 0)
+    with database.shard_map.engines[0].begin() as conn:
+        conn.execute(text("UPDATE users SET is_admin = TRUE WHERE id = :id"), {"id": user_id(admin_headers)})
+
+    tag = f"page{uuid.uuid4().hex[:8]}"
+    ids = []
+    for i in range(5):
+        _, headers = register(client, {"username": f"{tag}-{i}", "email": f"{tag}-{i}@example.com", "password": "secreta123"})
+        ids.append(user_id(headers))
+    assert {shard_of(user) for user in ids} == {0, 1}
+
+    pages, after = [], None
+    while True:
+        params = {"search": tag, "limit": 2, **({"after_id": after} if after else {})}
+        response = client.get("/admin/users", params=params, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        pages.append([row["id"] for row in response.json()])
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            break
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == sorted(ids)
+
+    exported = client.get("/admin/users/export", params={"search": tag}, headers=admin_headers)
+    assert exported.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(exported.text)))
+    assert [int(row["id"]) for row in rows] == sorted(ids)
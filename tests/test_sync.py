@@ -0,0 +1,61 @@
+"""Tokens de /finance/sync y paginación por keyset (la segunda parte necesita Postgres)."""
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from app.finance.sync_routes import decode_token, encode_token
+from conftest import register, user_id
+
+AT = datetime(2026, 10, 19, 12, 30, 15, 123456)
+
+
+def test_token_round_trip():
+    token = encode_token((AT, "expense", 42), (AT, 7), 3)
+    assert decode_token(token) == ((AT, "expense", 42), (AT, 7), 3)
+
+
+def test_previous_token_format_is_still_accepted():
+    token = "eyJ0IjoiMjAyNi0xMC0xOVQxMjozMDoxNS4xMjM0NTYiLCJ2IjpudWxsfQ"  # {"t": AT, "v": null}
+    assert decode_token(token) == ((AT, "", 0), (AT, 0), None)
+
+
+def test_invalid_token_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        decode_token("no-es-un-token")
+    assert error.value.status_code == 400
+
+
+def expense(day: int, amount: float) -> dict:
+    return {"amount": amount, "payment_method": "Tarjeta", "category": "Comida", "date": f"2026-01-{day:02d}T12:00:00"}
+
+
+def test_pages_through_rows_sharing_updated_at(client):
+    from app.database.database import shard_map
+
+    _, headers = register(client)
+    created = client.post("/finance/expense/bulk", json=[expense(day, day) for day in range(1, 8)], headers=headers)
+    assert created.status_code == 200, created.text
+    income = client.post(
+        "/finance/income", headers=headers,
+        json={"amount": 100, "source": "Nómina", "date": "2026-01-01T09:00:00"},
+    )
+    assert income.status_code == 200, income.text
+    # Todas las filas con la misma marca: antes el token no avanzaba y has_more no acababa nunca
+    with shard_map.engines_for(user_id(headers))[0].begin() as conn:
+        conn.execute(text("UPDATE transactions SET updated_at = '2026-01-31' WHERE user_id = :id"), {"id": user_id(headers)})
+
+    first = client.get("/finance/sync", params={"limit": 3}, headers=headers).json()
+    assert first["full"] and first["has_more"]
+    pages, seen, token = [first], [], first["token"]
+    while pages[-1]["has_more"]:
+        assert len(pages) < 10, "la paginación no avanza"
+        pages.append(client.get("/finance/sync", params={"since": token, "limit": 3}, headers=headers).json())
+        token = pages[-1]["token"]
+        # Las páginas siguientes de una copia completa no vuelven a pedir descartar la copia local
+        assert not pages[-1]["full"]
+    for page in pages:
+        seen += [("expense", row["id"]) for row in page["expenses"]] + [("income", row["id"]) for row in page["incomes"]]
+    assert len(seen) == len(set(seen)) == 8
+
+    caught_up = client.get("/finance/sync", params={"since": token}, headers=headers).json()
+    assert not caught_up["has_more"]